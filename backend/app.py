@@ -3,17 +3,30 @@ Main Flask application for the Video Story Generation Platform
 """
 
 import os
+import copy
 import logging
-from flask import Flask, request, jsonify
+import threading
+from flask import Flask, request, jsonify, g
 from flask_cors import CORS
 from dotenv import load_dotenv
 
 from services.video_service import VideoService
-from services.story_service import StoryService
+from services.story_service import StoryService, VersionConflict
+from services.storyboard_store import ELEMENT_TYPES, is_split, regeneration_scope, single_element_type
 from services.story_generation_service import StoryGenerationService
+from services.batch_generation_service import BatchGenerationService
 from services.cloud_service import CloudService
+from services.generation_queue import GenerationQueue, GenerationDispatcher
+from services.fair_scheduler import FairGate, QueueTimeout
 from config.settings import Config
 from utils.logger import setup_logging
+from utils.instrumentation import setup_instrumentation
+from utils.tracing import setup_tracing
+from utils import metrics
+from utils import lifecycle
+from utils.json_patch import JsonPatchError
+from utils.single_flight import SingleFlight, request_key
+from utils.http_cache import conditional_json, parse_timestamp, setup_compression
 
 # Load environment variables
 load_dotenv()
@@ -24,22 +37,128 @@ def create_app():
     app.config.from_object(Config)
     
     # Enable CORS for frontend communication
-    CORS(app, origins=["http://localhost:5000", "http://localhost:3000"])
+    CORS(app, origins=Config.CORS_ORIGINS,
+         expose_headers=['Server-Timing', 'X-Queue-Position', Config.REQUEST_ID_HEADER])
     
     # Setup logging and observability
     setup_logging(app)
+    setup_tracing(app)
+    setup_instrumentation(app)
+    metrics.setup_metrics(app)
+    setup_compression(app)
     
     # Initialize services
     cloud_service = CloudService()
-    video_service = VideoService(cloud_service)
+    generation_queue = GenerationQueue(cloud_service)
+    video_service = VideoService(cloud_service, generation_queue)
     story_service = StoryService(cloud_service)
     story_generation_service = StoryGenerationService(cloud_service)
+    batch_generation_service = BatchGenerationService(cloud_service, video_service)
+
+    # Drain queued Veo submissions in the background within per-model rate limits
+    generation_dispatcher = GenerationDispatcher(generation_queue, video_service)
+
+    def start_background_workers():
+        """Start per-process threads (dispatcher, client warm-up, recovery of orphaned batches)"""
+        generation_dispatcher.start()
+        threading.Thread(target=cloud_service.warm_up, name='cloud-warm-up', daemon=True).start()
+        threading.Thread(target=batch_generation_service.resume_stale_batches, name='batch-resume',
+                         daemon=True).start()
+
+    # In-flight generation requests, drained on graceful shutdown
+    inflight = lifecycle.InflightTracker()
+    generation_endpoints = {
+        'generate_story_from_prompt', 'regenerate_story_element', 'generate_video_segment',
+        'generate_all_segments', 'stitch_story',
+    }
+
+    def stop_taking_work():
+        """Fail readiness, reject new generation requests, stop claiming queued jobs and release batches"""
+        inflight.begin_drain()
+        generation_dispatcher.stop()
+        batch_generation_service.stop()
+
+    def wait_for_inflight():
+        if not inflight.wait_idle(Config.SHUTDOWN_DRAIN_TIMEOUT):
+            app.logger.warning(f"Shutting down with {inflight.count} generation requests still in flight")
+        if not batch_generation_service.wait_stopped(5):
+            app.logger.warning("Shutting down before every batch scheduler released its batch")
+
+    lifecycle.register_post_fork(cloud_service.reset_clients)
+    lifecycle.register_post_fork(start_background_workers)
+    lifecycle.register_drain_start(stop_taking_work)
+    lifecycle.register_shutdown(wait_for_inflight)
+    if not Config.DEFER_BACKGROUND_WORKERS:
+        start_background_workers()
+
+    # Fair share of Gemini capacity across users for synchronous story generation
+    gemini_gate = FairGate('gemini', Config.GEMINI_MAX_CONCURRENCY, Config.PER_USER_MAX_GEMINI_CONCURRENCY)
+    # Identical regenerate requests (other tabs, client retries) join the one already running
+    regenerate_flight = SingleFlight('regenerate')
+
+    # Shared with alternative entry points (asgi.py)
+    app.extensions['video_story'] = {
+        'cloud_service': cloud_service,
+        'video_service': video_service,
+        'story_service': story_service,
+        'story_generation_service': story_generation_service,
+        'generation_queue': generation_queue,
+        'gemini_gate': gemini_gate,
+        'generation_dispatcher': generation_dispatcher,
+        'inflight': inflight,
+        'regenerate_flight': regenerate_flight,
+    }
+
+    def queue_timeout_response(e: QueueTimeout):
+        body = {"error": "Generation capacity is busy, please retry", "queue_position": e.position}
+        return jsonify(body), 503, {'Retry-After': '30'}
     
+    @app.before_request
+    def track_generation_request():
+        if request.endpoint in generation_endpoints:
+            if inflight.draining:
+                return jsonify({"error": "Server is shutting down, please retry"}), 503, {'Retry-After': '5'}
+            inflight.enter()
+            g.inflight_tracked = True
+
+    @app.teardown_request
+    def untrack_generation_request(exc):
+        if g.pop('inflight_tracked', False):
+            inflight.exit()
+
+    def readiness():
+        checks = {
+            'clients_warm': cloud_service.is_ready(),
+            'dispatcher_running': generation_dispatcher.is_alive(),
+            'accepting_work': not inflight.draining,
+        }
+        ready = all(checks.values())
+        body = {"status": "ready" if ready else "not_ready", "checks": checks, "inflight_generations": inflight.count}
+        return jsonify(body), 200 if ready else 503
+
     @app.route('/health', methods=['GET'])
     def health_check():
         """Health check endpoint"""
         return jsonify({"status": "healthy", "service": "video-story-platform"})
     
+    @app.route('/ready', methods=['GET'])
+    def ready_check():
+        """Readiness endpoint: clients warm, dispatcher running and not draining"""
+        return readiness()
+
+    @app.route('/api/ready', methods=['GET'])
+    def api_ready_check():
+        """Readiness endpoint (API-prefixed)"""
+        return readiness()
+    
+    @app.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        """Prometheus metrics, aggregated across all workers"""
+        if not metrics.PROMETHEUS_AVAILABLE:
+            return jsonify({"error": "prometheus_client is not installed"}), 503
+        body, content_type = metrics.render_latest()
+        return body, 200, {'Content-Type': content_type}
+    
     # Mirror health under /api for frontend baseURL convenience
     @app.route('/api/health', methods=['GET'])
     def api_health_check():
@@ -68,7 +187,8 @@ def create_app():
             story = story_service.get_story(story_id)
             if not story:
                 return jsonify({"error": "Story not found"}), 404
-            return jsonify(story)
+            # Segments change without touching the story, so the ETag hashes the body
+            return conditional_json(lambda: story)
         except Exception as e:
             app.logger.error(f"Error fetching story: {str(e)}")
             return jsonify({"error": "Failed to fetch story"}), 500
@@ -130,43 +250,85 @@ def create_app():
             
             app.logger.info(f"Generating story from prompt: {prompt[:100]}...")
             
-            # Generate story structure using AI
-            story_data = story_generation_service.generate_story_from_prompt(prompt, user_preferences)
+            # Generate story structure using AI, waiting for this user's fair share of Gemini capacity
+            with gemini_gate.slot(data.get('user_id', 'anonymous')) as ticket:
+                # Async path: scene details and characters are requested concurrently
+                story_data = cloud_service.run_async(
+                    story_generation_service.agenerate_story_from_prompt(prompt, user_preferences)
+                )
             
-            return jsonify(story_data), 201
+            return jsonify(story_data), 201, {'X-Queue-Position': str(ticket['queue_position'])}
             
+        except QueueTimeout as e:
+            return queue_timeout_response(e)
         except Exception as e:
             app.logger.error(f"Error generating story from prompt: {str(e)}")
             return jsonify({"error": "Failed to generate story"}), 500
     
-    @app.route('/api/stories/<story_id>/elements/<element_type>', methods=['PUT'])
-    @app.route('/api/stories/<story_id>/elements/<element_type>/<element_id>', methods=['PUT'])
+    def version_conflict_response(e: VersionConflict):
+        body = {"error": "Story was changed by someone else; reload and retry", "version": e.current_version}
+        return jsonify(body), 409
+
+    def persisted_generation(story_id):
+        """The story's stored generation data (scenes and characters not loaded), or None for a
+        draft that only exists client-side"""
+        story = cloud_service.get_document(Config.STORIES_COLLECTION, story_id)
+        generation = story.get('generation_data') if story else None
+        return generation if isinstance(generation, dict) and generation else None
+
+    def element_scope(element_type, element_id, patch=None):
+        """The storyboard elements an edit of this element needs to read (None: all of them)"""
+        if element_type in ELEMENT_TYPES:
+            return {ELEMENT_TYPES[element_type]: [element_id]}
+        # Story metadata updates touch no scene; a story-level patch may reorder them
+        return {} if element_type == 'story' and patch is None else None
+
+    @app.route('/api/stories/<story_id>/elements/<element_type>', methods=['PUT', 'PATCH'])
+    @app.route('/api/stories/<story_id>/elements/<element_type>/<element_id>', methods=['PUT', 'PATCH'])
     def update_story_element(story_id, element_type, element_id=None):
-        """Update a specific story element (scene, character, story metadata)"""
+        """Update a specific story element (scene, character, story metadata).
+
+        Body: {"updates": {field path: value}} and/or {"patch": [RFC 6902 ops relative to the
+        element]}, plus optional "version" for optimistic concurrency (or a bare JSON Patch array
+        with ?version=N). Persisted stories are edited server-side; "story_data" is only needed
+        for drafts that are not saved yet. For saved stories only the edited element is read and
+        written, and the response is the storyboard with just that element in its list
+        ("partial": true).
+        """
         try:
-            # Get current story data from the request body
-            data = request.get_json()
+            data = request.get_json() or {}
+            if isinstance(data, list):
+                # A bare application/json-patch+json body; the version comes from the query string
+                data = {'patch': data, 'version': request.args.get('version', type=int)}
+            updates = data.get('updates') or {}
+            patch = data.get('patch')
+
+            def edit(story_data):
+                return story_generation_service.update_story_element(
+                    story_data, element_type, element_id or 'story', updates, patch=patch
+                )
+
+            if persisted_generation(story_id) is not None:
+                only = element_scope(element_type, element_id, patch)
+                updated_story = story_service.update_generation_data(story_id, edit, data.get('version'), only=only)
+                return jsonify({**updated_story, 'partial': only is not None})
+
             story_data = data.get('story_data', {})
-            updates = data.get('updates', {})
-            
             if not story_data:
                 return jsonify({"error": "Story data is required"}), 400
-                
-            # Update the story element
-            updated_story = story_generation_service.update_story_element(
-                story_data, element_type, element_id or 'story', updates
-            )
+            updated_story = edit(story_data)
 
-            # Persist generation data onto the story if it exists
-            try:
-                # Best-effort: if story exists, attach generation_data
-                if cloud_service.get_document(Config.STORIES_COLLECTION, story_id):
-                    story_service.update_story(story_id, { 'generation_data': updated_story })
-            except Exception as persist_err:
-                app.logger.warning(f"Could not persist generation data for story {story_id}: {persist_err}")
-            
+            # A story that exists but has no generation data yet gets this draft as its first version
+            if cloud_service.get_document(Config.STORIES_COLLECTION, story_id):
+                updated_story = story_service.update_generation_data(story_id, lambda current: updated_story)
             return jsonify(updated_story)
             
+        except VersionConflict as e:
+            return version_conflict_response(e)
+        except JsonPatchError as e:
+            return jsonify({"error": f"Invalid patch: {e}"}), 400
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 404
         except Exception as e:
             app.logger.error(f"Error updating story element: {str(e)}")
             return jsonify({"error": "Failed to update story element"}), 500
@@ -174,44 +336,130 @@ def create_app():
     @app.route('/api/stories/<story_id>/regenerate/<element_type>', methods=['POST'])
     @app.route('/api/stories/<story_id>/regenerate/<element_type>/<element_id>', methods=['POST'])
     def regenerate_story_element(story_id, element_type, element_id=None):
-        """Regenerate a specific story element or entire story"""
+        """Regenerate a specific story element or entire story.
+
+        A single scene or character (regenerate/scene/<id>) is regenerated alone, with its
+        neighbouring scenes as context; for saved stories only those are read and only the
+        regenerated element is written (the response is "partial", as for element edits).
+        Identical requests arriving while one is running share its result.
+        """
         try:
-            data = request.get_json()
-            story_data = data.get('story_data', {})
-            
-            if not story_data:
-                return jsonify({"error": "Story data is required"}), 400
-            
-            # Regenerate the story element
-            updated_story = story_generation_service.regenerate_story_element(
-                story_data, element_type, element_id
+            data = request.get_json(silent=True) or {}
+            body, status = regenerate_flight.do(
+                request_key(story_id, element_type, element_id, data),
+                lambda: regenerate_element(story_id, element_type, element_id, data)
             )
-
-            # Persist generation data if a real story exists
-            try:
-                if cloud_service.get_document(Config.STORIES_COLLECTION, story_id):
-                    story_service.update_story(story_id, { 'generation_data': updated_story })
-            except Exception as persist_err:
-                app.logger.warning(f"Could not persist regenerated generation data for story {story_id}: {persist_err}")
-            
-            return jsonify(updated_story)
+            return jsonify(body), status
             
+        except QueueTimeout as e:
+            return queue_timeout_response(e)
+        except VersionConflict as e:
+            return version_conflict_response(e)
+        except LookupError as e:
+            return jsonify({"error": str(e)}), 404
         except Exception as e:
             app.logger.error(f"Error regenerating story element: {str(e)}")
             return jsonify({"error": "Failed to regenerate story element"}), 500
 
+    def regenerate_element(story_id, element_type, element_id, data):
+        """(response body, status) for regenerate_story_element"""
+        plan = prepare_regeneration(story_id, element_type, element_id, data)
+        if plan is None:
+            return {"error": "Story data is required"}, 400
+
+        # Regenerate the story element within the user's fair share of Gemini capacity
+        with gemini_gate.slot(plan['user_id']):
+            updated_story = cloud_service.run_async(
+                story_generation_service.aregenerate_story_element(plan['story_data'], element_type, element_id)
+            )
+        return save_regeneration(story_id, element_type, element_id, plan, updated_story), 200
+
+    def prepare_regeneration(story_id, element_type, element_id, data):
+        """What a regeneration reads before calling Gemini (None when there is no story data)"""
+        stored = persisted_generation(story_id)
+        only = regeneration_scope(stored, element_type, element_id) if stored else None
+        persisted = story_service.get_generation_data(story_id, only) if stored else None
+        story_data = copy.deepcopy(persisted) if persisted is not None else data.get('story_data', {})
+
+        if not story_data:
+            return None
+        return {
+            'story_data': story_data,
+            'only': only,
+            'persisted': persisted is not None,
+            # Regeneration is slow; it must not overwrite edits made meanwhile
+            'expected_version': data.get('version', story_data.get('version', 0) if persisted is not None else None),
+            'user_id': data.get('user_id') or story_data.get('user_id') or 'anonymous',
+        }
+
+    def save_regeneration(story_id, element_type, element_id, plan, updated_story):
+        """Write a regenerated element (or story) back and return the response body"""
+        if plan['only'] is not None:
+            single = single_element_type(element_type, element_id)
+            element = next(item for item in updated_story[ELEMENT_TYPES[single]] if item.get('id') == element_id)
+
+            def put_element(current):
+                return story_generation_service.update_story_element(
+                    current, single, element_id, patch=[{'op': 'replace', 'path': '', 'value': element}]
+                )
+
+            updated_story = story_service.update_generation_data(
+                story_id, put_element, plan['expected_version'], only={ELEMENT_TYPES[single]: [element_id]}
+            )
+            return {**updated_story, 'partial': True}
+
+        if plan['persisted'] or cloud_service.get_document(Config.STORIES_COLLECTION, story_id):
+            updated_story = story_service.update_generation_data(
+                story_id, lambda current: updated_story, plan['expected_version']
+            )
+
+        return updated_story
+
+    # asgi.py runs the same phases around its own awaited Gemini call
+    app.extensions['video_story'].update(prepare_regeneration=prepare_regeneration,
+                                         save_regeneration=save_regeneration)
+
     @app.route('/api/stories/<story_id>/generation', methods=['GET'])
     def get_story_generation(story_id):
-        """Get persisted generation/storyboard data for a story"""
+        """Get persisted generation/storyboard data for a story.
+
+        ?view=index returns the story-level fields with the ordered scene_index/character_index
+        instead of the full scenes and characters (fetch those one at a time from /elements).
+        """
         try:
             story = cloud_service.get_document(Config.STORIES_COLLECTION, story_id)
             if not story:
                 return jsonify({"error": "Story not found"}), 404
-            return jsonify(story.get('generation_data') or {})
+            view = request.args.get('view', 'full')
+            stored = story.get('generation_data') or {}
+
+            def build():
+                if view == 'index' and is_split(stored):
+                    return stored
+                return story_service.storyboards.load(story_id, stored)[0]
+
+            # generation_data is only written through update_generation_data, which bumps updated_at
+            return conditional_json(build, validator=(story_id, story.get('updated_at'), view),
+                                    last_modified=parse_timestamp(story.get('updated_at')))
         except Exception as e:
             app.logger.error(f"Error fetching story generation data: {str(e)}")
             return jsonify({"error": "Failed to fetch story generation data"}), 500
 
+    @app.route('/api/stories/<story_id>/elements/<element_type>/<element_id>', methods=['GET'])
+    def get_story_element(story_id, element_type, element_id):
+        """Get one scene or character of a persisted storyboard"""
+        try:
+            if element_type not in ELEMENT_TYPES:
+                return jsonify({"error": f"Unknown element type: {element_type}"}), 404
+            stored = persisted_generation(story_id)
+            element = story_service.storyboards.get_element(story_id, stored, element_type, element_id) if stored else None
+            if not element:
+                return jsonify({"error": f"No {element_type} with id {element_id}"}), 404
+            return conditional_json(lambda: element)
+        except Exception as e:
+            app.logger.error(f"Error fetching story element: {str(e)}")
+            return jsonify({"error": "Failed to fetch story element"}), 500
+
     @app.route('/api/stories/<story_id>/generation', methods=['PUT'])
     def save_story_generation(story_id):
         """Persist generation/storyboard data for a story"""
@@ -221,12 +469,12 @@ def create_app():
             if not isinstance(story_data, dict) or not story_data:
                 return jsonify({"error": "story_data is required"}), 400
 
-            story = cloud_service.get_document(Config.STORIES_COLLECTION, story_id)
-            if not story:
-                return jsonify({"error": "Story not found"}), 404
-
-            updated = story_service.update_story(story_id, { 'generation_data': story_data })
-            return jsonify(updated.get('generation_data') or story_data)
+            updated = story_service.update_generation_data(story_id, lambda current: story_data, body.get('version'))
+            return jsonify(updated)
+        except VersionConflict as e:
+            return version_conflict_response(e)
+        except LookupError:
+            return jsonify({"error": "Story not found"}), 404
         except Exception as e:
             app.logger.error(f"Error saving story generation data: {str(e)}")
             return jsonify({"error": "Failed to save story generation data"}), 500
@@ -241,12 +489,14 @@ def create_app():
                 prompt = data.get('prompt', '')
                 use_previous_frame = data.get('use_previous_frame', False)
                 target_sequence = data.get('target_sequence')
+                priority = data.get('priority')
                 image_file = None
             else:
                 # Handle form data from frontend
                 prompt = request.form.get('prompt', '')
                 use_previous_frame = request.form.get('use_previous_frame', 'false').lower() == 'true'
                 target_sequence = request.form.get('target_sequence')
+                priority = request.form.get('priority')
                 image_file = request.files.get('image') if 'image' in request.files else None
             
             app.logger.info(f"Generating video for story {story_id} with prompt: {prompt}")
@@ -262,13 +512,18 @@ def create_app():
                     target_sequence = None
             except Exception:
                 target_sequence = None
+            try:
+                priority = int(priority) if priority is not None and str(priority).strip() else None
+            except (TypeError, ValueError):
+                priority = None
 
             result = video_service.generate_video_segment(
                 story_id=story_id,
                 prompt=prompt,
                 image_file=image_file,
                 use_previous_frame=use_previous_frame,
-                target_sequence=target_sequence
+                target_sequence=target_sequence,
+                priority=priority
             )
             
             return jsonify(result), 201
@@ -277,6 +532,36 @@ def create_app():
             app.logger.error(f"Error generating video: {str(e)}")
             return jsonify({"error": "Failed to generate video"}), 500
     
+    @app.route('/api/stories/<story_id>/generate-all', methods=['POST'])
+    def generate_all_segments(story_id):
+        """Generate every storyboard scene, running independent scenes in parallel"""
+        try:
+            data = request.get_json(silent=True) or {}
+            batch = batch_generation_service.start_batch(
+                story_id,
+                default_use_previous_frame=bool(data.get('use_previous_frame', False)),
+                continuity=data.get('continuity') or {},
+                max_parallel=data.get('max_parallel'),
+            )
+            return jsonify(batch), 202
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+        except Exception as e:
+            app.logger.error(f"Error starting batch generation: {str(e)}")
+            return jsonify({"error": "Failed to start batch generation"}), 500
+
+    @app.route('/api/stories/<story_id>/generate-all/<batch_id>', methods=['GET'])
+    def get_generate_all_status(story_id, batch_id):
+        """Get progress of a whole-story batch generation"""
+        try:
+            batch = batch_generation_service.get_batch(story_id, batch_id)
+            if not batch:
+                return jsonify({"error": "Batch not found"}), 404
+            return jsonify(batch)
+        except Exception as e:
+            app.logger.error(f"Error fetching batch status: {str(e)}")
+            return jsonify({"error": "Failed to fetch batch status"}), 500
+    
     @app.route('/api/stories/<story_id>/stitch', methods=['POST'])
     def stitch_story(story_id):
         """Stitch all video segments into final story"""
@@ -303,10 +588,25 @@ def create_app():
             app.logger.error(f"Stack trace: {traceback.format_exc()}")
             return jsonify({"status": "error", "error": str(e)}), 500
 
+    @app.route('/api/queue', methods=['GET'])
+    def queue_status():
+        """Queue positions and in-flight work for a user across Veo and Gemini"""
+        try:
+            user_id = request.args.get('user_id', 'anonymous')
+            return jsonify({
+                "user_id": user_id,
+                "veo": generation_queue.user_summary(user_id),
+                "gemini": gemini_gate.snapshot(user_id),
+            })
+        except Exception as e:
+            app.logger.error(f"Error fetching queue status: {str(e)}")
+            return jsonify({"error": "Failed to fetch queue status"}), 500
+
     # Entity Library endpoints removed
     
     return app
 
 if __name__ == '__main__':
     app = create_app()
-    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 8080)), debug=True)
+    # Development server only; use gunicorn.conf.py (wsgi:app or asgi:application) in production
+    app.run(host='0.0.0.0', port=int(os.environ.get('PORT', 8080)), debug=Config.DEBUG)
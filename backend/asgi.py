@@ -0,0 +1,216 @@
+"""
+ASGI entry point for the Video Story Generation Platform
+
+Long-running Gemini endpoints are served natively async, so a waiting request costs a
+coroutine rather than an OS thread; every other route is delegated to the Flask app. Native
+routes get the same shutdown draining, in-flight tracking, Server-Timing and request metrics
+as the Flask generation endpoints.
+
+Run with: uvicorn asgi:application --host 0.0.0.0 --port 8080
+"""
+
+import re
+import time
+import asyncio
+import json
+import logging
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app import create_app
+from config.settings import Config
+from services.fair_scheduler import QueueTimeout
+from services.story_service import VersionConflict
+from utils import instrumentation, lifecycle, metrics, tracing
+from utils.single_flight import request_key
+
+flask_app = create_app()
+services = flask_app.extensions['video_story']
+wsgi_application = WsgiToAsgi(flask_app)
+logger = logging.getLogger(__name__)
+request_logger = logging.getLogger('request_timing')
+
+
+async def _read_json(receive) -> dict:
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+    try:
+        return json.loads(body or b'{}')
+    except ValueError:
+        return {}
+
+
+async def _send_json(scope, send, status: int, payload, headers: dict = None):
+    body = json.dumps(payload).encode('utf-8')
+    raw_headers = [(b'content-type', b'application/json'), (b'content-length', str(len(body)).encode())]
+    origin = dict(scope.get('headers') or []).get(b'origin', b'').decode()
+    if origin in Config.CORS_ORIGINS:
+        raw_headers.append((b'access-control-allow-origin', origin.encode()))
+    for key, value in (headers or {}).items():
+        raw_headers.append((key.lower().encode(), str(value).encode()))
+    timings = instrumentation.current_timings()
+    if timings is not None and Config.SERVER_TIMING_HEADER:
+        raw_headers.append((b'server-timing', timings.server_timing().encode()))
+        if origin in Config.CORS_ORIGINS:
+            raw_headers.append((b'timing-allow-origin', origin.encode()))
+    trace = tracing.current_trace()
+    if trace is not None:
+        raw_headers.append((Config.REQUEST_ID_HEADER.lower().encode(), trace.request_id.encode()))
+    await send({'type': 'http.response.start', 'status': status, 'headers': raw_headers})
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def generate_story_from_prompt(scope, receive, send):
+    """Async twin of POST /api/stories/generate"""
+    data = await _read_json(receive)
+    prompt = (data.get('prompt') or '').strip()
+    if not prompt:
+        await _send_json(scope, send, 400, {"error": "Prompt is required"})
+        return
+
+    gate = services['gemini_gate']
+    user_id = data.get('user_id', 'anonymous')
+    try:
+        # Waiting for a fair-share slot only happens under contention and holds no thread
+        ticket = await gate.aacquire(user_id)
+    except QueueTimeout as e:
+        await _send_json(scope, send, 503, {"error": "Generation capacity is busy, please retry",
+                                            "queue_position": e.position}, {'Retry-After': '30'})
+        return
+
+    try:
+        # Run on the CloudService loop that owns the genai aio client
+        future = services['cloud_service'].submit_async(
+            services['story_generation_service'].agenerate_story_from_prompt(prompt, data.get('preferences', {}))
+        )
+        story_data = await asyncio.wrap_future(future)
+        await _send_json(scope, send, 201, story_data, {'X-Queue-Position': ticket['queue_position']})
+    except Exception as e:
+        logger.error(f"Error generating story from prompt: {str(e)}")
+        await _send_json(scope, send, 500, {"error": "Failed to generate story"})
+    finally:
+        gate.release(user_id)
+
+
+async def regenerate_story_element(scope, receive, send, story_id, element_type, element_id=None):
+    """Async twin of POST /api/stories/<story_id>/regenerate/<element_type>[/<element_id>]"""
+    data = await _read_json(receive)
+    try:
+        # Shares single-flight calls with the Flask route, so duplicates on either path join one run
+        body, status = await services['regenerate_flight'].ado(
+            request_key(story_id, element_type, element_id, data),
+            lambda: _regenerate_element(story_id, element_type, element_id, data)
+        )
+        await _send_json(scope, send, status, body)
+    except QueueTimeout as e:
+        await _send_json(scope, send, 503, {"error": "Generation capacity is busy, please retry",
+                                            "queue_position": e.position}, {'Retry-After': '30'})
+    except VersionConflict as e:
+        await _send_json(scope, send, 409, {"error": "Story was changed by someone else; reload and retry",
+                                            "version": e.current_version})
+    except LookupError as e:
+        await _send_json(scope, send, 404, {"error": str(e)})
+    except Exception as e:
+        logger.error(f"Error regenerating story element: {str(e)}")
+        await _send_json(scope, send, 500, {"error": "Failed to regenerate story element"})
+
+
+async def _regenerate_element(story_id, element_type, element_id, data):
+    """(response body, status); only the short Firestore reads and writes borrow a thread"""
+    plan = await asyncio.to_thread(services['prepare_regeneration'], story_id, element_type, element_id, data)
+    if plan is None:
+        return {"error": "Story data is required"}, 400
+
+    gate = services['gemini_gate']
+    await gate.aacquire(plan['user_id'])
+    try:
+        future = services['cloud_service'].submit_async(
+            services['story_generation_service'].aregenerate_story_element(plan['story_data'], element_type, element_id)
+        )
+        updated_story = await asyncio.wrap_future(future)
+    finally:
+        gate.release(plan['user_id'])
+    body = await asyncio.to_thread(services['save_regeneration'], story_id, element_type, element_id,
+                                   plan, updated_story)
+    return body, 200
+
+
+async def _serve_native(handler, scope, receive, send, params):
+    """Run a native route with the draining, in-flight tracking and metrics of the Flask app"""
+    inflight = services['inflight']
+    started = time.perf_counter()
+    response = {'status': 500}
+
+    async def observed_send(message):
+        if message['type'] == 'http.response.start':
+            response['status'] = message['status']
+        await send(message)
+
+    try:
+        if inflight.draining:
+            await _send_json(scope, observed_send, 503, {"error": "Server is shutting down, please retry"},
+                             {'Retry-After': '5'})
+            return
+        inflight.enter()
+        try:
+            await handler(scope, receive, observed_send, **params)
+        finally:
+            inflight.exit()
+    finally:
+        method, path, status = scope['method'], scope['path'], response['status']
+        metrics.record_request(method, path, status, time.perf_counter() - started)
+        timings = instrumentation.current_timings()
+        if timings is not None and timings.stages:
+            fields = timings.as_fields()
+            fields.update({'method': method, 'path': path, 'status': status})
+            request_logger.info(f"{method} {path} {status} in {fields['duration_ms']}ms", extra={'fields': fields})
+
+
+ASYNC_ROUTES = [
+    ('POST', re.compile(r'/api/stories/generate'), generate_story_from_prompt),
+    ('POST', re.compile(r'/api/stories/(?P<story_id>[^/]+)/regenerate/(?P<element_type>[^/]+)'
+                        r'(?:/(?P<element_id>[^/]+))?'), regenerate_story_element),
+]
+
+
+def _match_route(scope):
+    """Native handler for an HTTP request and its path arguments, or (None, None) for the Flask app"""
+    if scope['type'] != 'http':
+        return None, None
+    for method, pattern, handler in ASYNC_ROUTES:
+        match = pattern.fullmatch(scope.get('path') or '')
+        if match and scope.get('method') == method:
+            return handler, {key: value for key, value in match.groupdict().items() if value is not None}
+    return None, None
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                # uvicorn's signal handling bypasses gunicorn's SIGTERM hook, so drain from here
+                # (it also covers running plain `uvicorn asgi:application`)
+                await asyncio.to_thread(lifecycle.run_shutdown)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    handler, params = _match_route(scope)
+    if handler:
+        headers = {key.decode('latin-1').lower(): value.decode('latin-1') for key, value in scope.get('headers') or []}
+        request_id = tracing.request_id_from(headers.get(Config.REQUEST_ID_HEADER.lower()))
+        trace_tokens = tracing.begin_trace(f"{scope['method']} {scope['path']}", request_id, headers.get('traceparent'))
+        token = instrumentation.begin_request()
+        try:
+            await _serve_native(handler, scope, receive, send, params)
+        finally:
+            instrumentation.end_request(token)
+            tracing.end_trace(trace_tokens)
+    else:
+        await wsgi_application(scope, receive, send)
@@ -0,0 +1,338 @@
+"""
+Endpoint benchmarks: the Flask app driven in-process against the offline backend (CLOUD_BACKEND=fake).
+
+Each scenario seeds the fake stores, fires requests from a thread pool of test clients and
+reports throughput and p50/p95/p99 latency. Results can be saved as a baseline and later
+compared against it; a p95 or throughput regression beyond the tolerance exits non-zero.
+
+Usage (from the backend directory):
+    python -m benchmarks.endpoints
+    python -m benchmarks.endpoints --scenarios list_stories,poll_running --requests 500
+    python -m benchmarks.endpoints --save-baseline benchmarks/baseline.json
+    python -m benchmarks.endpoints --compare benchmarks/baseline.json --tolerance 0.25
+
+The poll_completed scenario needs opencv-python (synthetic clips); stitch also needs moviepy.
+Scenarios whose dependencies are missing are reported as skipped.
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import uuid
+import argparse
+import importlib.util
+import platform
+import tempfile
+import threading
+import contextlib
+from types import SimpleNamespace
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+# Read by config.settings at import time, so set before the app is imported
+os.environ['CLOUD_BACKEND'] = 'fake'
+os.environ['DEFER_BACKGROUND_WORKERS'] = 'true'  # no dispatcher or warm-up threads competing with requests
+os.environ.setdefault('FAKE_GEMINI_SECONDS', '0.05')
+os.environ.setdefault('FAKE_STORAGE_DIR', tempfile.mkdtemp(prefix='bench-storage-'))
+os.environ.setdefault('TRACE_EXPORTER', 'none')
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from config.settings import Config  # noqa: E402
+
+# A request is (method, path, json body); a scenario builds them after seeding
+Request = tuple
+
+
+class Skip(Exception):
+    """Raised by a scenario whose optional dependencies are missing"""
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[rank - 1]
+
+
+def run_load(app, requests: List[Request], concurrency: int) -> Dict[str, Any]:
+    """Send `requests` from `concurrency` threads (one test client each) and summarize latencies"""
+    local = threading.local()
+    latencies: List[float] = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def send(request: Request):
+        client = getattr(local, 'client', None)
+        if client is None:
+            client = local.client = app.test_client()
+        method, path, body = request
+        started = time.perf_counter()
+        response = client.open(path, method=method, json=body)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with lock:
+            latencies.append(elapsed_ms)
+            if response.status_code >= 400:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(send, requests))
+    wall_s = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'concurrency': concurrency,
+        'wall_s': round(wall_s, 3),
+        'throughput_rps': round(len(latencies) / wall_s, 1) if wall_s else 0.0,
+        'mean_ms': round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+        'p50_ms': round(percentile(latencies, 50), 2),
+        'p95_ms': round(percentile(latencies, 95), 2),
+        'p99_ms': round(percentile(latencies, 99), 2),
+    }
+
+
+# --------------------------------------------------------------------------- seeding
+
+def seed_story(services: Dict[str, Any], user_id: str, segments: int, video_uri: str = None) -> str:
+    """Create a story with `segments` completed segments directly in the fake store"""
+    cloud_service = services['cloud_service']
+    story = services['story_service'].create_story(title='Benchmark story', description='', user_id=user_id)
+    for sequence in range(1, segments + 1):
+        segment_id = str(uuid.uuid4())
+        uri = video_uri or f"gs://{Config.GCS_BUCKET_NAME}/videos/{segment_id}/sample_0.mp4"
+        cloud_service.save_document(Config.SEGMENTS_COLLECTION, segment_id, {
+            'story_id': story['id'],
+            'sequence_number': sequence,
+            'prompt': f"Scene {sequence}",
+            'status': 'completed',
+            'video_url': uri,
+            'video_urls': [uri],
+            'created_at': f"2024-01-01T00:00:{sequence % 60:02d}",
+        })
+    return story['id']
+
+
+def seed_operations(services: Dict[str, Any], count: int) -> List[str]:
+    """Submit `count` fake Veo operations and record them like submit_generation_job does"""
+    cloud_service = services['cloud_service']
+    operation_ids = []
+    for _ in range(count):
+        segment_id = str(uuid.uuid4())
+        operation_id = str(uuid.uuid4())
+        config = SimpleNamespace(output_gcs_uri=f"gs://{Config.GCS_BUCKET_NAME}/videos/{segment_id}/",
+                                 duration_seconds=Config.DEFAULT_VIDEO_DURATION)
+        operation = cloud_service.generate_videos(model=Config.VEO_MODEL_FAST, prompt='benchmark', config=config)
+        cloud_service.save_document(Config.SEGMENTS_COLLECTION, segment_id, {
+            'story_id': 'benchmark', 'sequence_number': 1, 'status': 'generating',
+        })
+        cloud_service.save_document(Config.OPERATIONS_COLLECTION, operation_id, {
+            'segment_id': segment_id,
+            'operation_name': operation.name,
+            'model_used': Config.VEO_MODEL_FAST,
+            'status': 'running',
+        })
+        operation_ids.append(operation_id)
+    return operation_ids
+
+
+def synthetic_clip_uri(services: Dict[str, Any]) -> str:
+    """Upload one synthetic clip to fake storage and return its gs:// URI"""
+    try:
+        from utils.synthetic_media import synthetic_mp4_bytes
+        data = synthetic_mp4_bytes(float(Config.DEFAULT_VIDEO_DURATION))
+    except ImportError as e:
+        raise Skip(f"synthetic clips need opencv-python ({e})")
+    blob_name = f"videos/benchmark-{uuid.uuid4().hex}/sample_0.mp4"
+    return services['cloud_service'].upload_bytes_to_gcs(data, blob_name, content_type='video/mp4')
+
+
+# --------------------------------------------------------------------------- scenarios
+
+def create_story(services, n: int, **_) -> List[Request]:
+    return [('POST', '/api/stories', {'title': f"Story {i}", 'description': '', 'user_id': 'bench-create'})
+            for i in range(n)]
+
+
+def list_stories(services, n: int, stories: int, segments: int, **_) -> List[Request]:
+    user_id = f"bench-list-{uuid.uuid4().hex[:8]}"
+    for _ in range(stories):
+        seed_story(services, user_id, segments)
+    return [('GET', f"/api/stories?user_id={user_id}", None)] * n
+
+
+def get_story(services, n: int, segments: int, **_) -> List[Request]:
+    story_id = seed_story(services, 'bench-get', segments)
+    return [('GET', f"/api/stories/{story_id}", None)] * n
+
+
+def generate_story(services, n: int, scenes: int, **_) -> List[Request]:
+    # Distinct users, so the per-user fair-share cap does not serialize the load
+    preferences = {'target_total_duration_seconds': scenes * 8, 'max_scene_duration_seconds': 8}
+    return [('POST', '/api/stories/generate',
+             {'prompt': 'A man and his dog explore a harbour town', 'preferences': preferences,
+              'user_id': f"bench-gen-{i}"})
+            for i in range(n)]
+
+
+def poll_running(services, n: int, operations: int, **_) -> List[Request]:
+    Config.FAKE_VEO_SECONDS = 1e9
+    operation_ids = seed_operations(services, operations)
+    return [('GET', f"/api/generation-status/{operation_ids[i % operations]}", None) for i in range(n)]
+
+
+def poll_completed(services, n: int, operations: int, **_) -> List[Request]:
+    if importlib.util.find_spec('cv2') is None:
+        raise Skip("completed operations render clips with opencv-python")
+    Config.FAKE_VEO_SECONDS = 0
+    operation_ids = seed_operations(services, operations)
+    return [('GET', f"/api/generation-status/{operation_ids[i % operations]}", None) for i in range(n)]
+
+
+def stitch(services, n: int, segments: int, **_) -> List[Request]:
+    if importlib.util.find_spec('moviepy') is None:
+        raise Skip("stitching needs moviepy")
+    uri = synthetic_clip_uri(services)
+    story_ids = [seed_story(services, 'bench-stitch', segments, video_uri=uri) for _ in range(n)]
+    return [('POST', f"/api/stories/{story_id}/stitch", None) for story_id in story_ids]
+
+
+# name -> (builder, parameters, request count override, concurrency override)
+SCENARIOS: List[tuple] = [
+    ('create_story', create_story, {}, None, None),
+    ('list_stories[stories=10,segments=0]', list_stories, {'stories': 10, 'segments': 0}, None, None),
+    ('list_stories[stories=10,segments=8]', list_stories, {'stories': 10, 'segments': 8}, None, None),
+    ('list_stories[stories=50,segments=8]', list_stories, {'stories': 50, 'segments': 8}, None, None),
+    ('get_story[segments=0]', get_story, {'segments': 0}, None, None),
+    ('get_story[segments=32]', get_story, {'segments': 32}, None, None),
+    ('generate_story[scenes=4]', generate_story, {'scenes': 4}, 40, None),
+    ('generate_story[scenes=12]', generate_story, {'scenes': 12}, 40, None),
+    ('poll_running[operations=20]', poll_running, {'operations': 20}, None, 32),
+    ('poll_completed[operations=20]', poll_completed, {'operations': 20}, None, 32),
+    ('stitch[segments=4]', stitch, {'segments': 4}, 3, 1),
+    ('stitch[segments=16]', stitch, {'segments': 16}, 3, 1),
+]
+
+
+def run_scenarios(app, selected: Optional[List[str]], n: int, concurrency: int) -> Dict[str, Dict[str, Any]]:
+    services = app.extensions['video_story']
+    results: Dict[str, Dict[str, Any]] = {}
+    veo_seconds = Config.FAKE_VEO_SECONDS
+    for name, builder, params, count, threads in SCENARIOS:
+        if selected and not any(name.startswith(prefix) for prefix in selected):
+            continue
+        try:
+            requests = builder(services, n=count or n, **params)
+        except Skip as e:
+            results[name] = {'skipped': str(e)}
+            print(f"{name:<40} skipped: {e}", file=sys.stderr)
+            continue
+        # One request first, so one-time costs (imports, lazy clients) are not in the percentiles
+        run_load(app, requests[:1], 1)
+        results[name] = run_load(app, requests, threads or concurrency)
+        Config.FAKE_VEO_SECONDS = veo_seconds
+        print(f"{name:<40} done", file=sys.stderr)
+    return results
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float,
+            min_delta_ms: float) -> List[str]:
+    """Scenarios whose p95 rose or throughput fell by more than `tolerance` against the baseline"""
+    regressions = []
+    for name, current in results.items():
+        before = baseline.get(name)
+        if not before or 'skipped' in current or 'skipped' in before:
+            continue
+        p95_limit = before['p95_ms'] * (1 + tolerance)
+        if current['p95_ms'] > p95_limit and current['p95_ms'] - before['p95_ms'] > min_delta_ms:
+            regressions.append(f"{name}: p95 {before['p95_ms']:.1f}ms -> {current['p95_ms']:.1f}ms")
+        if current['throughput_rps'] < before['throughput_rps'] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {before['throughput_rps']:.1f} -> "
+                               f"{current['throughput_rps']:.1f} req/s")
+    return regressions
+
+
+def print_table(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]] = None):
+    header = f"{'scenario':<40} {'req':>5} {'err':>4} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    if baseline:
+        header += f" {'p95 vs base':>12}"
+    print(header)
+    for name, result in results.items():
+        if 'skipped' in result:
+            print(f"{name:<40} skipped")
+            continue
+        line = (f"{name:<40} {result['requests']:>5} {result['errors']:>4} {result['throughput_rps']:>8.1f} "
+                f"{result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f}")
+        before = (baseline or {}).get(name)
+        if before and 'p95_ms' in before and before['p95_ms']:
+            line += f" {(result['p95_ms'] / before['p95_ms'] - 1) * 100:>+11.1f}%"
+        print(line)
+
+
+def environment() -> Dict[str, Any]:
+    """Settings that make results comparable (recorded with a baseline)"""
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'fake_gemini_seconds': Config.FAKE_GEMINI_SECONDS,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenarios', default='', help='comma-separated scenario name prefixes (default: all)')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8, help='client threads per scenario')
+    parser.add_argument('--save-baseline', metavar='PATH', help='write results as a baseline JSON file')
+    parser.add_argument('--compare', metavar='PATH', help='compare against a baseline; exit 1 on regression')
+    parser.add_argument('--tolerance', type=float, default=0.25, help='allowed relative p95/throughput change')
+    parser.add_argument('--min-delta-ms', type=float, default=2.0, help='ignore p95 increases smaller than this')
+    parser.add_argument('--log-file', default=os.devnull, help='where the app logs go while benchmarking')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    args = parser.parse_args()
+
+    with open(args.log_file, 'a') as log_stream:
+        # The structured log handler binds to stdout when the app is created
+        with contextlib.redirect_stdout(log_stream):
+            from app import create_app
+            app = create_app()
+        selected = [prefix.strip() for prefix in args.scenarios.split(',') if prefix.strip()]
+        results = run_scenarios(app, selected, args.requests, args.concurrency)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            stored = json.load(f)
+        baseline = stored['results']
+        if stored.get('environment') != environment():
+            print(f"Note: baseline was recorded on {stored.get('environment')}", file=sys.stderr)
+
+    if args.json:
+        print(json.dumps({'environment': environment(), 'results': results}, indent=2))
+    else:
+        print_table(results, baseline)
+
+    if args.save_baseline:
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump({'environment': environment(), 'results': results}, f, indent=2)
+        print(f"Baseline written to {args.save_baseline}", file=sys.stderr)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance, args.min_delta_ms)
+        if regressions:
+            print("\nRegressions:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+Cold-start benchmark: import time, app construction time and first-request latency.
+
+Every run starts a fresh interpreter so module caches and clients are genuinely cold.
+
+Usage (from the backend directory):
+    python -m benchmarks.startup --runs 5
+    python -m benchmarks.startup --runs 3 --wait-ready 60   # also time until /ready (needs credentials)
+    python -m benchmarks.startup --importtime 15            # slowest modules by cumulative import time
+"""
+
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs inside the child interpreter; prints one JSON line of timings
+CHILD = r'''
+import json, time
+started = time.perf_counter()
+import app as app_module
+imported = time.perf_counter()
+app = app_module.create_app()
+created = time.perf_counter()
+client = app.test_client()
+response = client.get('/health')
+first_request = time.perf_counter()
+result = {
+    'import_s': imported - started,
+    'create_app_s': created - imported,
+    'first_health_ms': (first_request - created) * 1000,
+    'health_status': response.status_code,
+}
+wait_ready = float(__WAIT_READY__)
+if wait_ready:
+    ready_status = None
+    while time.perf_counter() - first_request < wait_ready:
+        ready_status = client.get('/ready').status_code
+        if ready_status == 200:
+            break
+        time.sleep(0.1)
+    result['ready_s'] = time.perf_counter() - started if ready_status == 200 else None
+print('BENCH ' + json.dumps(result))
+'''
+
+
+def run_once(wait_ready: float) -> dict:
+    code = CHILD.replace('__WAIT_READY__', repr(wait_ready))
+    proc = subprocess.run([sys.executable, '-c', code], cwd=BACKEND_DIR, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith('BENCH '):
+            return json.loads(line[len('BENCH '):])
+    raise RuntimeError(f"Benchmark child failed (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+
+def slowest_imports(top: int) -> list:
+    """Parse `python -X importtime` output into (cumulative_ms, module) pairs"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import app'],
+                          cwd=BACKEND_DIR, capture_output=True, text=True)
+    rows = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative_us, name = line[len('import time:'):].split('|')
+        rows.append((int(cumulative_us) / 1000, name.strip()))
+    rows.sort(reverse=True)
+    return rows[:top]
+
+
+def summarize(samples: list, key: str) -> str:
+    values = [s[key] for s in samples if s.get(key) is not None]
+    if not values:
+        return f"{key:<16} n/a"
+    return (f"{key:<16} min {min(values):9.3f}  median {statistics.median(values):9.3f}  "
+            f"max {max(values):9.3f}  (n={len(values)})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters to start')
+    parser.add_argument('--wait-ready', type=float, default=0, help='also poll /ready for up to N seconds')
+    parser.add_argument('--importtime', type=int, default=0, help='print the N slowest imports')
+    parser.add_argument('--json', action='store_true', help='print raw samples as JSON')
+    args = parser.parse_args()
+
+    samples = [run_once(args.wait_ready) for _ in range(args.runs)]
+    if args.json:
+        print(json.dumps(samples, indent=2))
+    else:
+        for key in ('import_s', 'create_app_s', 'first_health_ms', 'ready_s'):
+            if any(key in s for s in samples):
+                print(summarize(samples, key))
+
+    if args.importtime:
+        print(f"\nSlowest {args.importtime} imports (cumulative ms):")
+        for cumulative_ms, name in slowest_imports(args.importtime):
+            print(f"  {cumulative_ms:9.1f}  {name}")
+
+
+if __name__ == '__main__':
+    main()
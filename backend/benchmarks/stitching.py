@@ -0,0 +1,136 @@
+"""
+Stitching benchmark: the stitching engine (utils/stitching.py) on synthetic Veo-like clips.
+
+Clips are 8s 720p H.264 with AAC audio, rendered once with ffmpeg and reused. Each
+(strategy, segment count) pair runs in a fresh interpreter so peak RSS and CPU time belong
+to that run alone (ffmpeg and MoviePy reader subprocesses included). 'incremental' is timed
+appending the last segment to an already stitched file of the others.
+
+Usage (from the backend directory):
+    python -m benchmarks.stitching
+    python -m benchmarks.stitching --segments 10,50 --strategies copy,incremental
+    python -m benchmarks.stitching --json > stitch.json
+
+Needs moviepy (reencode) and an ffmpeg binary (imageio-ffmpeg or PATH).
+"""
+
+import os
+import sys
+import json
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
+
+from utils import stitching  # noqa: E402
+from utils.synthetic_media import write_veo_like_clip  # noqa: E402
+
+DISTINCT_CLIPS = 4  # cycled, so 100 segments do not need 100 renders
+
+
+def child(spec: dict):
+    """Run one stitch in this process and print its resource usage"""
+    import time
+    import resource
+
+    started = time.perf_counter()
+    result = stitching.stitch_files(spec['paths'], spec['output'], strategy=spec['strategy'],
+                                    base_path=spec.get('base'))
+    wall_s = time.perf_counter() - started
+    own = resource.getrusage(resource.RUSAGE_SELF)
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    scale = 1 if sys.platform == 'darwin' else 1024
+    result.update({
+        'wall_s': round(wall_s, 3),
+        'cpu_s': round(own.ru_utime + own.ru_stime + children.ru_utime + children.ru_stime, 3),
+        'peak_rss_mb': round(max(own.ru_maxrss, children.ru_maxrss) * scale / 2**20, 1),
+    })
+    print('BENCH ' + json.dumps(result))
+
+
+def run_child(spec: dict) -> dict:
+    proc = subprocess.run([sys.executable, '-m', 'benchmarks.stitching', '--child', json.dumps(spec)],
+                          cwd=BACKEND_DIR, capture_output=True, text=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith('BENCH '):
+            return json.loads(line[len('BENCH '):])
+    raise RuntimeError(f"Stitch child failed (exit {proc.returncode}):\n{proc.stderr[-2000:]}")
+
+
+def render_clips(work_dir: str, seconds: float, size: tuple) -> list:
+    clips = []
+    for index in range(DISTINCT_CLIPS):
+        path = os.path.join(work_dir, f"clip_{index}.mp4")
+        write_veo_like_clip(path, seconds, size, tone_hz=330 + 110 * index)
+        clips.append(path)
+    return clips
+
+
+def bench(strategy: str, count: int, clips: list, work_dir: str) -> dict:
+    paths = [clips[index % len(clips)] for index in range(count)]
+    output = os.path.join(work_dir, f"out_{strategy}_{count}.mp4")
+    spec = {'strategy': strategy, 'paths': paths, 'output': output}
+    if strategy == 'incremental':
+        # The earlier stitch is set-up, not part of the measurement
+        base = os.path.join(work_dir, f"base_{count}.mp4")
+        if count > 1:
+            stitching.stitch_files(paths[:-1], base, strategy='copy')
+            spec.update({'paths': paths[-1:], 'base': base})
+    try:
+        result = run_child(spec)
+    finally:
+        for path in (output, spec.get('base')):
+            if path and os.path.exists(path):
+                os.remove(path)
+    result.update({'strategy_requested': strategy, 'segments': count,
+                   'output_mb': round(result.pop('output_bytes') / 2**20, 1)})
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--segments', default='10,50,100', help='comma-separated segment counts')
+    parser.add_argument('--strategies', default=','.join(stitching.STRATEGIES), help='comma-separated strategies')
+    parser.add_argument('--clip-seconds', type=float, default=8.0)
+    parser.add_argument('--size', default='1280x720', help='clip size WxH')
+    parser.add_argument('--json', action='store_true', help='print results as JSON')
+    parser.add_argument('--child', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(json.loads(args.child))
+        return
+
+    counts = [int(value) for value in args.segments.split(',') if value.strip()]
+    strategies = [value.strip() for value in args.strategies.split(',') if value.strip()]
+    size = tuple(int(value) for value in args.size.lower().split('x'))
+
+    work_dir = tempfile.mkdtemp(prefix='stitch_bench_')
+    try:
+        print(f"Rendering {DISTINCT_CLIPS} synthetic {args.size} clips...", file=sys.stderr)
+        clips = render_clips(work_dir, args.clip_seconds, size)
+        results = []
+        for count in counts:
+            for strategy in strategies:
+                print(f"{strategy} x {count}...", file=sys.stderr)
+                results.append(bench(strategy, count, clips, work_dir))
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'strategy':<12} {'segments':>8} {'wall s':>8} {'cpu s':>8} {'peak RSS MB':>12} "
+          f"{'output MB':>10} {'video s':>8}  used")
+    for r in results:
+        print(f"{r['strategy_requested']:<12} {r['segments']:>8} {r['wall_s']:>8.2f} {r['cpu_s']:>8.2f} "
+              f"{r['peak_rss_mb']:>12.1f} {r['output_mb']:>10.1f} {r['video_seconds']:>8.1f}  {r['strategy']}")
+
+
+if __name__ == '__main__':
+    main()
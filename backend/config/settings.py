@@ -3,10 +3,23 @@ Configuration settings for the application
 """
 
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
 
+def _parse_weights(raw: str) -> dict:
+    """Parse 'user_a=2,user_b=0.5' into {'user_a': 2.0, 'user_b': 0.5}"""
+    weights = {}
+    for item in (raw or '').split(','):
+        if '=' in item:
+            user_id, weight = item.split('=', 1)
+            try:
+                weights[user_id.strip()] = float(weight)
+            except ValueError:
+                pass
+    return weights
+
 class Config:
     """Application configuration class"""
     
@@ -14,14 +27,47 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
     DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     
+    # Serving settings
+    # Set by gunicorn.conf.py so background threads start in each worker after fork, not in the master
+    DEFER_BACKGROUND_WORKERS = os.environ.get('DEFER_BACKGROUND_WORKERS', 'False').lower() == 'true'
+    SHUTDOWN_DRAIN_TIMEOUT = int(os.environ.get('SHUTDOWN_DRAIN_TIMEOUT', '110'))  # seconds
+    
+    # Logging: fraction of INFO/DEBUG records kept per logger, e.g. 'services.cloud_service=0.1'
+    LOG_SAMPLE_RATES = _parse_weights(os.environ.get('LOG_SAMPLE_RATES', ''))
+    # Per-request stage breakdown in a Server-Timing response header
+    SERVER_TIMING_HEADER = os.environ.get('SERVER_TIMING_HEADER', 'True').lower() == 'true'
+    # Request correlation and trace export ('none', 'file' or 'otlp')
+    REQUEST_ID_HEADER = os.environ.get('REQUEST_ID_HEADER', 'X-Request-ID')
+    TRACE_EXPORTER = os.environ.get('TRACE_EXPORTER', 'none').lower()
+    TRACE_FILE = os.environ.get('TRACE_FILE', 'traces.jsonl')
+    TRACE_COLLECTOR_URL = os.environ.get('TRACE_COLLECTOR_URL', 'http://localhost:4318/v1/traces')
+    TRACE_SAMPLE_RATE = float(os.environ.get('TRACE_SAMPLE_RATE', '1.0'))
+    TRACE_SLOW_MS = float(os.environ.get('TRACE_SLOW_MS', '5000'))  # always exported when slower
+    
     # Google Cloud settings
     GOOGLE_CLOUD_PROJECT = os.environ.get('GOOGLE_CLOUD_PROJECT', 'tubi-gemini-sandbox')
     GOOGLE_CLOUD_REGION = os.environ.get('GOOGLE_CLOUD_REGION', 'us-central1')
-    GOOGLE_APPLICATION_CREDENTIALS = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS', 'service-account-key.json')
+    # Key file used when present (relative to backend/); otherwise Application Default Credentials
+    GOOGLE_APPLICATION_CREDENTIALS = os.environ.get('GOOGLE_APPLICATION_CREDENTIALS', '../service-account-key.json')
+    
+    # 'gcp' or 'fake' (in-process Firestore/GCS/genai stand-ins for offline load and latency tests)
+    CLOUD_BACKEND = os.environ.get('CLOUD_BACKEND', 'gcp').lower()
+    FAKE_STORAGE_DIR = os.environ.get('FAKE_STORAGE_DIR', os.path.join(tempfile.gettempdir(), 'video-story-fake-storage'))
+    FAKE_GEMINI_SECONDS = float(os.environ.get('FAKE_GEMINI_SECONDS', '0.2'))  # latency per Gemini call
+    FAKE_VEO_SECONDS = float(os.environ.get('FAKE_VEO_SECONDS', '10'))  # until a Veo operation is done
+    FAKE_VEO_FAILURE_RATE = float(os.environ.get('FAKE_VEO_FAILURE_RATE', '0'))
+    FAKE_VEO_RATE_LIMIT_RATE = float(os.environ.get('FAKE_VEO_RATE_LIMIT_RATE', '0'))  # submissions answered 429
+    FAKE_VIDEO_SIZE = os.environ.get('FAKE_VIDEO_SIZE', '320x180')
+    FAKE_STORY_SCENES = int(os.environ.get('FAKE_STORY_SCENES', '4'))  # when the prompt sets no duration
     
     # Storage settings
     GCS_BUCKET_NAME = os.environ.get('GCS_BUCKET_NAME', 'video-story-platform-storage')
     TEMP_UPLOAD_FOLDER = os.environ.get('TEMP_UPLOAD_FOLDER', 'temp_uploads')
+    # Media uploads (CloudService.upload_file_to_gcs): resumable chunks, parallel composite above a size
+    GCS_UPLOAD_CHUNK_MB = int(os.environ.get('GCS_UPLOAD_CHUNK_MB', '16'))
+    GCS_COMPOSITE_THRESHOLD_MB = int(os.environ.get('GCS_COMPOSITE_THRESHOLD_MB', '150'))
+    GCS_UPLOAD_PARALLELISM = int(os.environ.get('GCS_UPLOAD_PARALLELISM', '8'))
+    GCS_UPLOAD_RETRY_DEADLINE = float(os.environ.get('GCS_UPLOAD_RETRY_DEADLINE', '300'))  # seconds
     
     # Video generation settings
     VEO_MODEL_STANDARD = "veo-3.0-generate-001"
@@ -30,22 +76,84 @@ class Config:
     GEMINI_MODEL = "gemini-2.5-flash"
     # Gemini thinking configuration (0 disables thinking as per docs)
     GEMINI_THINKING_BUDGET = int(os.environ.get('GEMINI_THINKING_BUDGET', '0'))
+    # Concurrent per-scene Gemini calls on the async path
+    GEMINI_SCENE_CONCURRENCY = int(os.environ.get('GEMINI_SCENE_CONCURRENCY', '8'))
+    # Estimated tokens of story context per Gemini prompt (utils/story_context.py)
+    PROMPT_CONTEXT_TOKEN_BUDGET = int(os.environ.get('PROMPT_CONTEXT_TOKEN_BUDGET', '1200'))
+    # Explicit Gemini context caching of the shared scene prompt (services/context_cache.py)
+    GEMINI_CONTEXT_CACHE = os.environ.get('GEMINI_CONTEXT_CACHE', 'True').lower() == 'true'
+    GEMINI_CONTEXT_CACHE_TTL = int(os.environ.get('GEMINI_CONTEXT_CACHE_TTL', '900'))  # seconds
+    # Smallest prefix each model accepts as cached content; GEMINI_CONTEXT_CACHE_MIN_TOKENS overrides it
+    GEMINI_CACHE_MIN_TOKENS_BY_MODEL = {'gemini-2.5-flash': 1024, 'gemini-2.5-pro': 4096}
+    GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.environ.get('GEMINI_CONTEXT_CACHE_MIN_TOKENS', '0'))
     
     # Video settings
     DEFAULT_VIDEO_DURATION = 8  # seconds
     DEFAULT_ASPECT_RATIO = "16:9"
     DEFAULT_RESOLUTION = "720p"
     MAX_SEGMENTS_PER_STORY = 100
+    # How stitch_story_videos concatenates segments: 'reencode', 'copy' or 'incremental' (utils/stitching.py)
+    STITCH_STRATEGY = os.environ.get('STITCH_STRATEGY', 'reencode').lower()
     
     # Performance settings (aligned with veo3_video_generation.py patterns)
     MAX_CONTENT_LENGTH = 100 * 1024 * 1024  # 100MB max file upload
     OPERATION_POLL_INTERVAL = 15  # seconds (matches documentation polling interval)
     OPERATION_TIMEOUT = 600  # seconds (10 minutes)
+    # Status ETAs and next_poll_after_ms hints from learned Veo durations (services/operation_eta.py)
+    OPERATION_ETA_DEFAULT_SECONDS = int(os.environ.get('OPERATION_ETA_DEFAULT_SECONDS', '90'))  # until learned
+    POLL_HINT_MIN_SECONDS = float(os.environ.get('POLL_HINT_MIN_SECONDS', '3'))
+    POLL_HINT_MAX_SECONDS = float(os.environ.get('POLL_HINT_MAX_SECONDS', '60'))
+    
+    # Generation queue / dispatcher settings
+    GENERATION_QUEUE_BACKEND = os.environ.get('GENERATION_QUEUE_BACKEND', 'firestore')  # firestore | local
+    GENERATION_DISPATCH_INTERVAL = float(os.environ.get('GENERATION_DISPATCH_INTERVAL', '1.0'))  # seconds
+    # One worker at a time holds the dispatch lease and submits to Veo (Firestore queue backend)
+    GENERATION_LEASE_TTL = int(os.environ.get('GENERATION_LEASE_TTL', '15'))  # seconds
+    # Worker processes per instance; gunicorn.conf.py fills it in. With the local queue backend
+    # every worker dispatches its own jobs, so each gets this share of VEO_RATE_LIMITS.
+    WORKER_PROCESSES = max(int(os.environ.get('WEB_CONCURRENCY', '1')), 1)
+    GENERATION_DEFAULT_PRIORITY = 5  # higher runs first
+    GENERATION_MAX_ATTEMPTS = int(os.environ.get('GENERATION_MAX_ATTEMPTS', '6'))
+    GENERATION_BACKOFF_BASE = 2.0  # seconds, doubled per 429
+    GENERATION_BACKOFF_MAX = 120.0  # seconds
+    GENERATION_CLAIM_TIMEOUT = 300  # seconds before a stuck 'dispatching' job is requeued
+    # Whole-story batch generation
+    BATCH_GENERATION_MAX_PARALLEL = int(os.environ.get('BATCH_GENERATION_MAX_PARALLEL', '4'))
+    BATCH_GENERATION_PRIORITY = 3  # below interactive single-scene requests
+    BATCH_POLL_INTERVAL = 5  # seconds between status checks of in-flight scenes
+    BATCH_HEARTBEAT_INTERVAL = 30  # seconds between progress writes of a running batch
+    BATCH_MAX_STATUS_ERRORS = 5  # consecutive failed status checks before a scene is given up on
+    # A running batch whose owner has not written for this long is resumed by another worker
+    BATCH_STALE_AFTER = int(os.environ.get('BATCH_STALE_AFTER', '120'))  # seconds
+    # Per-user fairness (weighted fair queuing across user_id)
+    USER_WEIGHTS = _parse_weights(os.environ.get('USER_WEIGHTS', ''))
+    PER_USER_MAX_VEO_IN_FLIGHT = int(os.environ.get('PER_USER_MAX_VEO_IN_FLIGHT', '4'))
+    GEMINI_MAX_CONCURRENCY = int(os.environ.get('GEMINI_MAX_CONCURRENCY', '8'))
+    PER_USER_MAX_GEMINI_CONCURRENCY = int(os.environ.get('PER_USER_MAX_GEMINI_CONCURRENCY', '2'))
+    FAIR_QUEUE_TIMEOUT = 300  # seconds a request may wait for a Gemini slot
+    # Per-model Veo submission limits (requests per minute, burst size)
+    VEO_RATE_LIMITS = {
+        VEO_MODEL_FAST: (float(os.environ.get('VEO_FAST_RPM', '10')), int(os.environ.get('VEO_FAST_BURST', '2'))),
+        VEO_MODEL_IMAGE: (float(os.environ.get('VEO_IMAGE_RPM', '10')), int(os.environ.get('VEO_IMAGE_BURST', '2'))),
+        VEO_MODEL_STANDARD: (float(os.environ.get('VEO_STANDARD_RPM', '5')), int(os.environ.get('VEO_STANDARD_BURST', '1'))),
+    }
+    
+    # Response compression (brotli is used when the optional `brotli` package is installed)
+    COMPRESSION_MIN_BYTES = int(os.environ.get('COMPRESSION_MIN_BYTES', '1024'))
+    GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', '6'))
+    BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', '5'))
+    
+    # Allowed browser origins
+    CORS_ORIGINS = ["http://localhost:5000", "http://localhost:3000"]
     
     # Firestore collection names
     STORIES_COLLECTION = 'stories'
     SEGMENTS_COLLECTION = 'segments'
     OPERATIONS_COLLECTION = 'operations'
+    GENERATION_QUEUE_COLLECTION = 'generation_queue'
+    GENERATION_LEASES_COLLECTION = 'generation_leases'
+    GENERATION_BATCHES_COLLECTION = 'generation_batches'
+    OPERATION_STATS_COLLECTION = 'operation_stats'
     
     @staticmethod
     def init_app(app):
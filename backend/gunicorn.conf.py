@@ -0,0 +1,105 @@
+"""
+Gunicorn configuration for the Video Story Generation Platform
+
+    gunicorn -c gunicorn.conf.py                      # threaded WSGI workers (default)
+    GUNICORN_WORKER_CLASS=uvicorn gunicorn -c gunicorn.conf.py   # ASGI workers serving asgi:application
+
+The app is preloaded in the master so imports and config happen once; each worker then
+re-creates its network clients and starts its background threads in post_fork.
+"""
+
+import os
+import shutil
+import multiprocessing
+
+# Must be set before the app is preloaded so create_app() leaves thread start-up to post_fork
+os.environ.setdefault('DEFER_BACKGROUND_WORKERS', 'true')
+# Workers write metric samples here so /metrics can aggregate all of them (set before prometheus_client loads)
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/video-story-metrics')
+
+WORKER_CLASSES = {
+    'gthread': 'gthread',
+    'sync': 'sync',
+    'gevent': 'gevent',
+    'uvicorn': 'uvicorn.workers.UvicornWorker',
+}
+
+worker_class = WORKER_CLASSES.get(os.environ.get('GUNICORN_WORKER_CLASS', 'gthread'),
+                                  os.environ.get('GUNICORN_WORKER_CLASS', 'gthread'))
+wsgi_app = os.environ.get(
+    'GUNICORN_APP',
+    'asgi:application' if worker_class == WORKER_CLASSES['uvicorn'] else 'wsgi:app',
+)
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8080')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+# Config.WORKER_PROCESSES reads this back when the app is preloaded
+os.environ['WEB_CONCURRENCY'] = str(workers)
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+preload_app = True
+
+# Story generation and stitching are long requests; give them room and drain them on shutdown
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '300'))
+graceful_timeout = int(os.environ.get('SHUTDOWN_DRAIN_TIMEOUT', '110')) + 10
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    """Start each master with an empty metrics directory so stale worker files are not aggregated"""
+    metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def post_fork(server, worker):
+    from utils import lifecycle
+    lifecycle.run_post_fork()
+    server.log.info(f"Worker {worker.pid} re-initialized clients and background workers")
+
+
+def post_worker_init(worker):
+    """Flip readiness to draining the moment SIGTERM arrives, before gunicorn stops the loop.
+
+    UvicornWorker replaces this handler with uvicorn's own when it starts serving; there the
+    ASGI lifespan shutdown in asgi.py starts the drain instead.
+    """
+    import signal
+    from utils import lifecycle
+
+    handle_exit = signal.getsignal(signal.SIGTERM)
+
+    def on_sigterm(signum, frame):
+        lifecycle.run_drain_start()
+        if callable(handle_exit):
+            handle_exit(signum, frame)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+
+def worker_int(worker):
+    """SIGINT/SIGQUIT: stop claiming jobs and hand running batches back before the quick exit"""
+    from utils import lifecycle
+    lifecycle.run_drain_start()
+
+
+def worker_abort(worker):
+    """SIGABRT (worker timed out): same hand-off, so another worker resumes its batches right away"""
+    from utils import lifecycle
+    lifecycle.run_drain_start()
+
+
+def worker_exit(server, worker):
+    from utils import lifecycle
+    lifecycle.run_shutdown()
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited; its counters and histograms stay in the totals"""
+    try:
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+    except ImportError:
+        pass
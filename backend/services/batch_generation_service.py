@@ -0,0 +1,375 @@
+"""
+Whole-story batch video generation with a continuity-aware DAG scheduler
+"""
+
+import os
+import time
+import uuid
+import socket
+import logging
+import threading
+from typing import Dict, List, Optional, Any, Tuple
+from datetime import datetime
+
+from config.settings import Config
+from services.cloud_service import CloudService
+from services.storyboard_store import StoryboardStore
+from services.video_service import VideoService
+
+TERMINAL_NODE_STATUSES = ('completed', 'failed', 'skipped')
+
+
+def build_generation_plan(scenes: List[Dict[str, Any]], default_use_previous_frame: bool = False,
+                          continuity: Dict[str, bool] = None) -> List[Dict[str, Any]]:
+    """Turn storyboard scenes into DAG nodes.
+
+    A scene that continues from the previous frame depends on the scene immediately before it;
+    every other scene is a root and can start right away. `critical_path` is the length of the
+    chain hanging off a node and is used to start long chains first.
+    """
+    continuity = continuity or {}
+    ordered = sorted(enumerate(scenes), key=lambda pair: (pair[1].get('sequence') or pair[0] + 1, pair[0]))
+
+    nodes: List[Dict[str, Any]] = []
+    for index, (_, scene) in enumerate(ordered):
+        scene_id = scene.get('id') or f"scene-{index + 1}"
+        if scene_id in continuity:
+            chained = bool(continuity[scene_id])
+        elif 'use_previous_frame' in scene:
+            chained = bool(scene.get('use_previous_frame'))
+        else:
+            chained = default_use_previous_frame
+        nodes.append({
+            'scene_id': scene_id,
+            'sequence': index + 1,
+            'prompt': scene.get('veo_prompt') or scene.get('visual_description') or scene.get('title') or '',
+            'depends_on': nodes[-1]['scene_id'] if chained and nodes else None,
+            'status': 'pending',
+            'segment_id': None,
+            'operation_id': None,
+            'critical_path': 1,
+        })
+
+    # Walk backwards so each node knows how many scenes wait on it transitively
+    for index in range(len(nodes) - 2, -1, -1):
+        if nodes[index + 1]['depends_on'] == nodes[index]['scene_id']:
+            nodes[index]['critical_path'] = nodes[index + 1]['critical_path'] + 1
+    return nodes
+
+
+def worker_id() -> str:
+    """Identifies this worker process as the owner of the batches it drives"""
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+class StoryBatchScheduler:
+    """Drives one batch: submits ready scenes up to the fan-out and polls in-flight ones.
+
+    Every write carries the owning worker and a heartbeat timestamp so that a batch whose
+    worker died can be told apart from a slow one and resumed elsewhere.
+    """
+
+    def __init__(self, batch_id: str, story_id: str, nodes: List[Dict[str, Any]], max_parallel: int,
+                 cloud_service: CloudService, video_service: VideoService):
+        self.batch_id = batch_id
+        self.story_id = story_id
+        self.nodes = nodes
+        self.by_scene = {node['scene_id']: node for node in nodes}
+        self.max_parallel = max(1, max_parallel)
+        self.cloud_service = cloud_service
+        self.video_service = video_service
+        self.logger = logging.getLogger(__name__)
+        # scene_id -> monotonic time its operation is next worth polling (from next_poll_after_ms)
+        self._next_poll: Dict[str, float] = {}
+        self.owner = worker_id()
+        self._stop = threading.Event()
+        self._last_beat = 0.0
+
+    def stop(self):
+        """Ask the loop to hand the batch back (e.g. on worker shutdown)"""
+        self._stop.set()
+
+    def run(self):
+        try:
+            while True:
+                self._cascade_failures()
+                self._launch_ready()
+                if all(node['status'] in TERMINAL_NODE_STATUSES for node in self.nodes):
+                    break
+                if time.monotonic() - self._last_beat >= Config.BATCH_HEARTBEAT_INTERVAL:
+                    self._persist()
+                if self._stop.wait(self._poll_delay()):
+                    # Scenes already submitted keep running in Veo; the next owner polls them
+                    self._persist({'owner': None, 'heartbeat_ts': 0})
+                    self.logger.info(f"Batch {self.batch_id} released for another worker to resume")
+                    return
+                self._poll_in_flight()
+            self._finish()
+        except Exception as e:
+            self.logger.error(f"Batch {self.batch_id} for story {self.story_id} aborted: {str(e)}")
+            self._persist({'status': 'failed', 'error': str(e)})
+
+    def _in_flight(self) -> List[Dict[str, Any]]:
+        return [node for node in self.nodes if node['status'] in ('queued', 'running')]
+
+    def _is_ready(self, node: Dict[str, Any]) -> bool:
+        if node['status'] != 'pending':
+            return False
+        parent = self.by_scene.get(node['depends_on']) if node['depends_on'] else None
+        return parent is None or parent['status'] == 'completed'
+
+    def _launch_ready(self):
+        slots = self.max_parallel - len(self._in_flight())
+        if slots <= 0:
+            return
+        ready = [node for node in self.nodes if self._is_ready(node)]
+        # Longest remaining chain first: it bounds the total wall-clock time of the batch
+        ready.sort(key=lambda node: (-node['critical_path'], node['sequence']))
+        changed = False
+        for node in ready[:slots]:
+            parent = self.by_scene.get(node['depends_on']) if node['depends_on'] else None
+            try:
+                result = self.video_service.generate_video_segment(
+                    story_id=self.story_id,
+                    prompt=node['prompt'],
+                    use_previous_frame=parent is not None,
+                    # Batches persisted before segment sequences were reserved append instead
+                    target_sequence=node.get('segment_sequence'),
+                    priority=Config.BATCH_GENERATION_PRIORITY,
+                    previous_segment_id=parent['segment_id'] if parent else None,
+                )
+                node.update({
+                    'status': 'queued',
+                    'segment_id': result['segment_id'],
+                    'operation_id': result['operation_id'],
+                    'started_at': datetime.utcnow().isoformat(),
+                })
+                self.logger.info(f"Batch {self.batch_id}: launched scene #{node['sequence']} ({node['scene_id']})")
+            except Exception as e:
+                node.update({'status': 'failed', 'error': str(e)})
+                self.logger.error(f"Batch {self.batch_id}: scene #{node['sequence']} failed to launch: {str(e)}")
+            changed = True
+        if changed:
+            self._persist()
+
+    def _poll_delay(self) -> float:
+        """Seconds until the earliest in-flight operation is due for a status check"""
+        due = [self._next_poll.get(node['scene_id'], 0) for node in self._in_flight()]
+        if not due:
+            return Config.BATCH_POLL_INTERVAL
+        return min(max(min(due) - time.monotonic(), 0.5), Config.POLL_HINT_MAX_SECONDS,
+                   Config.BATCH_HEARTBEAT_INTERVAL)
+
+    def _poll_in_flight(self):
+        changed = False
+        now = time.monotonic()
+        for node in self._in_flight():
+            if self._next_poll.get(node['scene_id'], 0) > now:
+                continue
+            status = self.video_service.check_operation_status(node['operation_id'])
+            hint_ms = status.get('next_poll_after_ms')
+            self._next_poll[node['scene_id']] = now + (hint_ms / 1000 if hint_ms else Config.BATCH_POLL_INTERVAL)
+            if status.get('eta_seconds') is not None and node.get('eta_seconds') != status['eta_seconds']:
+                node['eta_seconds'] = status['eta_seconds']
+                changed = True
+            state = status.get('status')
+            if state == 'error':
+                node['status_errors'] = node.get('status_errors', 0) + 1
+                if node['status_errors'] >= Config.BATCH_MAX_STATUS_ERRORS:
+                    node.update({'status': 'failed', 'error': f"Status check failed: {status.get('error')}"})
+                    self.logger.error(f"Batch {self.batch_id}: scene #{node['sequence']} gave up after "
+                                      f"{node['status_errors']} failed status checks")
+                    changed = True
+                continue
+            if node.pop('status_errors', None):
+                changed = True
+            if state in ('running', 'publishing') and not node.get('submitted_ts'):
+                # The clock starts once Veo has the job, not while it waits in the generation queue
+                node['submitted_ts'] = time.time()
+                changed = True
+            if state == 'completed':
+                node.update({
+                    'status': 'completed',
+                    'video_url': status.get('video_url'),
+                    'completed_at': datetime.utcnow().isoformat(),
+                })
+            elif state in ('failed', 'not_found'):
+                node.update({'status': 'failed', 'error': status.get('error') or state})
+            elif node.get('submitted_ts') and time.time() - node['submitted_ts'] > Config.OPERATION_TIMEOUT:
+                node.update({'status': 'failed', 'error': f"Timed out after {Config.OPERATION_TIMEOUT}s"})
+                self.logger.error(f"Batch {self.batch_id}: scene #{node['sequence']} timed out")
+            elif state == 'running' and node['status'] != 'running':
+                node['status'] = 'running'
+            else:
+                continue
+            changed = True
+        if changed:
+            self._persist()
+
+    def _cascade_failures(self):
+        """Scenes chained to a failed or skipped scene can never get their starting frame"""
+        for node in self.nodes:
+            parent = self.by_scene.get(node['depends_on']) if node['depends_on'] else None
+            if node['status'] == 'pending' and parent and parent['status'] in ('failed', 'skipped'):
+                node.update({'status': 'skipped', 'error': f"Predecessor {parent['scene_id']} {parent['status']}"})
+
+    def _finish(self):
+        completed = sum(1 for node in self.nodes if node['status'] == 'completed')
+        status = 'completed' if completed == len(self.nodes) else ('partial' if completed else 'failed')
+        self._persist({'status': status, 'completed_at': datetime.utcnow().isoformat()})
+        self.logger.info(f"Batch {self.batch_id} finished: {completed}/{len(self.nodes)} scenes completed")
+
+    def _persist(self, extra: Dict[str, Any] = None):
+        data = {'nodes': self.nodes, 'owner': self.owner, 'heartbeat_ts': time.time(),
+                'updated_at': datetime.utcnow().isoformat()}
+        if extra:
+            data.update(extra)
+        try:
+            self.cloud_service.update_document(Config.GENERATION_BATCHES_COLLECTION, self.batch_id, data)
+            self._last_beat = time.monotonic()
+        except Exception as e:
+            self.logger.warning(f"Could not persist batch {self.batch_id}: {e}")
+
+
+class BatchGenerationService:
+    """Service for generating all scenes of a story in one request"""
+
+    def __init__(self, cloud_service: CloudService, video_service: VideoService):
+        self.cloud_service = cloud_service
+        self.video_service = video_service
+        self.storyboards = StoryboardStore(cloud_service)
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # batch_id -> scheduler and its thread, for batches driven by this worker
+        self._running: Dict[str, Tuple[StoryBatchScheduler, threading.Thread]] = {}
+        self._stopping = False
+
+    def _launch(self, batch_id: str, story_id: str, nodes: List[Dict[str, Any]], max_parallel: int) -> bool:
+        scheduler = StoryBatchScheduler(batch_id, story_id, nodes, max_parallel, self.cloud_service, self.video_service)
+
+        def drive():
+            try:
+                scheduler.run()
+            finally:
+                with self._lock:
+                    self._running.pop(batch_id, None)
+
+        thread = threading.Thread(target=drive, name=f"batch-{batch_id[:8]}", daemon=True)
+        with self._lock:
+            if self._stopping or batch_id in self._running:
+                return False
+            self._running[batch_id] = (scheduler, thread)
+        thread.start()
+        return True
+
+    def stop(self):
+        """Stop driving batches in this worker and hand the running ones back for another to resume"""
+        with self._lock:
+            self._stopping = True
+            running = list(self._running.values())
+        for scheduler, _ in running:
+            scheduler.stop()
+
+    def wait_stopped(self, timeout: float) -> bool:
+        """Wait for stopped schedulers to write their hand-off; False if some are still running"""
+        with self._lock:
+            threads = [thread for _, thread in self._running.values()]
+        deadline = time.monotonic() + timeout
+        for thread in threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        return not any(thread.is_alive() for thread in threads)
+
+    @staticmethod
+    def _is_stale(batch: Dict[str, Any]) -> bool:
+        return batch.get('status') == 'running' and \
+            time.time() - (batch.get('heartbeat_ts') or 0) > Config.BATCH_STALE_AFTER
+
+    def _adopt(self, batch_id: str, batch: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Take over a running batch whose owner stopped writing; None if another worker got it first"""
+        with self._lock:
+            if self._stopping or batch_id in self._running:
+                return None
+        claim = {'owner': worker_id(), 'heartbeat_ts': time.time(), 'updated_at': datetime.utcnow().isoformat()}
+        if not self.cloud_service.update_document_if(Config.GENERATION_BATCHES_COLLECTION, batch_id,
+                                                     'heartbeat_ts', batch.get('heartbeat_ts'), claim):
+            return None
+        if not self._launch(batch_id, batch['story_id'], batch.get('nodes') or [],
+                            int(batch.get('max_parallel') or Config.BATCH_GENERATION_MAX_PARALLEL)):
+            return None
+        self.logger.info(f"Resumed batch {batch_id} of story {batch['story_id']} "
+                         f"(previous owner {batch.get('owner') or 'unknown'})")
+        return {**batch, **claim}
+
+    def resume_stale_batches(self) -> int:
+        """Resume running batches left behind by workers that died or restarted"""
+        try:
+            batches = self.cloud_service.query_documents(Config.GENERATION_BATCHES_COLLECTION,
+                                                         filters=[('status', '==', 'running')])
+        except Exception as e:
+            self.logger.warning(f"Could not look for stale batches: {str(e)}")
+            return 0
+        resumed = 0
+        for batch in batches:
+            if not self._is_stale(batch):
+                continue
+            try:
+                resumed += self._adopt(batch['id'], batch) is not None
+            except Exception as e:
+                self.logger.warning(f"Could not resume batch {batch['id']}: {str(e)}")
+        return resumed
+
+    def start_batch(self, story_id: str, default_use_previous_frame: bool = False,
+                    continuity: Dict[str, bool] = None, max_parallel: int = None) -> Dict[str, Any]:
+        """Plan the story's scenes as a DAG and start generating them in the background"""
+        try:
+            story = self.cloud_service.get_document(Config.STORIES_COLLECTION, story_id)
+            if not story:
+                raise ValueError("Story not found")
+            storyboard, _ = self.storyboards.load(story_id, story.get('generation_data') or {})
+            scenes = storyboard.get('scenes') or []
+            if not scenes:
+                raise ValueError("Story has no storyboard scenes to generate")
+
+            nodes = build_generation_plan(scenes, default_use_previous_frame, continuity)
+            # Segments land after the story's existing ones, in plan order, however the DAG launches them
+            first = self.video_service.reserve_sequences(story_id, story, len(nodes))
+            for node in nodes:
+                node['segment_sequence'] = first + node['sequence'] - 1
+            fan_out = min(int(max_parallel or Config.BATCH_GENERATION_MAX_PARALLEL), Config.BATCH_GENERATION_MAX_PARALLEL)
+
+            batch_id = str(uuid.uuid4())
+            batch = self.cloud_service.save_document(Config.GENERATION_BATCHES_COLLECTION, batch_id, {
+                'story_id': story_id,
+                'status': 'running',
+                'max_parallel': fan_out,
+                'nodes': nodes,
+                'owner': worker_id(),
+                'heartbeat_ts': time.time(),
+                'created_at': datetime.utcnow().isoformat(),
+                'updated_at': datetime.utcnow().isoformat(),
+            })
+
+            self._launch(batch_id, story_id, nodes, fan_out)
+
+            roots = sum(1 for node in nodes if not node['depends_on'])
+            self.logger.info(f"Started batch {batch_id} for story {story_id}: {len(nodes)} scenes, "
+                             f"{roots} independent chains, fan-out {fan_out}")
+            return batch
+
+        except Exception as e:
+            self.logger.error(f"Error starting batch generation: {str(e)}")
+            raise
+
+    def get_batch(self, story_id: str, batch_id: str) -> Optional[Dict[str, Any]]:
+        """Get batch progress, or None if it does not belong to the story"""
+        batch = self.cloud_service.get_document(Config.GENERATION_BATCHES_COLLECTION, batch_id)
+        if not batch or batch.get('story_id') != story_id:
+            return None
+        if self._is_stale(batch):
+            # Its worker is gone (crash, deploy); drive it from here instead of reporting it running forever
+            try:
+                return self._adopt(batch_id, batch) or \
+                    self.cloud_service.get_document(Config.GENERATION_BATCHES_COLLECTION, batch_id)
+            except Exception as e:
+                self.logger.warning(f"Could not resume batch {batch_id}: {str(e)}")
+        return batch
@@ -2,50 +2,203 @@
 Google Cloud services integration
 """
 
+import io
 import os
+import time
+import uuid
+import shutil
+import mimetypes
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any
+import threading
+import concurrent.futures
+from typing import Dict, List, Optional, Any, Callable, TYPE_CHECKING
 import requests
 from datetime import datetime
-from google.cloud import storage, firestore
-from google.cloud.exceptions import NotFound
-from google import genai
-from google.genai import types
 import json
 
 from config.settings import Config
+from utils.instrumentation import instrument_class, note_payload
+from utils import metrics
 
+if TYPE_CHECKING:
+    # google-cloud-* and google-genai are imported on first use; importing them costs
+    # seconds of cold start and most requests (health checks, reads) never need genai.
+    from google.genai import types
+
+_MB = 1024 * 1024
+_MAX_COMPOSE_SOURCES = 32  # GCS limit per compose request
+
+
+class _FileRange(io.RawIOBase):
+    """Seekable read-only view of `length` bytes of a file from `offset`; positions start at 0
+    so a resumable upload of one part can rewind and resume within it"""
+
+    def __init__(self, path: str, offset: int, length: int):
+        super().__init__()
+        self._file = open(path, 'rb')
+        self._offset = offset
+        self._length = length
+        self._position = 0
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    def seek(self, position: int, whence: int = io.SEEK_SET) -> int:
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self._position, io.SEEK_END: self._length}[whence]
+        self._position = min(max(base + position, 0), self._length)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        remaining = self._length - self._position
+        if remaining <= 0:
+            return 0
+        self._file.seek(self._offset + self._position)
+        count = self._file.readinto(memoryview(buffer)[:min(len(buffer), remaining)])
+        self._position += count
+        return count
+
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+@instrument_class('cloud', exclude=('reset_clients', 'warm_up', 'is_ready', 'submit_async', 'run_async',
+                                     '_cached_content_config'))
 class CloudService:
     """Service for managing Google Cloud integrations"""
     
     def __init__(self):
         self.logger = logging.getLogger(__name__)
         
-        # Initialize Google Cloud credentials
-        credentials_path = os.path.abspath('../service-account-key.json')
-        os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials_path
+        # Point the Google clients at a key file only when one is configured and present;
+        # otherwise they use Application Default Credentials (metadata server, gcloud login)
+        credentials_path = os.path.abspath(Config.GOOGLE_APPLICATION_CREDENTIALS)
+        if Config.CLOUD_BACKEND == 'gcp' and 'GOOGLE_APPLICATION_CREDENTIALS' not in os.environ \
+                and os.path.exists(credentials_path):
+            os.environ['GOOGLE_APPLICATION_CREDENTIALS'] = credentials_path
+        
+        # Clients are constructed on first use
+        self._init_clients()
+
+        # In-memory cache for live Operation handles (keyed by operation.name)
+        # Needed because google-genai operations.get expects an Operation object, not a string.
+        # Per-process: other workers fall back to the REST poll in get_operation_status.
+        self._operation_cache: Dict[str, Any] = {}
+
+        # Dedicated event loop for the genai aio client (shared by all async callers)
+        self._async_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._async_lock = threading.Lock()
+
+        # Set once warm_up() has completed a round trip to each backend
+        self._warm = False
         
-        # Initialize clients
-        self.storage_client = storage.Client(project=Config.GOOGLE_CLOUD_PROJECT)
-        self.firestore_client = firestore.Client(project=Config.GOOGLE_CLOUD_PROJECT)
-        self.genai_client = genai.Client(
+        self.logger.info("CloudService initialized (clients are created lazily)")
+
+    def _init_clients(self):
+        """Forget any client handles; each is rebuilt on first access"""
+        self._client_lock = threading.RLock()  # the bucket factory re-enters for storage_client
+        self._storage_client = None
+        self._firestore_client = None
+        self._genai_client = None
+        self._bucket = None
+
+    def _lazy_client(self, attr: str, factory: Callable[[], Any]) -> Any:
+        client = getattr(self, attr)
+        if client is None:
+            with self._client_lock:
+                client = getattr(self, attr)
+                if client is None:
+                    started = time.perf_counter()
+                    client = factory()
+                    setattr(self, attr, client)
+                    self.logger.info(f"Created {attr.strip('_')} in {time.perf_counter() - started:.2f}s")
+        return client
+
+    @staticmethod
+    def _make_storage_client():
+        if Config.CLOUD_BACKEND == 'fake':
+            from services.fake_backend import FakeStorageClient
+            return FakeStorageClient()
+        from google.cloud import storage
+        return storage.Client(project=Config.GOOGLE_CLOUD_PROJECT)
+
+    @staticmethod
+    def _make_firestore_client():
+        if Config.CLOUD_BACKEND == 'fake':
+            from services.fake_backend import FakeFirestoreClient
+            return FakeFirestoreClient()
+        from google.cloud import firestore
+        return firestore.Client(project=Config.GOOGLE_CLOUD_PROJECT)
+
+    @staticmethod
+    def _make_genai_client():
+        if Config.CLOUD_BACKEND == 'fake':
+            from services.fake_backend import FakeGenaiClient, FakeStorageClient
+            return FakeGenaiClient(FakeStorageClient())
+        from google import genai
+        return genai.Client(
             vertexai=True,
             project=Config.GOOGLE_CLOUD_PROJECT,
             location=Config.GOOGLE_CLOUD_REGION
         )
 
-        # In-memory cache for live Operation handles (keyed by operation.name)
-        # Needed because google-genai operations.get expects an Operation object, not a string
-        self._operation_cache: Dict[str, Any] = {}
-        
-        # Initialize storage bucket
-        self._init_storage_bucket()
-        
-        self.logger.info("CloudService initialized successfully")
+    @property
+    def storage_client(self):
+        return self._lazy_client('_storage_client', self._make_storage_client)
+
+    @property
+    def firestore_client(self):
+        return self._lazy_client('_firestore_client', self._make_firestore_client)
+
+    @property
+    def genai_client(self):
+        return self._lazy_client('_genai_client', self._make_genai_client)
+
+    @property
+    def bucket(self):
+        """Handle to the configured bucket (no network call; existence is checked in warm_up)"""
+        return self._lazy_client('_bucket', lambda: self.storage_client.bucket(Config.GCS_BUCKET_NAME))
+
+    def reset_clients(self):
+        """Drop clients inherited from a preloading master.
+
+        gRPC channels, HTTP pools and the aio event loop thread do not survive fork(), so a
+        forked worker lazily builds its own.
+        """
+        self._init_clients()
+        self._operation_cache = {}
+        self._async_loop = None
+        self._async_lock = threading.Lock()
+        self._warm = False
+        self.logger.info(f"CloudService clients reset in worker pid {os.getpid()}")
+
+    def warm_up(self) -> bool:
+        """Build the clients and make one cheap round trip to Firestore and GCS, off the request path"""
+        try:
+            started = time.perf_counter()
+            list(self.firestore_client.collection(Config.STORIES_COLLECTION).limit(1).stream())
+            self._verify_storage_bucket()
+            self.genai_client  # pays the google.genai import now rather than on the first story request
+            self._warm = True
+            self.logger.info(f"CloudService warm-up complete in {time.perf_counter() - started:.2f}s")
+        except Exception as e:
+            self._warm = False
+            self.logger.warning(f"CloudService warm-up failed: {e}")
+        return self._warm
+
+    def is_ready(self) -> bool:
+        """True once warm_up() has succeeded in this process"""
+        return self._warm
     
-    def _init_storage_bucket(self):
-        """Initialize the storage bucket, creating it if it doesn't exist"""
-        self.bucket = self.storage_client.bucket(Config.GCS_BUCKET_NAME)
+    def _verify_storage_bucket(self):
+        """Make sure the storage bucket exists, creating it if it doesn't"""
         try:
             exists = self.bucket.exists()
         except Exception as e:
@@ -53,7 +206,7 @@ class CloudService:
             exists = False
         if not exists:
             self.logger.info(f"Creating storage bucket: {Config.GCS_BUCKET_NAME}")
-            self.bucket = self.storage_client.create_bucket(
+            self._bucket = self.storage_client.create_bucket(
                 bucket_or_name=Config.GCS_BUCKET_NAME,
                 location=Config.GOOGLE_CLOUD_REGION,
             )
@@ -101,23 +254,95 @@ class CloudService:
             return None
     
     def upload_file_to_gcs(self, file_path: str, destination_blob_name: str) -> str:
-        """Upload a file to Google Cloud Storage"""
+        """Upload a file to Google Cloud Storage, make it public and return its public URL.
+
+        Files larger than GCS_UPLOAD_CHUNK_MB go as a resumable upload in chunks of that size, so a
+        transient error resumes from the last committed chunk; from GCS_COMPOSITE_THRESHOLD_MB
+        they are uploaded as parallel parts composed into the final object.
+        """
         try:
-            blob = self.bucket.blob(destination_blob_name)
-            
-            with open(file_path, 'rb') as file_data:
-                blob.upload_from_file(file_data)
+            size = os.path.getsize(file_path)
+            note_payload(size)
+            started = time.perf_counter()
+
+            blob = self._media_blob(destination_blob_name, size)
+            if size >= Config.GCS_COMPOSITE_THRESHOLD_MB * _MB and Config.GCS_UPLOAD_PARALLELISM > 1:
+                mode = 'composite'
+                self._upload_composite(file_path, size, blob)
+            else:
+                mode = 'resumable' if blob.chunk_size else 'single'
+                blob.upload_from_filename(file_path, retry=self._upload_retry())
             
             # Make the blob publicly readable (optional, based on your security requirements)
             blob.make_public()
             
-            self.logger.info(f"File uploaded to GCS: {destination_blob_name}")
+            seconds = time.perf_counter() - started
+            metrics.record_upload(mode, size, seconds)
+            self.logger.info(f"File uploaded to GCS: {destination_blob_name} "
+                             f"({size / _MB:.1f} MB {mode}, {size / _MB / max(seconds, 1e-6):.1f} MB/s)")
             return blob.public_url
             
         except Exception as e:
             self.logger.error(f"Failed to upload file to GCS: {str(e)}")
             raise
 
+    def _media_blob(self, blob_name: str, size: int):
+        """Blob handle that uploads in resumable GCS_UPLOAD_CHUNK_MB chunks when `size` needs more than one"""
+        blob = self.bucket.blob(blob_name)
+        chunk_size = max(1, Config.GCS_UPLOAD_CHUNK_MB) * _MB  # a multiple of 256 KiB, as GCS requires
+        blob.chunk_size = chunk_size if size > chunk_size else None
+        return blob
+
+    @staticmethod
+    def _upload_retry():
+        """Retry policy for uploads: resumable sessions pick up where a transient error stopped them"""
+        if Config.CLOUD_BACKEND == 'fake':
+            return None
+        from google.cloud.storage.retry import DEFAULT_RETRY
+        return DEFAULT_RETRY.with_deadline(Config.GCS_UPLOAD_RETRY_DEADLINE)
+
+    def _upload_composite(self, file_path: str, size: int, blob):
+        """Parallel composite upload: byte ranges of the file become temporary part objects that
+        are composed into `blob` and then deleted"""
+        parts = min(_MAX_COMPOSE_SOURCES, max(2, Config.GCS_UPLOAD_PARALLELISM))
+        part_size = -(-size // parts)
+        parts = -(-size // part_size)
+        prefix = f"{blob.name}.parts/{uuid.uuid4().hex}"
+        part_blobs = [self._media_blob(f"{prefix}/{index:02d}", part_size) for index in range(parts)]
+        retry = self._upload_retry()
+
+        def upload_part(index: int):
+            offset = index * part_size
+            length = min(part_size, size - offset)
+            with _FileRange(file_path, offset, length) as stream:
+                part_blobs[index].upload_from_file(stream, size=length, retry=retry)
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=Config.GCS_UPLOAD_PARALLELISM,
+                                                       thread_name_prefix='gcs-upload') as pool:
+                list(pool.map(upload_part, range(parts)))
+            blob.content_type = mimetypes.guess_type(blob.name)[0] or 'application/octet-stream'
+            blob.compose(part_blobs, retry=retry)
+        finally:
+            for part in part_blobs:
+                try:
+                    part.delete()
+                except Exception as e:
+                    self.logger.debug(f"Could not delete upload part {part.name}: {e}")
+
+    def upload_bytes_to_gcs(self, data: bytes, destination_blob_name: str, content_type: str = None) -> str:
+        """Upload in-memory bytes to Google Cloud Storage and return the gs:// URI"""
+        try:
+            blob = self.bucket.blob(destination_blob_name)
+            blob.upload_from_string(data, content_type=content_type)
+
+            self.logger.info(f"Bytes uploaded to GCS: {destination_blob_name}")
+            return f"gs://{self.bucket.name}/{destination_blob_name}"
+
+        except Exception as e:
+            self.logger.error(f"Failed to upload bytes to GCS: {str(e)}")
+            raise
+
     def delete_gcs_prefix(self, prefix: str) -> int:
         """Delete all blobs under a prefix. Returns count deleted."""
         try:
@@ -155,6 +380,7 @@ class CloudService:
         try:
             blob = self.bucket.blob(blob_name)
             blob.download_to_filename(destination_path)
+            note_payload(os.path.getsize(destination_path))
             
             self.logger.info(f"File downloaded from GCS: {blob_name}")
             return destination_path
@@ -163,6 +389,28 @@ class CloudService:
             self.logger.error(f"Failed to download file from GCS: {str(e)}")
             raise
     
+    def download_url_to_file(self, url: str, destination_path: str, timeout: int = 60) -> str:
+        """Download a gs://, file:// or http(s) URL to a local path"""
+        try:
+            if url.startswith('gs://'):
+                bucket_name, blob_name = url[len('gs://'):].split('/', 1)
+                self.storage_client.bucket(bucket_name).blob(blob_name).download_to_filename(destination_path)
+            elif url.startswith('file://'):
+                shutil.copyfile(url[len('file://'):], destination_path)
+            else:
+                with requests.get(url, stream=True, timeout=timeout) as r:
+                    r.raise_for_status()
+                    with open(destination_path, 'wb') as f:
+                        for chunk in r.iter_content(chunk_size=1024 * 1024):
+                            if chunk:
+                                f.write(chunk)
+            note_payload(os.path.getsize(destination_path))
+            return destination_path
+
+        except Exception as e:
+            self.logger.error(f"Failed to download {url}: {str(e)}")
+            raise
+
     def save_document(self, collection: str, document_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
         """Save a document to Firestore"""
         try:
@@ -221,6 +469,83 @@ class CloudService:
             self.logger.error(f"Failed to update document in Firestore: {str(e)}")
             raise
     
+    def update_document_if(self, collection: str, document_id: str, field: str, expected: Any, data: Dict[str, Any],
+                           writes: List[tuple] = None) -> bool:
+        """Atomically update a document only while `field` still equals `expected` (compare-and-set).
+
+        `field` may be a dotted path into a map (e.g. 'generation_data.version'); a missing field
+        compares equal to None. `writes` are further (collection, document_id, data) sets committed
+        in the same transaction (data None deletes). Returns False if the document is missing or
+        another writer changed the field first.
+        """
+        try:
+            doc_ref = self.firestore_client.collection(collection).document(document_id)
+
+            @self._transactional
+            def _apply(transaction):
+                snapshot = doc_ref.get(transaction=transaction)
+                if not snapshot.exists:
+                    return False
+                current = snapshot.to_dict() or {}
+                for part in field.split('.'):
+                    current = current.get(part) if isinstance(current, dict) else None
+                if current != expected:
+                    return False
+                transaction.update(doc_ref, data)
+                for other_collection, other_id, other_data in writes or []:
+                    other_ref = self.firestore_client.collection(other_collection).document(other_id)
+                    if other_data is None:
+                        transaction.delete(other_ref)
+                    else:
+                        transaction.set(other_ref, other_data)
+                return True
+
+            applied = _apply(self.firestore_client.transaction())
+            if applied:
+                self.logger.info(f"Document conditionally updated in Firestore: {collection}/{document_id}"
+                                 f"{f' (+{len(writes)} writes)' if writes else ''}")
+            return applied
+
+        except Exception as e:
+            self.logger.error(f"Failed conditional update of {collection}/{document_id}: {str(e)}")
+            raise
+
+    def advance_counter(self, collection: str, document_id: str, field: str, advance: Callable[[int], int],
+                        initial: int = 0) -> int:
+        """Atomically replace the integer `field` with `advance(current)` and return the new value.
+
+        A missing field counts as `initial`. Concurrent callers each see a distinct current value,
+        so `lambda n: n + 1` hands out unique numbers. Raises LookupError if the document is missing.
+        """
+        try:
+            doc_ref = self.firestore_client.collection(collection).document(document_id)
+
+            @self._transactional
+            def _apply(transaction):
+                snapshot = doc_ref.get(transaction=transaction)
+                if not snapshot.exists:
+                    raise LookupError(f"{collection}/{document_id} not found")
+                current = (snapshot.to_dict() or {}).get(field)
+                value = advance(int(current if current is not None else initial))
+                if value != current:
+                    transaction.update(doc_ref, {field: value})
+                return value
+
+            return _apply(self.firestore_client.transaction())
+
+        except Exception as e:
+            self.logger.error(f"Failed to advance {collection}/{document_id}.{field}: {str(e)}")
+            raise
+
+    @staticmethod
+    def _transactional(func):
+        """firestore.transactional for the configured backend"""
+        if Config.CLOUD_BACKEND == 'fake':
+            from services.fake_backend import transactional
+        else:
+            from google.cloud.firestore import transactional
+        return transactional(func)
+
     def query_documents(self, collection: str, filters: List[tuple] = None, limit: int = None) -> List[Dict[str, Any]]:
         """Query documents from Firestore"""
         try:
@@ -245,7 +570,112 @@ class CloudService:
             self.logger.error(f"Failed to query documents from Firestore: {str(e)}")
             raise
     
-    def generate_videos(self, model: str, prompt: str, config: types.GenerateVideosConfig, image: types.Image = None):
+    def _ensure_async_loop(self) -> asyncio.AbstractEventLoop:
+        """Start the background event loop that runs all genai aio calls"""
+        with self._async_lock:
+            if self._async_loop is None or self._async_loop.is_closed():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name='genai-aio', daemon=True).start()
+                self._async_loop = loop
+            return self._async_loop
+
+    def submit_async(self, coro) -> concurrent.futures.Future:
+        """Schedule a coroutine on the shared genai event loop and return a future for its result.
+
+        Keeping every aio call on one loop lets a single process hold many in-flight LLM
+        waits without a thread each, and keeps the aio client's connection pool on one loop.
+        """
+        return asyncio.run_coroutine_threadsafe(coro, self._ensure_async_loop())
+
+    def run_async(self, coro, timeout: float = None):
+        """Run a coroutine on the shared genai event loop and block for its result"""
+        return self.submit_async(coro).result(timeout)
+
+    def generate_content(self, model: str, contents: List[Any], config: 'types.GenerateContentConfig' = None):
+        """Generate content with Gemini (blocking)"""
+        try:
+            response = self.genai_client.models.generate_content(model=model, contents=contents, config=config)
+            metrics.record_gemini_usage(model, response)
+            return response
+        except Exception as e:
+            self.logger.error(f"Failed to generate content: {str(e)}")
+            raise
+
+    async def agenerate_content(self, model: str, contents: List[Any], config: 'types.GenerateContentConfig' = None):
+        """Generate content with Gemini using the genai aio client"""
+        try:
+            response = await self.genai_client.aio.models.generate_content(model=model, contents=contents, config=config)
+            metrics.record_gemini_usage(model, response)
+            return response
+        except Exception as e:
+            self.logger.error(f"Failed to generate content: {str(e)}")
+            raise
+
+    def _cached_content_config(self, system_instruction: str, ttl_seconds: int, display_name: str = None):
+        from google.genai import types
+        return types.CreateCachedContentConfig(
+            system_instruction=system_instruction,
+            ttl=f"{int(ttl_seconds)}s",
+            display_name=display_name
+        )
+
+    def create_cached_content(self, model: str, system_instruction: str, ttl_seconds: int, display_name: str = None) -> str:
+        """Store a system instruction as a Gemini context cache; returns the cache name"""
+        try:
+            cache = self.genai_client.caches.create(
+                model=model, config=self._cached_content_config(system_instruction, ttl_seconds, display_name)
+            )
+            self.logger.info(f"Created Gemini context cache {cache.name} for {model} (ttl {ttl_seconds}s)")
+            return cache.name
+        except Exception as e:
+            self.logger.error(f"Failed to create context cache: {str(e)}")
+            raise
+
+    async def acreate_cached_content(self, model: str, system_instruction: str, ttl_seconds: int, display_name: str = None) -> str:
+        """Async variant of create_cached_content"""
+        try:
+            cache = await self.genai_client.aio.caches.create(
+                model=model, config=self._cached_content_config(system_instruction, ttl_seconds, display_name)
+            )
+            self.logger.info(f"Created Gemini context cache {cache.name} for {model} (ttl {ttl_seconds}s)")
+            return cache.name
+        except Exception as e:
+            self.logger.error(f"Failed to create context cache: {str(e)}")
+            raise
+
+    async def agenerate_videos(self, model: str, prompt: str, config: 'types.GenerateVideosConfig', image: 'types.Image' = None):
+        """Generate videos using Veo models via the genai aio client"""
+        try:
+            self.logger.info(f"Starting video generation with model: {model}")
+            operation = await self.genai_client.aio.models.generate_videos(
+                model=model,
+                prompt=prompt,
+                image=image,
+                config=config
+            )
+            self.logger.info(f"Video generation operation started: {operation.name}")
+            if getattr(operation, 'name', None):
+                self._operation_cache[operation.name] = operation
+            return operation
+        except Exception as e:
+            self.logger.error(f"Failed to generate video: {str(e)}")
+            raise
+
+    async def aget_operation_status(self, operation_name: str):
+        """Async variant of get_operation_status"""
+        op = self._operation_cache.get(operation_name)
+        metrics.record_cache('veo_operation', op is not None)
+        if op is not None:
+            try:
+                updated = await self.genai_client.aio.operations.get(op)
+                if getattr(updated, 'name', None):
+                    self._operation_cache[updated.name] = updated
+                return updated
+            except Exception as e:
+                self.logger.warning(f"SDK get(op) failed, falling back to REST: {str(e)}")
+        return await asyncio.get_running_loop().run_in_executor(None, self._fetch_predict_operation, operation_name)
+
+    def generate_videos(self, model: str, prompt: str, config: 'types.GenerateVideosConfig', image: 'types.Image' = None):
         """Generate videos using Veo models"""
         try:
             self.logger.info(f"Starting video generation with model: {model}")
@@ -278,6 +708,7 @@ class CloudService:
         """
         # 1) Try cached live handle via SDK
         op = self._operation_cache.get(operation_name)
+        metrics.record_cache('veo_operation', op is not None)
         if op is not None:
             try:
                 updated = self.genai_client.operations.get(op)
@@ -288,6 +719,12 @@ class CloudService:
                 self.logger.warning(f"SDK get(op) failed, falling back to REST: {str(e)}")
 
         # 2) Fallback: use Veo's documented polling endpoint (model-scoped fetchPredictOperation)
+        return self._fetch_predict_operation(operation_name)
+
+    def _fetch_predict_operation(self, operation_name: str):
+        """Poll an operation by name through the Vertex AI REST endpoint (survives restarts)"""
+        if Config.CLOUD_BACKEND == 'fake':
+            return self.genai_client.operations.get(operation_name)
         try:
             # Acquire OAuth2 token
             import google.auth
@@ -339,6 +776,7 @@ class CloudService:
     def generate_enhanced_prompt(self, base_prompt: str, keywords: List[str] = None, image_data: bytes = None) -> str:
         """Use Gemini to enhance and optimize prompts - following veo3_video_generation.py pattern"""
         try:
+            from google.genai import types
             if keywords:
                 # Use the exact prompt pattern from veo3_video_generation.py
                 enhancement_prompt = f"""
@@ -362,7 +800,7 @@ Original prompt: {base_prompt}
             if image_data:
                 contents.append(types.Part.from_bytes(data=image_data, mime_type="image/jpeg"))
             
-            response = self.genai_client.models.generate_content(
+            response = self.generate_content(
                 model=Config.GEMINI_MODEL,
                 contents=contents,
                 config=types.GenerateContentConfig(temperature=0.9, max_output_tokens=220)
@@ -376,7 +814,7 @@ Original prompt: {base_prompt}
                 norm_out = ''.join(ch for ch in out.lower() if ch.isalnum() or ch.isspace()).strip()
                 if norm_out == norm_in or len(out.split()) < 10:
                     self.logger.info("Enhanced prompt too similar/short; retrying AI enrichment")
-                    retry = self.genai_client.models.generate_content(
+                    retry = self.generate_content(
                         model=Config.GEMINI_MODEL,
                         contents=[f"Rewrite concisely and cinematically: {out}"],
                         config=types.GenerateContentConfig(temperature=0.8, max_output_tokens=200)
@@ -387,7 +825,7 @@ Original prompt: {base_prompt}
                 return out
             # If model returns empty, retry once with a clearer instruction
             self.logger.warning("Gemini returned empty enhancement; retrying once")
-            retry = self.genai_client.models.generate_content(
+            retry = self.generate_content(
                 model=Config.GEMINI_MODEL,
                 contents=[f"Rewrite concisely and cinematically: {base_prompt}"],
                 config=types.GenerateContentConfig(temperature=0.8, max_output_tokens=200)
@@ -417,6 +855,7 @@ Original prompt: {base_prompt}
                            mood: str = None) -> str:
         """Generate a cinematic video prompt from a seed idea and optional context."""
         try:
+            from google.genai import types
             context_text = ""
             if context_prompts:
                 context_text = f"\n\nPrevious scene context:\n" + "\n".join(f"- {p}" for p in context_prompts[-2:])
@@ -448,7 +887,7 @@ Original prompt: {base_prompt}
                 content_parts.append(last_frame_image)
                 system_prompt += "\n\nA reference image from the previous scene is provided for visual continuity."
             
-            response = self.genai_client.models.generate_content(
+            response = self.generate_content(
                 model=Config.GEMINI_MODEL,
                 contents=[system_prompt] + content_parts,
                 config=types.GenerateContentConfig(
@@ -502,6 +941,7 @@ Original prompt: {base_prompt}
                        context_prompts: List[str] = None, mood: str = None) -> str:
         """Generate dialogue between characters with given tone and goal."""
         try:
+            from google.genai import types
             context_text = ""
             if context_prompts:
                 context_text = f"\n\nPrevious scene context for continuity:\n" + "\n".join(f"- {p}" for p in context_prompts[-2:])
@@ -527,7 +967,7 @@ Character Name: dialogue line
 
 Output ONLY the dialogue lines, no explanation.{context_text}"""
             
-            response = self.genai_client.models.generate_content(
+            response = self.generate_content(
                 model=Config.GEMINI_MODEL,
                 contents=[system_prompt],
                 config=types.GenerateContentConfig(
@@ -0,0 +1,131 @@
+"""
+Gemini context caching for the shared story context of per-scene calls
+
+Every scene details call of a story sends the same system instruction: story context, the
+outline of every scene, the character profiles once they exist, and the cinematographer
+requirements (see StoryGenerationService._scene_details_request). The first call stores it as
+a Gemini cached content and the rest reference it by name with `cached_content`, so the prefix
+is prefilled once per story instead of once per scene.
+
+Gemini rejects cached contents below a per-model minimum (1024 tokens for gemini-2.5-flash).
+Long stories and regenerations of stories with character profiles reach it; smaller
+instructions are sent inline, uncached.
+"""
+
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+
+from config.settings import Config
+from services.cloud_service import CloudService
+from utils import metrics
+from utils.story_context import estimate_tokens
+
+# Seconds before expiry when an entry is no longer handed out (a call may still be in flight)
+_EXPIRY_MARGIN = 30
+# Seconds to fall back to inline instructions after a failed create
+_FAILURE_BACKOFF = 60
+
+
+def is_missing_cache_error(error: Exception) -> bool:
+    """True when a generate call failed because its cached content is gone"""
+    text = str(error)
+    return isinstance(error, LookupError) or ('NOT_FOUND' in text and 'cachedContents' in text) or \
+        ('404' in text and 'cache' in text.lower())
+
+
+def min_cache_tokens(model: str) -> int:
+    """Smallest instruction worth caching for `model` (unknown models get the largest minimum)"""
+    return Config.GEMINI_CONTEXT_CACHE_MIN_TOKENS or \
+        Config.GEMINI_CACHE_MIN_TOKENS_BY_MODEL.get(model, max(Config.GEMINI_CACHE_MIN_TOKENS_BY_MODEL.values()))
+
+
+class GeminiContextCache:
+    """Cached content names by (model, system instruction), created on first use"""
+
+    def __init__(self, cloud_service: CloudService):
+        self.cloud_service = cloud_service
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # key -> (cache name or None after a failure, monotonic time it stops being used)
+        self._entries: Dict[str, Tuple[Optional[str], float]] = {}
+        self._pending: Dict[str, asyncio.Future] = {}
+
+    @staticmethod
+    def _key(model: str, system_instruction: str) -> str:
+        return hashlib.sha256(f"{model}\n{system_instruction}".encode('utf-8')).hexdigest()
+
+    @staticmethod
+    def eligible(model: str, system_instruction: str) -> bool:
+        return Config.GEMINI_CONTEXT_CACHE and estimate_tokens(system_instruction or '') >= \
+            min_cache_tokens(model)
+
+    def _lookup(self, key: str) -> Tuple[bool, Optional[str]]:
+        """(found, name) for a live entry; found with name None while backing off after a failure"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[1] > time.monotonic():
+                return True, entry[0]
+            self._entries.pop(key, None)
+            return False, None
+
+    def _store(self, key: str, name: Optional[str]):
+        ttl = Config.GEMINI_CONTEXT_CACHE_TTL - _EXPIRY_MARGIN if name else _FAILURE_BACKOFF
+        with self._lock:
+            self._entries[key] = (name, time.monotonic() + ttl)
+
+    def _record(self, found: bool, name: Optional[str]) -> Optional[str]:
+        if name:
+            metrics.record_cache('gemini_context', found)
+        return name
+
+    def get(self, model: str, system_instruction: str, label: str = None) -> Optional[str]:
+        """Cache name for `system_instruction`, creating it when needed; None to send it inline"""
+        if not self.eligible(model, system_instruction):
+            return None
+        key = self._key(model, system_instruction)
+        found, name = self._lookup(key)
+        if found:
+            return self._record(True, name)
+        try:
+            name = self.cloud_service.create_cached_content(
+                model, system_instruction, Config.GEMINI_CONTEXT_CACHE_TTL, display_name=label)
+        except Exception as e:
+            self.logger.warning(f"Context cache unavailable, sending the instruction inline: {str(e)}")
+            name = None
+        self._store(key, name)
+        return self._record(False, name)
+
+    async def aget(self, model: str, system_instruction: str, label: str = None) -> Optional[str]:
+        """Async variant of get; concurrent scene calls of one story share a single create"""
+        if not self.eligible(model, system_instruction):
+            return None
+        key = self._key(model, system_instruction)
+        found, name = self._lookup(key)
+        if found:
+            return self._record(True, name)
+        pending = self._pending.get(key)
+        if pending is not None:
+            return self._record(True, await asyncio.shield(pending))
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending[key] = future
+        name = None
+        try:
+            name = await self.cloud_service.acreate_cached_content(
+                model, system_instruction, Config.GEMINI_CONTEXT_CACHE_TTL, display_name=label)
+        except Exception as e:
+            self.logger.warning(f"Context cache unavailable, sending the instruction inline: {str(e)}")
+        finally:
+            self._pending.pop(key, None)
+            future.set_result(name)
+        self._store(key, name)
+        return self._record(False, name)
+
+    def invalidate(self, model: str, system_instruction: str):
+        """Forget the entry (e.g. the cache expired or was deleted server-side)"""
+        with self._lock:
+            self._entries.pop(self._key(model, system_instruction), None)
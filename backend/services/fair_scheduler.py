@@ -0,0 +1,222 @@
+"""
+Per-user fair scheduling of shared generation capacity (Veo submissions and Gemini calls)
+"""
+
+import time
+import asyncio
+import logging
+import itertools
+import threading
+from contextlib import asynccontextmanager, contextmanager
+from typing import Dict, List, Optional, Any
+
+from config.settings import Config
+from utils import metrics
+
+
+def user_weight(user_id: str) -> float:
+    """Share of capacity a user is entitled to relative to others (default 1.0)"""
+    try:
+        return max(float(Config.USER_WEIGHTS.get(user_id or 'anonymous', 1.0)), 0.01)
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def fair_order(jobs: List[Dict[str, Any]], in_flight: Dict[str, int] = None) -> List[Dict[str, Any]]:
+    """Order queued jobs by weighted fair queuing across `user_id`.
+
+    The k-th waiting job of a user (counting the ones it already has in flight) gets the
+    virtual finish tag (k + 1) / weight, so a user with one request interleaves right behind
+    whatever is running while a user with a hundred queued jobs is served at its fair rate.
+    Within a user, higher priority and then FIFO order is kept. The order is derived only from
+    the queued jobs themselves, so every worker computes the same order and queue positions.
+    """
+    in_flight = in_flight or {}
+    by_user: Dict[str, List[Dict[str, Any]]] = {}
+    for job in jobs:
+        by_user.setdefault(job.get('user_id') or 'anonymous', []).append(job)
+
+    tagged = []
+    for user_id, user_jobs in by_user.items():
+        user_jobs.sort(key=lambda j: (-int(j.get('priority', 0)), j.get('enqueued_ts', 0)))
+        weight = user_weight(user_id)
+        base = in_flight.get(user_id, 0)
+        for k, job in enumerate(user_jobs):
+            tagged.append(((base + k + 1) / weight, -int(job.get('priority', 0)), job.get('enqueued_ts', 0), job))
+
+    tagged.sort(key=lambda entry: entry[:3])
+    return [entry[3] for entry in tagged]
+
+
+class QueueTimeout(Exception):
+    """Raised when a caller waited longer than allowed for a fair-share slot"""
+
+    def __init__(self, message: str, position: Optional[int] = None):
+        super().__init__(message)
+        self.position = position
+
+
+class FairGate:
+    """Admission gate with a global capacity, per-user caps and WFQ ordering of waiters.
+
+    Used in front of Gemini work (story generation/regeneration) in a worker process. Threads
+    wait with acquire(); coroutines wait with aacquire() without holding a thread, and both
+    kinds of waiters share one queue.
+    """
+
+    def __init__(self, name: str, capacity: int, per_user_cap: int):
+        self.name = name
+        self.capacity = max(1, capacity)
+        self.per_user_cap = max(1, per_user_cap)
+        self.logger = logging.getLogger(__name__)
+        self._cond = threading.Condition()
+        self._active: Dict[str, int] = {}
+        self._waiting: List[Dict[str, Any]] = []
+        self._last_tag: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+
+    def _eligible(self) -> Optional[Dict[str, Any]]:
+        if sum(self._active.values()) >= self.capacity:
+            return None
+        for ticket in sorted(self._waiting, key=lambda t: (t['tag'], t['seq'])):
+            if self._active.get(ticket['user_id'], 0) < self.per_user_cap:
+                return ticket
+        return None
+
+    def _position(self, ticket: Dict[str, Any]) -> Optional[int]:
+        ordered = sorted(self._waiting, key=lambda t: (t['tag'], t['seq']))
+        for index, other in enumerate(ordered):
+            if other is ticket:
+                return index + 1
+        return None
+
+    def _publish(self):
+        metrics.record_gate(self.name, sum(self._active.values()), len(self._waiting))
+
+    def _notify(self):
+        """Wake every waiter to re-check eligibility; coroutines are woken on their own loop"""
+        self._cond.notify_all()
+        for ticket in self._waiting:
+            if ticket.get('wake'):
+                loop, event = ticket['wake']
+                loop.call_soon_threadsafe(event.set)
+
+    def _enqueue(self, user_id: str, wake: tuple = None) -> Dict[str, Any]:
+        tag = max(self._virtual_time, self._last_tag.get(user_id, 0.0)) + 1.0 / user_weight(user_id)
+        self._last_tag[user_id] = tag
+        ticket = {'user_id': user_id, 'tag': tag, 'seq': next(self._seq), 'enqueued_at': time.monotonic(),
+                  'wake': wake}
+        self._waiting.append(ticket)
+        self._publish()
+        ticket['queue_position'] = 0 if self._eligible() is ticket else self._position(ticket)
+        if ticket['queue_position']:
+            self.logger.info(f"{self.name}: user {user_id} waiting at position {ticket['queue_position']}")
+        return ticket
+
+    def _admit(self, ticket: Dict[str, Any]) -> Dict[str, Any]:
+        self._waiting.remove(ticket)
+        self._active[ticket['user_id']] = self._active.get(ticket['user_id'], 0) + 1
+        self._virtual_time = max(self._virtual_time, ticket['tag'])
+        self._publish()
+        ticket.pop('wake', None)
+        ticket['waited_seconds'] = time.monotonic() - ticket['enqueued_at']
+        return ticket
+
+    def _withdraw(self, ticket: Dict[str, Any]) -> Optional[int]:
+        """Remove a waiter that gives up; returns the position it had"""
+        position = self._position(ticket)
+        if position is not None:
+            self._waiting.remove(ticket)
+            self._publish()
+            self._notify()
+        return position
+
+    def acquire(self, user_id: str, timeout: float = None) -> Dict[str, Any]:
+        """Block until the user may use one unit of capacity; pair with release().
+
+        Returns the ticket, whose `queue_position` is the position the caller had on arrival
+        (0 when admitted immediately).
+        """
+        user_id = user_id or 'anonymous'
+        timeout = Config.FAIR_QUEUE_TIMEOUT if timeout is None else timeout
+        with self._cond:
+            ticket = self._enqueue(user_id)
+            deadline = time.monotonic() + timeout
+            while self._eligible() is not ticket:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise QueueTimeout(f"Timed out waiting for {self.name} capacity", self._withdraw(ticket))
+                self._cond.wait(remaining)
+            return self._admit(ticket)
+
+    async def aacquire(self, user_id: str, timeout: float = None) -> Dict[str, Any]:
+        """Awaitable acquire(): waits on the event loop instead of blocking a thread"""
+        user_id = user_id or 'anonymous'
+        timeout = Config.FAIR_QUEUE_TIMEOUT if timeout is None else timeout
+        wake = asyncio.Event()
+        with self._cond:
+            ticket = self._enqueue(user_id, (asyncio.get_running_loop(), wake))
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                with self._cond:
+                    if self._eligible() is ticket:
+                        return self._admit(ticket)
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise QueueTimeout(f"Timed out waiting for {self.name} capacity", self._withdraw(ticket))
+                    # Cleared under the lock, so a release after this point is not missed
+                    wake.clear()
+                try:
+                    await asyncio.wait_for(wake.wait(), remaining)
+                except asyncio.TimeoutError:
+                    pass
+        except asyncio.CancelledError:
+            # Client went away while waiting: give the place up
+            with self._cond:
+                self._withdraw(ticket)
+            raise
+
+    def release(self, user_id: str):
+        """Give back capacity taken by acquire() or aacquire()"""
+        user_id = user_id or 'anonymous'
+        with self._cond:
+            self._active[user_id] -= 1
+            if not self._active[user_id]:
+                del self._active[user_id]
+            self._publish()
+            self._notify()
+
+    @contextmanager
+    def slot(self, user_id: str, timeout: float = None):
+        """Hold one unit of capacity for the duration of the block"""
+        ticket = self.acquire(user_id, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(user_id)
+
+    @asynccontextmanager
+    async def aslot(self, user_id: str, timeout: float = None):
+        """Async variant of slot()"""
+        ticket = await self.aacquire(user_id, timeout)
+        try:
+            yield ticket
+        finally:
+            self.release(user_id)
+
+    def snapshot(self, user_id: str = None) -> Dict[str, Any]:
+        """Current load, optionally with one user's waiting positions"""
+        with self._cond:
+            result = {
+                'active': sum(self._active.values()),
+                'waiting': len(self._waiting),
+                'capacity': self.capacity,
+            }
+            if user_id is not None:
+                result['user_active'] = self._active.get(user_id, 0)
+                result['user_positions'] = [
+                    self._position(t) for t in self._waiting if t['user_id'] == user_id
+                ]
+            return result
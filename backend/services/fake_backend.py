@@ -0,0 +1,606 @@
+"""
+Offline stand-ins for the Google clients used by CloudService (CLOUD_BACKEND=fake)
+
+- FakeFirestoreClient: in-memory documents with queries, subcollections and transactions
+- FakeStorageClient: buckets and blobs as files under Config.FAKE_STORAGE_DIR
+- FakeGenaiClient: scripted Gemini JSON responses (with context caches) and Veo operations
+  that finish after Config.FAKE_VEO_SECONDS with a synthetic MP4, both with configurable latency
+
+State lives in one process: run a single worker when serving with this backend.
+"""
+
+import os
+import re
+import copy
+import json
+import math
+import time
+import uuid
+import random
+import asyncio
+import logging
+import shutil
+import threading
+import functools
+from typing import Any, Dict, List, Optional, Tuple
+
+from config.settings import Config
+from utils.synthetic_media import synthetic_mp4_bytes
+
+logger = logging.getLogger(__name__)
+
+
+# --------------------------------------------------------------------------- Firestore
+
+_OPERATORS = {
+    '==': lambda a, b: a == b,
+    '!=': lambda a, b: a != b,
+    '<': lambda a, b: a is not None and a < b,
+    '<=': lambda a, b: a is not None and a <= b,
+    '>': lambda a, b: a is not None and a > b,
+    '>=': lambda a, b: a is not None and a >= b,
+    'in': lambda a, b: a in b,
+    'not-in': lambda a, b: a not in b,
+    'array_contains': lambda a, b: isinstance(a, list) and b in a,
+    'array_contains_any': lambda a, b: isinstance(a, list) and any(item in a for item in b),
+}
+
+
+def _get_path(data: Dict[str, Any], field: str) -> Any:
+    value: Any = data
+    for part in field.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(part)
+    return value
+
+
+def _set_path(data: Dict[str, Any], field: str, value: Any):
+    parts = field.split('.')
+    target = data
+    for part in parts[:-1]:
+        target = target.setdefault(part, {})
+    target[parts[-1]] = value
+
+
+class FakeSnapshot:
+    def __init__(self, reference: 'FakeDocumentRef', data: Optional[Dict[str, Any]]):
+        self.reference = reference
+        self.id = reference.id
+        self._data = data
+
+    @property
+    def exists(self) -> bool:
+        return self._data is not None
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data) if self._data is not None else None
+
+    def get(self, field: str) -> Any:
+        return copy.deepcopy(_get_path(self._data or {}, field))
+
+
+class FakeDocumentRef:
+    def __init__(self, client: 'FakeFirestoreClient', collection_path: str, document_id: str):
+        self._client = client
+        self._collection_path = collection_path
+        self.id = document_id
+        self.path = f"{collection_path}/{document_id}"
+
+    def collection(self, name: str) -> 'FakeCollection':
+        return FakeCollection(self._client, f"{self.path}/{name}")
+
+    def get(self, transaction: 'FakeTransaction' = None) -> FakeSnapshot:
+        with self._client.lock:
+            return FakeSnapshot(self, self._client.documents(self._collection_path).get(self.id))
+
+    def set(self, data: Dict[str, Any], merge: bool = False):
+        with self._client.lock:
+            docs = self._client.documents(self._collection_path)
+            if merge and self.id in docs:
+                docs[self.id].update(copy.deepcopy(data))
+            else:
+                docs[self.id] = copy.deepcopy(data)
+
+    def update(self, data: Dict[str, Any]):
+        with self._client.lock:
+            docs = self._client.documents(self._collection_path)
+            if self.id not in docs:
+                raise LookupError(f"No document to update: {self.path}")
+            for field, value in data.items():
+                _set_path(docs[self.id], field, copy.deepcopy(value))
+
+    def delete(self):
+        with self._client.lock:
+            self._client.documents(self._collection_path).pop(self.id, None)
+
+
+class FakeQuery:
+    ASCENDING = 'ASCENDING'
+    DESCENDING = 'DESCENDING'
+
+    def __init__(self, client: 'FakeFirestoreClient', path: str, filters: Tuple = (), order: Tuple = (),
+                 limit: Optional[int] = None):
+        self._client = client
+        self._path = path
+        self._filters = filters
+        self._order = order
+        self._limit = limit
+
+    def where(self, field: str, op: str, value: Any) -> 'FakeQuery':
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported operator in fake Firestore: {op}")
+        return FakeQuery(self._client, self._path, self._filters + ((field, op, value),), self._order, self._limit)
+
+    def order_by(self, field: str, direction: str = 'ASCENDING') -> 'FakeQuery':
+        return FakeQuery(self._client, self._path, self._filters, self._order + ((field, direction),), self._limit)
+
+    def limit(self, count: int) -> 'FakeQuery':
+        return FakeQuery(self._client, self._path, self._filters, self._order, count)
+
+    def stream(self, transaction: 'FakeTransaction' = None):
+        with self._client.lock:
+            items = [(doc_id, data) for doc_id, data in self._client.documents(self._path).items()
+                     if all(_OPERATORS[op](_get_path(data, field), value) for field, op, value in self._filters)]
+        for field, direction in reversed(self._order):
+            items.sort(key=lambda item: (_get_path(item[1], field) is None, _get_path(item[1], field)),
+                       reverse=direction == self.DESCENDING)
+        if self._limit is not None:
+            items = items[:self._limit]
+        return iter([FakeSnapshot(FakeDocumentRef(self._client, self._path, doc_id), data) for doc_id, data in items])
+
+    def get(self, transaction: 'FakeTransaction' = None) -> List[FakeSnapshot]:
+        return list(self.stream(transaction))
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, client: 'FakeFirestoreClient', path: str):
+        super().__init__(client, path)
+        self.id = path.rsplit('/', 1)[-1]
+
+    def document(self, document_id: str = None) -> FakeDocumentRef:
+        return FakeDocumentRef(self._client, self._path, document_id or uuid.uuid4().hex)
+
+
+class FakeTransaction:
+    """Buffers writes; fake_transactional commits them while holding the store lock"""
+
+    def __init__(self, client: 'FakeFirestoreClient'):
+        self._client = client
+        self._writes: List[Tuple[str, FakeDocumentRef, Any]] = []
+
+    def set(self, reference: FakeDocumentRef, data: Dict[str, Any], merge: bool = False):
+        self._writes.append(('set', reference, (data, merge)))
+
+    def update(self, reference: FakeDocumentRef, data: Dict[str, Any]):
+        self._writes.append(('update', reference, data))
+
+    def delete(self, reference: FakeDocumentRef):
+        self._writes.append(('delete', reference, None))
+
+    def _commit(self):
+        for kind, reference, payload in self._writes:
+            if kind == 'set':
+                reference.set(*payload)
+            elif kind == 'update':
+                reference.update(payload)
+            else:
+                reference.delete()
+        self._writes = []
+
+
+def transactional(func):
+    """Counterpart of google.cloud.firestore.transactional for the fake client"""
+    @functools.wraps(func)
+    def wrapper(transaction: FakeTransaction, *args, **kwargs):
+        with transaction._client.lock:
+            result = func(transaction, *args, **kwargs)
+            transaction._commit()
+            return result
+    return wrapper
+
+
+class FakeFirestoreClient:
+    def __init__(self):
+        self.lock = threading.RLock()
+        self._collections: Dict[str, Dict[str, Dict[str, Any]]] = {}
+
+    def documents(self, path: str) -> Dict[str, Dict[str, Any]]:
+        return self._collections.setdefault(path, {})
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, name)
+
+    def transaction(self) -> FakeTransaction:
+        return FakeTransaction(self)
+
+
+# --------------------------------------------------------------------------- Storage
+
+class FakeBlob:
+    def __init__(self, bucket: 'FakeBucket', name: str):
+        self.bucket = bucket
+        self.name = name
+        self.content_type = None
+        self.chunk_size = None
+
+    @property
+    def path(self) -> str:
+        return os.path.join(self.bucket.path, *self.name.split('/'))
+
+    @property
+    def size(self) -> Optional[int]:
+        return os.path.getsize(self.path) if os.path.exists(self.path) else None
+
+    @property
+    def public_url(self) -> str:
+        return f"file://{os.path.abspath(self.path)}"
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _prepare(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+    def upload_from_file(self, file_obj, content_type: str = None, **kwargs):
+        self._prepare()
+        with open(self.path, 'wb') as f:
+            shutil.copyfileobj(file_obj, f)
+        self.content_type = content_type
+
+    def upload_from_filename(self, filename: str, content_type: str = None, **kwargs):
+        self._prepare()
+        shutil.copyfile(filename, self.path)
+        self.content_type = content_type
+
+    def upload_from_string(self, data, content_type: str = None, **kwargs):
+        self._prepare()
+        with open(self.path, 'wb') as f:
+            f.write(data.encode('utf-8') if isinstance(data, str) else data)
+        self.content_type = content_type
+
+    def download_to_filename(self, filename: str, **kwargs):
+        if not self.exists():
+            raise LookupError(f"No such object: {self.bucket.name}/{self.name}")
+        shutil.copyfile(self.path, filename)
+
+    def download_as_bytes(self, **kwargs) -> bytes:
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+    def make_public(self):
+        pass
+
+    def generate_signed_url(self, **kwargs) -> str:
+        return self.public_url
+
+    def delete(self):
+        os.remove(self.path)
+
+    def compose(self, sources: List['FakeBlob'], **kwargs):
+        self._prepare()
+        with open(self.path, 'wb') as out:
+            for source in sources:
+                with open(source.path, 'rb') as f:
+                    shutil.copyfileobj(f, out)
+
+
+class FakeBucket:
+    def __init__(self, root: str, name: str):
+        self.name = name
+        self.path = os.path.join(root, name)
+
+    def exists(self) -> bool:
+        return os.path.isdir(self.path)
+
+    def blob(self, name: str) -> FakeBlob:
+        return FakeBlob(self, name)
+
+    def get_blob(self, name: str) -> Optional[FakeBlob]:
+        blob = FakeBlob(self, name)
+        return blob if blob.exists() else None
+
+
+class FakeStorageClient:
+    def __init__(self, root: str = None):
+        self.root = root or Config.FAKE_STORAGE_DIR
+        os.makedirs(self.root, exist_ok=True)
+
+    def bucket(self, name: str) -> FakeBucket:
+        return FakeBucket(self.root, name)
+
+    def create_bucket(self, bucket_or_name, location: str = None) -> FakeBucket:
+        bucket = bucket_or_name if isinstance(bucket_or_name, FakeBucket) else self.bucket(bucket_or_name)
+        os.makedirs(bucket.path, exist_ok=True)
+        return bucket
+
+    def list_blobs(self, bucket_name: str, prefix: str = '') -> List[FakeBlob]:
+        bucket = self.bucket(bucket_name)
+        blobs = []
+        for root, _, files in os.walk(bucket.path):
+            for filename in files:
+                name = os.path.relpath(os.path.join(root, filename), bucket.path).replace(os.sep, '/')
+                if name.startswith(prefix or ''):
+                    blobs.append(FakeBlob(bucket, name))
+        return sorted(blobs, key=lambda blob: blob.name)
+
+
+# --------------------------------------------------------------------------- genai
+
+class _Usage:
+    def __init__(self, prompt_tokens: int, output_tokens: int):
+        self.prompt_token_count = prompt_tokens
+        self.candidates_token_count = output_tokens
+        self.cached_content_token_count = 0
+        self.thoughts_token_count = 0
+        self.total_token_count = prompt_tokens + output_tokens
+
+
+class FakeResponse:
+    def __init__(self, text: str, prompt_chars: int, config: Any = None, cached_chars: int = 0):
+        self.text = text
+        self.usage_metadata = _Usage(max(1, prompt_chars // 4), max(1, len(text) // 4))
+        self.usage_metadata.cached_content_token_count = cached_chars // 4
+        # Like the SDK: a pydantic response_schema is parsed into .parsed (None if it does not validate)
+        self.parsed = None
+        schema = getattr(config, 'response_schema', None)
+        if hasattr(schema, 'model_validate_json'):
+            try:
+                self.parsed = schema.model_validate_json(text)
+            except ValueError:
+                pass
+
+
+class FakeOperation:
+    def __init__(self, name: str, done: bool = False, response: Dict[str, Any] = None, error: Any = None):
+        self.name = name
+        self.done = done
+        self.response = response
+        self.error = error
+
+    def __repr__(self) -> str:
+        return f"FakeOperation(name={self.name}, done={self.done})"
+
+
+def _text_of(contents: Any) -> str:
+    if isinstance(contents, str):
+        return contents
+    if isinstance(contents, (list, tuple)):
+        return '\n'.join(part for part in contents if isinstance(part, str))
+    return ''
+
+
+def _scene_count(instruction: str) -> int:
+    total = re.search(r'total estimated_duration MUST be (\d+) seconds', instruction)
+    cap = re.search(r'≤ (\d+) seconds', instruction)
+    if total and cap:
+        return max(1, math.ceil(int(total.group(1)) / max(1, int(cap.group(1)))))
+    return max(1, Config.FAKE_STORY_SCENES)
+
+
+def scripted_reply(contents: Any, config: Any = None, instruction: str = None) -> str:
+    """Canned answer shaped like what each StoryGenerationService / CloudService prompt expects"""
+    instruction = str(instruction or getattr(config, 'system_instruction', '') or '')
+    text = _text_of(contents)
+
+    if 'story architect' in instruction:
+        scenes = _scene_count(instruction)
+        return json.dumps({
+            'title': 'The Offline Expedition',
+            'premise': f"A synthetic story about: {text[:80]}",
+            'genre': 'adventure', 'tone': 'cinematic', 'setting': 'a quiet coastal town',
+            'time_period': 'present day', 'estimated_duration': scenes * 8,
+            'target_audience': 'general', 'visual_style': 'warm naturalistic light',
+            'story_arc': ['Setup', 'Inciting incident', 'Rising action', 'Climax', 'Resolution'],
+            'themes': ['curiosity', 'friendship'], 'key_entities': ['man', 'dog'],
+            'scene_structure': [{
+                'sequence': index + 1, 'title': f"Scene {index + 1}", 'purpose': 'progression',
+                'location': 'harbour', 'time_of_day': 'golden hour', 'estimated_duration': 8,
+                'key_actions': ['walks', 'looks around'], 'mood': 'hopeful',
+            } for index in range(scenes)],
+        })
+
+    if 'cinematographer' in instruction:
+        # The scene outline arrives as "Sequence: 3" / "Title: ..." lines
+        scene = dict((key.lower(), value.strip()) for key, value in re.findall(r'^(Sequence|Title): (.*)$', text, re.M))
+        sequence = int(scene.get('sequence') or 1)
+        return json.dumps({
+            'id': f"scene-{sequence}", 'sequence': sequence, 'title': scene.get('title', f"Scene {sequence}"),
+            'location': 'A wooden pier over calm water', 'time_of_day': 'golden hour, low sun',
+            'duration_seconds': 8, 'aspect_ratio': '16:9',
+            'camera_work': {'primary_shot': 'wide shot', 'camera_movement': 'slow dolly', 'angle': 'eye level'},
+            'lighting': {'type': 'natural', 'mood': 'warm', 'direction': 'side'},
+            'visual_description': f"A man and his dog walk along the pier in scene {sequence}.",
+            'veo_prompt': f"Cinematic wide shot, a man and a dog walk along a sunlit pier, scene {sequence}",
+            'character_details': [{'name': 'Sam', 'description': 'tall man in a blue coat',
+                                   'actions': ['walks'], 'emotions': 'calm'}],
+            'props_and_elements': ['pier', 'lantern'], 'mood_tags': ['warm'],
+            'continuity_notes': 'Same coat and lighting as previous scene', 'technical_notes': '',
+        })
+
+    if 'character development' in instruction:
+        return json.dumps({'characters': [
+            {'name': 'Sam', 'role': 'protagonist', 'age_range': '30s',
+             'physical_description': 'tall man with short dark hair', 'clothing_style': 'blue coat',
+             'personality_traits': ['curious', 'kind'], 'motivations': 'find the lighthouse',
+             'speaking_style': 'quiet', 'key_relationships': 'owner of Rex',
+             'character_arc': 'learns to slow down', 'visual_references': 'film photography'},
+            {'name': 'Rex', 'role': 'supporting', 'age_range': '5 years',
+             'physical_description': 'golden retriever', 'clothing_style': 'red collar',
+             'personality_traits': ['loyal'], 'motivations': 'stay close to Sam',
+             'speaking_style': 'barks', 'key_relationships': "Sam's dog",
+             'character_arc': 'none', 'visual_references': 'soft fur in backlight'},
+        ]})
+
+    return ("Cinematic wide shot at golden hour: a man in a blue coat and his golden retriever "
+            "walk slowly along a wooden pier while gulls circle above calm water.")
+
+
+class _FakeVeo:
+    """Shared Veo state for the sync and aio surfaces"""
+
+    def __init__(self, storage: FakeStorageClient):
+        self.storage = storage
+        self.lock = threading.Lock()
+        self.operations: Dict[str, Dict[str, Any]] = {}
+
+    def submit(self, model: str, prompt: str, config: Any = None) -> FakeOperation:
+        if random.random() < Config.FAKE_VEO_RATE_LIMIT_RATE:
+            raise RuntimeError("429 RESOURCE_EXHAUSTED: Quota exceeded (fake backend)")
+        output = getattr(config, 'output_gcs_uri', None) or f"gs://{Config.GCS_BUCKET_NAME}/videos/{uuid.uuid4()}/"
+        duration = getattr(config, 'duration_seconds', None) or Config.DEFAULT_VIDEO_DURATION
+        name = (f"projects/{Config.GOOGLE_CLOUD_PROJECT}/locations/{Config.GOOGLE_CLOUD_REGION}"
+                f"/publishers/google/models/{model}/operations/fake-{uuid.uuid4().hex}")
+        with self.lock:
+            self.operations[name] = {'created': time.monotonic(), 'output': output, 'duration': duration,
+                                     'result': None}
+        return FakeOperation(name)
+
+    def poll(self, operation: Any) -> FakeOperation:
+        name = operation if isinstance(operation, str) else operation.name
+        with self.lock:
+            record = self.operations.get(name)
+        if record is None:
+            raise LookupError(f"Unknown operation {name}")
+        if record['result'] is not None:
+            return record['result']
+        if time.monotonic() - record['created'] < Config.FAKE_VEO_SECONDS:
+            return FakeOperation(name)
+
+        if random.random() < Config.FAKE_VEO_FAILURE_RATE:
+            result = FakeOperation(name, done=True, error={'code': 3, 'message': 'Synthetic generation failure'})
+        else:
+            gcs_uri = self._render(record)
+            result = FakeOperation(name, done=True, response={'videos': [{'gcsUri': gcs_uri, 'mimeType': 'video/mp4'}]})
+        with self.lock:
+            record['result'] = result
+        return result
+
+    def _render(self, record: Dict[str, Any]) -> str:
+        bucket_name, prefix = record['output'][len('gs://'):].split('/', 1)
+        blob_name = f"{prefix.rstrip('/')}/sample_0.mp4"
+        width, height = (int(v) for v in Config.FAKE_VIDEO_SIZE.split('x'))
+        self.storage.bucket(bucket_name).blob(blob_name).upload_from_string(
+            synthetic_mp4_bytes(float(record['duration']), (width, height)), content_type='video/mp4')
+        return f"gs://{bucket_name}/{blob_name}"
+
+
+class FakeCachedContent:
+    def __init__(self, model: str, system_instruction: str, ttl_seconds: float, display_name: str = None):
+        self.name = f"cachedContents/{uuid.uuid4().hex[:12]}"
+        self.model = model
+        self.display_name = display_name
+        self.system_instruction = system_instruction
+        self.expires_at = time.time() + ttl_seconds
+
+
+def _ttl_seconds(ttl: Any) -> float:
+    return float(str(ttl or '3600s').rstrip('s'))
+
+
+class _FakeCaches:
+    """Context caches: a system instruction stored once and referenced by name"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._caches: Dict[str, FakeCachedContent] = {}
+
+    def create(self, model: str, config: Any = None) -> FakeCachedContent:
+        cache = FakeCachedContent(model, str(getattr(config, 'system_instruction', '') or ''),
+                                  _ttl_seconds(getattr(config, 'ttl', None)), getattr(config, 'display_name', None))
+        with self._lock:
+            self._caches[cache.name] = cache
+        return cache
+
+    def get(self, name: str) -> FakeCachedContent:
+        with self._lock:
+            cache = self._caches.get(name)
+            if cache is None or cache.expires_at < time.time():
+                self._caches.pop(name, None)
+                raise LookupError(f"404 NOT_FOUND: cached content {name} not found or expired")
+            return cache
+
+    def delete(self, name: str):
+        with self._lock:
+            self._caches.pop(name, None)
+
+    def reply(self, contents: Any, config: Any = None) -> FakeResponse:
+        """generate_content: the cached instruction counts as prompt and as cached tokens"""
+        cached_name = getattr(config, 'cached_content', None)
+        instruction = self.get(cached_name).system_instruction if cached_name else \
+            str(getattr(config, 'system_instruction', '') or '')
+        prompt_chars = len(_text_of(contents)) + len(instruction)
+        return FakeResponse(scripted_reply(contents, config, instruction), prompt_chars, config,
+                            cached_chars=len(instruction) if cached_name else 0)
+
+
+class _FakeAsyncCaches:
+    def __init__(self, caches: _FakeCaches):
+        self._caches = caches
+
+    async def create(self, model: str, config: Any = None) -> FakeCachedContent:
+        return self._caches.create(model, config)
+
+    async def get(self, name: str) -> FakeCachedContent:
+        return self._caches.get(name)
+
+    async def delete(self, name: str):
+        self._caches.delete(name)
+
+
+class _FakeModels:
+    def __init__(self, veo: _FakeVeo, caches: _FakeCaches):
+        self._veo = veo
+        self._caches = caches
+
+    def generate_content(self, model: str, contents: Any, config: Any = None) -> FakeResponse:
+        time.sleep(Config.FAKE_GEMINI_SECONDS)
+        return self._caches.reply(contents, config)
+
+    def generate_videos(self, model: str, prompt: str, image: Any = None, config: Any = None) -> FakeOperation:
+        return self._veo.submit(model, prompt, config)
+
+
+class _FakeOperations:
+    def __init__(self, veo: _FakeVeo):
+        self._veo = veo
+
+    def get(self, operation: Any) -> FakeOperation:
+        return self._veo.poll(operation)
+
+
+class _FakeAsyncModels:
+    def __init__(self, veo: _FakeVeo, caches: _FakeCaches):
+        self._veo = veo
+        self._caches = caches
+
+    async def generate_content(self, model: str, contents: Any, config: Any = None) -> FakeResponse:
+        await asyncio.sleep(Config.FAKE_GEMINI_SECONDS)
+        return self._caches.reply(contents, config)
+
+    async def generate_videos(self, model: str, prompt: str, image: Any = None, config: Any = None) -> FakeOperation:
+        return self._veo.submit(model, prompt, config)
+
+
+class _FakeAsyncOperations:
+    def __init__(self, veo: _FakeVeo):
+        self._veo = veo
+
+    async def get(self, operation: Any) -> FakeOperation:
+        return self._veo.poll(operation)
+
+
+class _FakeAio:
+    def __init__(self, veo: _FakeVeo, caches: _FakeCaches):
+        self.models = _FakeAsyncModels(veo, caches)
+        self.operations = _FakeAsyncOperations(veo)
+        self.caches = _FakeAsyncCaches(caches)
+
+
+class FakeGenaiClient:
+    def __init__(self, storage: FakeStorageClient):
+        veo = _FakeVeo(storage)
+        self.caches = _FakeCaches()
+        self.models = _FakeModels(veo, self.caches)
+        self.operations = _FakeOperations(veo)
+        self.aio = _FakeAio(veo, self.caches)
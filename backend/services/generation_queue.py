@@ -0,0 +1,434 @@
+"""
+Durable Veo generation queue and rate-limited dispatcher
+"""
+
+import os
+import time
+import random
+import socket
+import logging
+import threading
+from typing import Dict, List, Optional, Any, TYPE_CHECKING
+from datetime import datetime
+
+from config.settings import Config
+from services.cloud_service import CloudService
+from services.fair_scheduler import fair_order
+from utils.rate_limit import TokenBucket
+from utils import metrics
+
+if TYPE_CHECKING:
+    from google.genai import types
+
+
+class FirestoreQueueStore:
+    """Queue storage backed by a Firestore collection (survives restarts, shared across workers)"""
+
+    def __init__(self, cloud_service: CloudService):
+        self.cloud_service = cloud_service
+        self.collection = Config.GENERATION_QUEUE_COLLECTION
+
+    def save(self, job_id: str, job: Dict[str, Any]) -> Dict[str, Any]:
+        return self.cloud_service.save_document(self.collection, job_id, job)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return self.cloud_service.get_document(self.collection, job_id)
+
+    def update(self, job_id: str, data: Dict[str, Any]):
+        self.cloud_service.update_document(self.collection, job_id, data)
+
+    def active(self) -> List[Dict[str, Any]]:
+        return self.cloud_service.query_documents(
+            self.collection,
+            filters=[('status', 'in', GenerationQueue.ACTIVE_STATUSES)],
+        )
+
+    def compare_and_set(self, job_id: str, expected_status: str, data: Dict[str, Any]) -> bool:
+        return self.cloud_service.update_document_if(self.collection, job_id, 'status', expected_status, data)
+
+    def hold_lease(self, name: str, owner: str, ttl: float) -> bool:
+        """Take or renew the named lease for `owner`; False while another owner holds it"""
+        collection = Config.GENERATION_LEASES_COLLECTION
+        lease = self.cloud_service.get_document(collection, name)
+        if lease is None:
+            lease = self.cloud_service.save_document(collection, name, {'owner': None, 'expires_ts': 0})
+        now = time.time()
+        if lease.get('owner') != owner and float(lease.get('expires_ts') or 0) > now:
+            return False
+        return self.cloud_service.update_document_if(collection, name, 'expires_ts', lease.get('expires_ts'),
+                                                     {'owner': owner, 'expires_ts': now + ttl})
+
+    def drop_lease(self, name: str, owner: str):
+        collection = Config.GENERATION_LEASES_COLLECTION
+        lease = self.cloud_service.get_document(collection, name)
+        if lease and lease.get('owner') == owner:
+            self.cloud_service.update_document_if(collection, name, 'expires_ts', lease.get('expires_ts'),
+                                                  {'owner': None, 'expires_ts': 0})
+
+
+class LocalQueueStore:
+    """In-process stand-in for FirestoreQueueStore, used for tests and single-process runs"""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def save(self, job_id: str, job: Dict[str, Any]) -> Dict[str, Any]:
+        with self._lock:
+            self._jobs[job_id] = dict(job)
+            return {"id": job_id, **job}
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return {"id": job_id, **job} if job is not None else None
+
+    def update(self, job_id: str, data: Dict[str, Any]):
+        with self._lock:
+            self._jobs.setdefault(job_id, {}).update(data)
+
+    def active(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return [
+                {"id": job_id, **job} for job_id, job in self._jobs.items()
+                if job.get('status') in GenerationQueue.ACTIVE_STATUSES
+            ]
+
+    def compare_and_set(self, job_id: str, expected_status: str, data: Dict[str, Any]) -> bool:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.get('status') != expected_status:
+                return False
+            job.update(data)
+            return True
+
+    def hold_lease(self, name: str, owner: str, ttl: float) -> bool:
+        # The queue is private to this process, so its dispatcher is always the only one
+        return True
+
+    def drop_lease(self, name: str, owner: str):
+        pass
+
+
+class GenerationQueue:
+    """Priority queue of pending Veo submissions.
+
+    Job records are durable (Firestore or the local stand-in). A job's starting image is
+    referenced by its GCS URI, never held in memory: whichever worker holds the dispatch
+    lease submits it, and Veo reads the image from GCS itself.
+    """
+
+    ACTIVE_STATUSES = ['queued', 'dispatching', 'submitted']
+
+    def __init__(self, cloud_service: CloudService, store=None):
+        self.logger = logging.getLogger(__name__)
+        if store is None:
+            if Config.GENERATION_QUEUE_BACKEND == 'local':
+                store = LocalQueueStore()
+            else:
+                store = FirestoreQueueStore(cloud_service)
+        self.store = store
+        self._wakeup = threading.Event()
+
+    def enqueue(self, job_id: str, segment_id: str, story_id: str, prompt: str, model: str,
+                image_gcs_uri: str = None, image_mime_type: str = None,
+                priority: int = None, user_id: str = None) -> Dict[str, Any]:
+        """Persist a submission job and return it with its current queue position"""
+        job = {
+            'segment_id': segment_id,
+            'story_id': story_id,
+            'user_id': user_id or 'anonymous',
+            'prompt': prompt,
+            'model': model,
+            'image_gcs_uri': image_gcs_uri,
+            'image_mime_type': image_mime_type,
+            'priority': int(priority if priority is not None else Config.GENERATION_DEFAULT_PRIORITY),
+            'status': 'queued',
+            'attempts': 0,
+            'not_before': 0.0,
+            'enqueued_ts': time.time(),
+            'created_at': datetime.utcnow().isoformat(),
+        }
+        saved = self.store.save(job_id, job)
+        self.notify()
+
+        saved['queue_position'] = self.position(job_id)
+        self.logger.info(f"Queued generation job {job_id} for segment {segment_id} "
+                         f"(model={model}, priority={job['priority']}, position={saved['queue_position']})")
+        return saved
+
+    def active_jobs(self) -> List[Dict[str, Any]]:
+        return self.store.active()
+
+    def in_flight_by_user(self, jobs: List[Dict[str, Any]] = None) -> Dict[str, int]:
+        """Jobs per user that hold Veo capacity (being submitted or running)"""
+        jobs = self.active_jobs() if jobs is None else jobs
+        counts: Dict[str, int] = {}
+        for job in jobs:
+            if job.get('status') in ('dispatching', 'submitted'):
+                user_id = job.get('user_id') or 'anonymous'
+                counts[user_id] = counts.get(user_id, 0) + 1
+        return counts
+
+    def pending_jobs(self, jobs: List[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """Queued jobs in dispatch order (weighted fair across users, priority then FIFO within a user)"""
+        jobs = self.active_jobs() if jobs is None else jobs
+        queued = [j for j in jobs if j.get('status') == 'queued']
+        return fair_order(queued, self.in_flight_by_user(jobs))
+
+    def position(self, job_id: str) -> Optional[int]:
+        """1-based position of a queued job, or None if it is no longer waiting"""
+        for index, job in enumerate(self.pending_jobs()):
+            if job.get('id') == job_id:
+                return index + 1
+        return None
+
+    def claim(self, job: Dict[str, Any]) -> bool:
+        """Take ownership of a queued job; False if another dispatcher got there first"""
+        return self.store.compare_and_set(job['id'], 'queued', {
+            'status': 'dispatching',
+            'claimed_at': time.time(),
+        })
+
+    def release_stale(self, job: Dict[str, Any]) -> bool:
+        """Return a job abandoned mid-dispatch (e.g. by a crashed worker) to the queue"""
+        claimed_at = job.get('claimed_at') or 0
+        if time.time() - claimed_at < Config.GENERATION_CLAIM_TIMEOUT:
+            return False
+        released = self.store.compare_and_set(job['id'], 'dispatching', {'status': 'queued'})
+        if released:
+            self.logger.warning(f"Requeued stale generation job {job['id']}")
+        return released
+
+    def mark_submitted(self, job_id: str, operation_name: str):
+        self.store.update(job_id, {
+            'status': 'submitted',
+            'operation_name': operation_name,
+            'submitted_at': datetime.utcnow().isoformat(),
+            'submitted_ts': time.time(),
+        })
+
+    def mark_finished(self, job_id: str, status: str = 'done') -> bool:
+        """Release the user's in-flight slot once the Veo operation has finished; False if already released"""
+        job = self.store.get(job_id)
+        finished = self.store.compare_and_set(job_id, 'submitted', {
+            'status': status,
+            'finished_at': datetime.utcnow().isoformat(),
+        })
+        if finished and job and job.get('submitted_ts'):
+            metrics.record_veo_operation(job.get('model'), status, time.time() - float(job['submitted_ts']))
+        return finished
+
+    def expire_stale_submission(self, job: Dict[str, Any]) -> bool:
+        """Stop counting a submission nobody polled to completion against its user's cap"""
+        submitted_ts = job.get('submitted_ts') or 0
+        if time.time() - submitted_ts < Config.OPERATION_TIMEOUT:
+            return False
+        return self.store.compare_and_set(job['id'], 'submitted', {'status': 'expired'})
+
+    def user_summary(self, user_id: str) -> Dict[str, Any]:
+        """A user's queued job positions and in-flight count"""
+        jobs = self.active_jobs()
+        positions = [
+            {'operation_id': job['id'], 'segment_id': job.get('segment_id'), 'queue_position': index + 1}
+            for index, job in enumerate(self.pending_jobs(jobs))
+            if (job.get('user_id') or 'anonymous') == user_id
+        ]
+        return {
+            'queued': positions,
+            'in_flight': self.in_flight_by_user(jobs).get(user_id, 0),
+            'total_queued': sum(1 for job in jobs if job.get('status') == 'queued'),
+        }
+
+    def schedule_retry(self, job: Dict[str, Any], error: str, delay_seconds: float):
+        """Put a job back in the queue, not to be attempted for `delay_seconds`"""
+        self.store.update(job['id'], {
+            'status': 'queued',
+            'attempts': int(job.get('attempts', 0)) + 1,
+            'not_before': time.time() + delay_seconds,
+            'last_error': error,
+        })
+
+    def mark_failed(self, job_id: str, error: str):
+        self.store.update(job_id, {
+            'status': 'failed',
+            'last_error': error,
+            'failed_at': datetime.utcnow().isoformat(),
+        })
+
+    def job_image(self, job: Dict[str, Any]) -> Optional['types.Image']:
+        """Starting image for a job, as a reference to its GCS object (None for text-only jobs)"""
+        if not job.get('image_gcs_uri'):
+            return None
+        from google.genai import types
+        return types.Image(gcs_uri=job['image_gcs_uri'], mime_type=job.get('image_mime_type') or 'image/png')
+
+    def hold_dispatch_lease(self, owner: str, ttl: float) -> bool:
+        """True while `owner` is the one dispatcher allowed to submit this queue's jobs"""
+        return self.store.hold_lease('dispatcher', owner, ttl)
+
+    def drop_dispatch_lease(self, owner: str):
+        """Give the lease up so another worker's dispatcher takes over without waiting for expiry"""
+        self.store.drop_lease('dispatcher', owner)
+
+    def notify(self):
+        """Wake the dispatcher immediately"""
+        self._wakeup.set()
+
+    def wait_for_work(self, timeout: float):
+        """Sleep until a job is enqueued locally or `timeout` elapses"""
+        self._wakeup.wait(timeout)
+        self._wakeup.clear()
+
+
+def is_rate_limit_error(error: Exception) -> bool:
+    """True for Vertex quota errors (HTTP 429 / RESOURCE_EXHAUSTED)"""
+    if getattr(error, 'code', None) == 429 or getattr(error, 'status_code', None) == 429:
+        return True
+    text = str(error)
+    return '429' in text or 'RESOURCE_EXHAUSTED' in text
+
+
+class GenerationDispatcher:
+    """Background worker that drains the GenerationQueue within per-model Veo rate limits.
+
+    Every worker process runs one, but only the holder of the queue's dispatch lease submits,
+    so VEO_RATE_LIMITS apply to the deployment rather than to each process. With the local
+    queue backend each process dispatches its own jobs at 1/WORKER_PROCESSES of the limits.
+    """
+
+    def __init__(self, generation_queue: GenerationQueue, video_service):
+        self.queue = generation_queue
+        self.video_service = video_service
+        self.logger = logging.getLogger(__name__)
+        self.buckets: Dict[str, TokenBucket] = {
+            model: self._make_bucket(rate, burst) for model, (rate, burst) in Config.VEO_RATE_LIMITS.items()
+        }
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._owner: Optional[str] = None
+        self._lease_until = 0.0
+
+    def _make_bucket(self, rate: float, burst: int) -> TokenBucket:
+        if isinstance(self.queue.store, LocalQueueStore):
+            rate, burst = rate / Config.WORKER_PROCESSES, max(1, burst // Config.WORKER_PROCESSES)
+        return TokenBucket(rate, burst)
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        # Set here rather than in __init__ so each forked worker gets its own identity
+        self._owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._lease_until = 0.0
+        self._thread = threading.Thread(target=self._run, name='generation-dispatcher', daemon=True)
+        self._thread.start()
+        self.logger.info("Generation dispatcher started")
+
+    def is_alive(self) -> bool:
+        return bool(self._thread and self._thread.is_alive())
+
+    def stop(self, timeout: float = 5.0):
+        self._stop.set()
+        self.queue.notify()
+        if self._thread:
+            self._thread.join(timeout)
+        if self._lease_until:
+            self._lease_until = 0.0
+            try:
+                self.queue.drop_dispatch_lease(self._owner)
+            except Exception as e:
+                self.logger.warning(f"Could not release the dispatch lease: {str(e)}")
+
+    def _leading(self) -> bool:
+        """Hold (renewing a third of the way through) the lease that makes this the active dispatcher"""
+        now = time.time()
+        if now < self._lease_until - Config.GENERATION_LEASE_TTL * 2 / 3:
+            return True
+        try:
+            held = self.queue.hold_dispatch_lease(self._owner, Config.GENERATION_LEASE_TTL)
+        except Exception as e:
+            self.logger.warning(f"Could not renew the dispatch lease: {str(e)}")
+            # Keep going on the lease already held, but not past its expiry
+            return now < self._lease_until - 1
+        if held and not self._lease_until:
+            self.logger.info(f"Dispatcher {self._owner} is now submitting queued generation jobs")
+        elif not held and self._lease_until:
+            self.logger.info(f"Dispatcher {self._owner} lost the dispatch lease")
+        self._lease_until = now + Config.GENERATION_LEASE_TTL if held else 0.0
+        return held
+
+    def _bucket_for(self, model: str) -> TokenBucket:
+        if model not in self.buckets:
+            rate, burst = Config.VEO_RATE_LIMITS[Config.VEO_MODEL_STANDARD]
+            self.buckets[model] = self._make_bucket(rate, burst)
+        return self.buckets[model]
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                wait = self.dispatch_ready() if self._leading() else Config.GENERATION_DISPATCH_INTERVAL
+            except Exception as e:
+                self.logger.error(f"Generation dispatcher loop failed: {str(e)}")
+                wait = Config.GENERATION_DISPATCH_INTERVAL
+            self.queue.wait_for_work(wait)
+
+    def dispatch_ready(self) -> float:
+        """Submit every job that is due and has a rate-limit token; return seconds to wait before the next pass"""
+        now = time.time()
+        next_wait = Config.GENERATION_DISPATCH_INTERVAL
+        jobs = self.queue.active_jobs()
+        metrics.record_queue_depth(jobs)
+
+        for job in jobs:
+            if job.get('status') == 'dispatching':
+                self.queue.release_stale(job)
+            elif job.get('status') == 'submitted' and self.queue.expire_stale_submission(job):
+                job['status'] = 'expired'
+
+        in_flight = self.queue.in_flight_by_user(jobs)
+        for job in self.queue.pending_jobs(jobs):
+            not_before = float(job.get('not_before') or 0)
+            if not_before > now:
+                next_wait = min(next_wait, not_before - now)
+                continue
+            user_id = job.get('user_id') or 'anonymous'
+            if in_flight.get(user_id, 0) >= Config.PER_USER_MAX_VEO_IN_FLIGHT:
+                continue
+            bucket = self._bucket_for(job.get('model'))
+            if not bucket.try_acquire():
+                next_wait = min(next_wait, bucket.seconds_until_available())
+                continue
+            if not self.queue.claim(job):
+                # Another dispatcher took the job; the token was not spent on Veo
+                bucket.release()
+                continue
+            in_flight[user_id] = in_flight.get(user_id, 0) + 1
+            if not self._submit(job, bucket):
+                in_flight[user_id] -= 1
+
+        return max(next_wait, 0.05)
+
+    def _submit(self, job: Dict[str, Any], bucket: TokenBucket) -> bool:
+        """Submit one claimed job; True if Veo accepted it"""
+        image = self.queue.job_image(job)
+        try:
+            operation_name = self.video_service.submit_generation_job(job, image)
+            self.queue.mark_submitted(job['id'], operation_name)
+            metrics.record_veo_submission(job.get('model'), 'accepted')
+            return True
+        except Exception as e:
+            attempts = int(job.get('attempts', 0)) + 1
+            rate_limited = is_rate_limit_error(e)
+            metrics.record_veo_submission(job.get('model'), 'rate_limited' if rate_limited else 'error')
+            if rate_limited and attempts < Config.GENERATION_MAX_ATTEMPTS:
+                bucket.drain()
+                delay = min(Config.GENERATION_BACKOFF_BASE * (2 ** (attempts - 1)), Config.GENERATION_BACKOFF_MAX)
+                delay *= random.uniform(0.75, 1.25)
+                self.logger.warning(f"Veo quota exceeded for job {job['id']} (attempt {attempts}); retrying in {delay:.1f}s")
+                self.queue.schedule_retry(job, str(e), delay)
+                return False
+            self.logger.error(f"Generation job {job['id']} failed: {str(e)}")
+            self.queue.mark_failed(job['id'], str(e))
+            self.video_service.fail_generation_job(job, str(e))
+            return False
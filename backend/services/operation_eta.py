@@ -0,0 +1,110 @@
+"""
+Learned Veo operation durations, ETAs and adaptive poll hints
+
+Completed operations update an exponentially weighted mean and variance of their duration per
+model and input (text or image), kept per worker and shared through a small Firestore document
+per key. Status responses use them for `eta_seconds` and a `next_poll_after_ms` hint: sparse
+polls while completion is still far off, dense ones from shortly before the expected time.
+"""
+
+import math
+import time
+import logging
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from config.settings import Config
+from services.cloud_service import CloudService
+
+# Weight of the newest sample in the moving averages
+_ALPHA = 0.2
+# Seconds before a worker re-reads the shared stats for a key
+_REFRESH_SECONDS = 300
+# Polling becomes dense this many standard deviations before the expected completion
+_DENSE_WINDOW_SIGMAS = 1.0
+
+
+def duration_key(model: Optional[str], has_image: bool) -> str:
+    return f"{model or 'unknown'}:{'image' if has_image else 'text'}"
+
+
+def _clamp(seconds: float) -> float:
+    return min(max(seconds, Config.POLL_HINT_MIN_SECONDS), Config.POLL_HINT_MAX_SECONDS)
+
+
+class OperationDurations:
+    """Duration statistics per (model, has_image) and the ETA / poll hint derived from them"""
+
+    def __init__(self, cloud_service: CloudService):
+        self.cloud_service = cloud_service
+        self.logger = logging.getLogger(__name__)
+        self._lock = threading.Lock()
+        # key -> {'count', 'mean', 'var'}; key -> monotonic time the shared copy was last read
+        self._stats: Dict[str, Dict[str, float]] = {}
+        self._loaded: Dict[str, float] = {}
+
+    def _current(self, key: str) -> Optional[Dict[str, float]]:
+        with self._lock:
+            fresh = time.monotonic() - self._loaded.get(key, -_REFRESH_SECONDS) < _REFRESH_SECONDS
+            if fresh:
+                return self._stats.get(key)
+        try:
+            shared = self.cloud_service.get_document(Config.OPERATION_STATS_COLLECTION, key)
+        except Exception as e:
+            self.logger.warning(f"Could not read operation stats for {key}: {str(e)}")
+            shared = None
+        with self._lock:
+            self._loaded[key] = time.monotonic()
+            if shared and shared.get('count', 0) >= self._stats.get(key, {}).get('count', 0):
+                self._stats[key] = {field: float(shared[field]) for field in ('count', 'mean', 'var')}
+            return self._stats.get(key)
+
+    def record(self, model: Optional[str], has_image: bool, seconds: float):
+        """Add a completed operation's duration (submission to observed completion)"""
+        if seconds <= 0:
+            return
+        key = duration_key(model, has_image)
+        stats = dict(self._current(key) or {'count': 0, 'mean': seconds, 'var': 0.0})
+        delta = seconds - stats['mean']
+        stats['mean'] += _ALPHA * delta
+        stats['var'] = (1 - _ALPHA) * (stats['var'] + _ALPHA * delta * delta)
+        stats['count'] += 1
+        with self._lock:
+            self._stats[key] = stats
+        try:
+            self.cloud_service.save_document(Config.OPERATION_STATS_COLLECTION, key, {
+                **stats, 'model': model, 'has_image': has_image, 'updated_ts': time.time(),
+            })
+        except Exception as e:
+            self.logger.warning(f"Could not share operation stats for {key}: {str(e)}")
+
+    def expected(self, model: Optional[str], has_image: bool) -> Tuple[float, float]:
+        """(expected seconds, standard deviation) for an operation; defaults until one completes"""
+        stats = self._current(duration_key(model, has_image))
+        if not stats:
+            return float(Config.OPERATION_ETA_DEFAULT_SECONDS), Config.OPERATION_ETA_DEFAULT_SECONDS / 4
+        # A few similar samples would otherwise leave no margin around the mean
+        return stats['mean'], max(math.sqrt(stats['var']), stats['mean'] * 0.1)
+
+    def running_hint(self, model: Optional[str], has_image: bool, elapsed: Optional[float]) -> Dict[str, Any]:
+        """eta_seconds and next_poll_after_ms for an operation `elapsed` seconds after submission"""
+        mean, sigma = self.expected(model, has_image)
+        if elapsed is None:
+            return {'eta_seconds': round(mean), 'next_poll_after_ms': int(_clamp(Config.OPERATION_POLL_INTERVAL) * 1000)}
+        remaining = mean - elapsed
+        dense_from = remaining - _DENSE_WINDOW_SIGMAS * sigma
+        if dense_from > 0:
+            # Far from done: come back when the dense window starts
+            wait = dense_from
+        elif remaining > -2 * sigma - Config.POLL_HINT_MIN_SECONDS:
+            wait = Config.POLL_HINT_MIN_SECONDS
+        else:
+            # Overdue: back off gently in proportion to how late it is
+            wait = -remaining / 4
+        return {'eta_seconds': max(0, round(remaining)), 'next_poll_after_ms': int(_clamp(wait) * 1000)}
+
+    def queued_hint(self, model: Optional[str], has_image: bool, position: Optional[int]) -> Dict[str, Any]:
+        """Hints for an operation still waiting in the generation queue"""
+        mean, _ = self.expected(model, has_image)
+        wait = Config.POLL_HINT_MIN_SECONDS * max(1, position or 1)
+        return {'eta_seconds': round(mean), 'next_poll_after_ms': int(_clamp(wait) * 1000)}
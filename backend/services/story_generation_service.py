@@ -4,15 +4,23 @@ AI-powered story generation service for creating detailed story structures
 
 import uuid
 import math
+import asyncio
 import logging
 import re
 import json
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 
-from google.genai import types
 from config.settings import Config
 from services.cloud_service import CloudService
+from services.context_cache import GeminiContextCache, is_missing_cache_error
+from services.storyboard_store import single_element_type
+from utils.instrumentation import instrument
+from utils import tracing
+from utils.json_patch import JsonPatchError, apply_patch, to_pointer, updates_to_patch
+from utils.structured_output import parse_response
+from utils.story_context import (CHARACTER_FIELDS, ContextBuilder, NEIGHBOUR_FIELDS, SCENE_FIELDS, STORY_FIELDS,
+                                 compact_fields, scene_outlines)
 
 
 class StoryGenerationService:
@@ -21,7 +29,9 @@ class StoryGenerationService:
     def __init__(self, cloud_service: CloudService):
         self.cloud_service = cloud_service
         self.logger = logging.getLogger(__name__)
+        self.context_cache = GeminiContextCache(cloud_service)
     
+    @instrument('story.generate')
     def generate_story_from_prompt(self, prompt: str, user_preferences: Dict[str, Any] = None) -> Dict[str, Any]:
         """
         Generate a complete story structure from a single prompt
@@ -33,54 +43,7 @@ class StoryGenerationService:
             # Get AI-generated story structure (honor duration preferences when present)
             preferences = user_preferences or {}
             story_structure = self._generate_story_structure(prompt, preferences)
-
-            # Ensure key_entities always includes entities explicitly named in the user prompt
-            try:
-                extracted = self._extract_key_entities_from_prompt(prompt)
-                existing = story_structure.get('key_entities') or []
-                if isinstance(existing, list):
-                    # Merge and de-duplicate while preserving order
-                    seen = set()
-                    merged = []
-                    for ent in (existing + extracted):
-                        ent_norm = str(ent).strip().lower()
-                        if ent_norm and ent_norm not in seen:
-                            seen.add(ent_norm)
-                            merged.append(ent_norm)
-                    story_structure['key_entities'] = merged
-                else:
-                    story_structure['key_entities'] = extracted
-            except Exception:
-                # Best-effort only; safe to continue
-                story_structure.setdefault('key_entities', [])
-
-            # Normalize scene count/durations to meet target_total and per-scene cap deterministically
-            target_total = int(preferences.get('target_total_duration_seconds') or 0)
-            max_scene_seconds = int(preferences.get('max_scene_duration_seconds', 8) or 8)
-            if target_total > 0 and max_scene_seconds > 0:
-                try:
-                    desired_count = max(1, math.ceil(target_total / max_scene_seconds))
-                    remainder = max(1, min(max_scene_seconds, target_total - max_scene_seconds * (desired_count - 1)))
-                    base_scenes = story_structure.get('scene_structure', []) or []
-                    normalized_scenes = []
-                    for i in range(desired_count):
-                        base = base_scenes[i % len(base_scenes)] if base_scenes else {}
-                        duration = max_scene_seconds if i < desired_count - 1 else remainder
-                        normalized_scenes.append({
-                            'sequence': i + 1,
-                            'title': base.get('title') or f'Scene {i + 1}',
-                            'purpose': base.get('purpose') or 'development',
-                            'location': base.get('location') or story_structure.get('setting') or 'location',
-                            'time_of_day': base.get('time_of_day') or 'daytime',
-                            'estimated_duration': int(duration),
-                            'key_actions': base.get('key_actions') or [],
-                            'mood': base.get('mood') or story_structure.get('tone') or 'cinematic'
-                        })
-                    story_structure['scene_structure'] = normalized_scenes
-                    story_structure['estimated_duration'] = int(target_total)
-                except Exception:
-                    # If normalization fails, at least align top-level estimated duration
-                    story_structure['estimated_duration'] = int(target_total)
+            max_scene_seconds = self._prepare_story_structure(story_structure, prompt, preferences)
             
             # Generate detailed scenes and storyboards with per-scene duration cap (default 8s for Veo)
             detailed_scenes = self._generate_detailed_scenes(story_structure, prompt, max_scene_seconds)
@@ -88,35 +51,116 @@ class StoryGenerationService:
             # Generate character profiles
             character_profiles = self._generate_character_profiles(story_structure)
             
-            # Create comprehensive story data
-            story_data = {
-                'id': str(uuid.uuid4()),
-                'original_prompt': prompt,
-                'title': story_structure.get('title'),
-                'premise': story_structure.get('premise'),
-                'genre': story_structure.get('genre'),
-                'tone': story_structure.get('tone'),
-                'setting': story_structure.get('setting'),
-                'estimated_duration': story_structure.get('estimated_duration'),
-                'target_audience': story_structure.get('target_audience'),
-                'visual_style': story_structure.get('visual_style'),
-                'key_entities': story_structure.get('key_entities') or [],
-                'characters': character_profiles,
-                'scenes': detailed_scenes,
-                'scene_count': len(detailed_scenes),
-                'story_arc': story_structure.get('story_arc'),
-                'themes': story_structure.get('themes', []),
-                'created_at': datetime.utcnow().isoformat(),
-                'status': 'generated'
-            }
-            
-            self.logger.info(f"Generated story with {len(detailed_scenes)} scenes and {len(character_profiles)} characters")
-            return story_data
+            return self._assemble_story(prompt, story_structure, detailed_scenes, character_profiles)
             
         except Exception as e:
             self.logger.error(f"Error generating story from prompt: {str(e)}")
             raise
 
+    @instrument('story.generate')
+    async def agenerate_story_from_prompt(self, prompt: str, user_preferences: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Async variant of generate_story_from_prompt on the genai aio client.
+        Scene details and character profiles only depend on the story structure, so they are
+        requested concurrently instead of one after another.
+        """
+        try:
+            self.logger.info(f"Generating story (async) from prompt: {prompt[:100]}...")
+
+            preferences = user_preferences or {}
+            story_structure = await self._agenerate_story_structure(prompt, preferences)
+            max_scene_seconds = self._prepare_story_structure(story_structure, prompt, preferences)
+
+            detailed_scenes, character_profiles = await asyncio.gather(
+                self._agenerate_detailed_scenes(story_structure, prompt, max_scene_seconds),
+                self._agenerate_character_profiles(story_structure),
+            )
+
+            return self._assemble_story(prompt, story_structure, detailed_scenes, character_profiles)
+
+        except Exception as e:
+            self.logger.error(f"Error generating story from prompt: {str(e)}")
+            raise
+
+    def _prepare_story_structure(self, story_structure: Dict[str, Any], prompt: str, preferences: Dict[str, Any]) -> int:
+        """Merge prompt entities and normalize scene durations in place; returns the per-scene cap"""
+        # Ensure key_entities always includes entities explicitly named in the user prompt
+        try:
+            extracted = self._extract_key_entities_from_prompt(prompt)
+            existing = story_structure.get('key_entities') or []
+            if isinstance(existing, list):
+                # Merge and de-duplicate while preserving order
+                seen = set()
+                merged = []
+                for ent in (existing + extracted):
+                    ent_norm = str(ent).strip().lower()
+                    if ent_norm and ent_norm not in seen:
+                        seen.add(ent_norm)
+                        merged.append(ent_norm)
+                story_structure['key_entities'] = merged
+            else:
+                story_structure['key_entities'] = extracted
+        except Exception:
+            # Best-effort only; safe to continue
+            story_structure.setdefault('key_entities', [])
+
+        # Normalize scene count/durations to meet target_total and per-scene cap deterministically
+        target_total = int(preferences.get('target_total_duration_seconds') or 0)
+        max_scene_seconds = int(preferences.get('max_scene_duration_seconds', 8) or 8)
+        if target_total > 0 and max_scene_seconds > 0:
+            try:
+                desired_count = max(1, math.ceil(target_total / max_scene_seconds))
+                remainder = max(1, min(max_scene_seconds, target_total - max_scene_seconds * (desired_count - 1)))
+                base_scenes = story_structure.get('scene_structure', []) or []
+                normalized_scenes = []
+                for i in range(desired_count):
+                    base = base_scenes[i % len(base_scenes)] if base_scenes else {}
+                    duration = max_scene_seconds if i < desired_count - 1 else remainder
+                    normalized_scenes.append({
+                        'sequence': i + 1,
+                        'title': base.get('title') or f'Scene {i + 1}',
+                        'purpose': base.get('purpose') or 'development',
+                        'location': base.get('location') or story_structure.get('setting') or 'location',
+                        'time_of_day': base.get('time_of_day') or 'daytime',
+                        'estimated_duration': int(duration),
+                        'key_actions': base.get('key_actions') or [],
+                        'mood': base.get('mood') or story_structure.get('tone') or 'cinematic'
+                    })
+                story_structure['scene_structure'] = normalized_scenes
+                story_structure['estimated_duration'] = int(target_total)
+            except Exception:
+                # If normalization fails, at least align top-level estimated duration
+                story_structure['estimated_duration'] = int(target_total)
+        return max_scene_seconds
+
+    @instrument('story.assemble')
+    def _assemble_story(self, prompt: str, story_structure: Dict[str, Any], detailed_scenes: List[Dict[str, Any]],
+                        character_profiles: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Create comprehensive story data"""
+        story_data = {
+            'id': str(uuid.uuid4()),
+            'original_prompt': prompt,
+            'title': story_structure.get('title'),
+            'premise': story_structure.get('premise'),
+            'genre': story_structure.get('genre'),
+            'tone': story_structure.get('tone'),
+            'setting': story_structure.get('setting'),
+            'estimated_duration': story_structure.get('estimated_duration'),
+            'target_audience': story_structure.get('target_audience'),
+            'visual_style': story_structure.get('visual_style'),
+            'key_entities': story_structure.get('key_entities') or [],
+            'characters': character_profiles,
+            'scenes': detailed_scenes,
+            'scene_count': len(detailed_scenes),
+            'story_arc': story_structure.get('story_arc'),
+            'themes': story_structure.get('themes', []),
+            'created_at': datetime.utcnow().isoformat(),
+            'status': 'generated'
+        }
+        
+        self.logger.info(f"Generated story with {len(detailed_scenes)} scenes and {len(character_profiles)} characters")
+        return story_data
+
     def _extract_key_entities_from_prompt(self, prompt: str) -> List[str]:
         """Lightweight heuristic entity extractor to preserve critical nouns from the user's prompt.
         Targets common humans/animals/objects; de-dupes and lowercases for stability."""
@@ -154,62 +198,29 @@ class StoryGenerationService:
         except Exception:
             return []
     
-    def _generate_story_structure(self, prompt: str, preferences: Dict[str, Any]) -> Dict[str, Any]:
-        """Generate high-level story structure and metadata"""
-        try:
-            target_total = preferences.get('target_total_duration_seconds')
-            max_scene = int(preferences.get('max_scene_duration_seconds', 8) or 8)
-            duration_instructions = ""
-            if target_total:
-                duration_instructions = f"""
+    def _story_structure_request(self, prompt: str, preferences: Dict[str, Any]):
+        """Build (contents, config) for the story structure call"""
+        from google.genai import types
+        from services.story_schemas import StoryStructure
+        target_total = preferences.get('target_total_duration_seconds')
+        max_scene = int(preferences.get('max_scene_duration_seconds', 8) or 8)
+        duration_instructions = ""
+        if target_total:
+            duration_instructions = f"""
 
 ADDITIONAL CONSTRAINTS:
 - The total estimated_duration MUST be {int(target_total)} seconds
 - Create enough scenes to approximately fill {int(target_total)} seconds with each scene ≤ {max_scene} seconds
 - Prefer consistent scene durations between 6 and {max_scene} seconds; never exceed {max_scene}
 """
-            else:
-                duration_instructions = f"""
+        else:
+            duration_instructions = f"""
 
 ADDITIONAL CONSTRAINTS:
 - Each scene duration MUST be ≤ {max_scene} seconds
 """
 
-            # Escape braces in static JSON template to avoid f-string formatting errors
-            response_format_json = (
-                """
-{
-  "title": "Engaging story title",
-  "premise": "One-sentence story premise",
-  "genre": "Primary genre (adventure, comedy, drama, fantasy, sci-fi, thriller, etc.)",
-  "tone": "Emotional tone (cinematic, playful, dramatic, mysterious, etc.)",
-  "setting": "Primary setting/location",
-  "time_period": "When story takes place",
-  "estimated_duration": 180, // total seconds for all scenes
-  "target_audience": "Target demographic",
-  "visual_style": "Visual/cinematic style description",
-  "story_arc": ["Setup", "Inciting incident", "Rising action", "Climax", "Resolution"],
-  "themes": ["theme1", "theme2"],
-  "key_entities": ["list of canonical entities extracted from the user prompt, e.g., 'man', 'dog'"] ,
-  "scene_structure": [
-    {
-      "sequence": 1,
-      "title": "Scene title",
-      "purpose": "Story function (setup/conflict/resolution)",
-      "location": "Specific location",
-      "time_of_day": "lighting condition",
-      "estimated_duration": 30,
-      "key_actions": ["action1", "action2"],
-      "mood": "emotional mood"
-    }
-  ]
-}
-                """
-                .replace('{', '{{')
-                .replace('}', '}}')
-            )
-
-            system_prompt = f"""You are an expert story architect and screenwriter. Based on the user's prompt, create a comprehensive story structure.
+        system_prompt = f"""You are an expert story architect and screenwriter. Based on the user's prompt, create a comprehensive story structure.
 
 CRITICAL REQUIREMENTS:
 - Analyze the prompt to infer the best story length, genre, tone, and visual style
@@ -221,43 +232,64 @@ CRITICAL REQUIREMENTS:
 
 IMPORTANT: Faithfully reflect the user's prompt. Identify and preserve the core entities (people, animals, objects, places) mentioned by the user and carry them through the story. Do not replace or rename them unless the prompt explicitly allows it.
 
-RESPONSE FORMAT (JSON):
-{response_format_json}
+Respond with the story structure as JSON (story_arc: Setup, Inciting incident, Rising action, Climax, Resolution; scene purpose: setup/conflict/resolution).
 
 ORIGINAL USER PROMPT:
 """
-            
-            response = self.cloud_service.genai_client.models.generate_content(
-                model=Config.GEMINI_MODEL,
-                contents=[prompt],
-                config=types.GenerateContentConfig(
-                    temperature=0.8,
-                    max_output_tokens=2000,
-                    thinking_config=types.ThinkingConfig(
-                        thinking_budget=Config.GEMINI_THINKING_BUDGET
-                    ),
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json"
-                ),
-            )
-            
-            # With response_mime_type set to application/json, prefer .text and parse directly
-            response_text = getattr(response, 'text', '') or ''
-            try:
-                story_structure = json.loads(response_text)
-                return story_structure
-            except Exception:
-                # Try strict JSON extraction, otherwise fail hard (no fallbacks)
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if json_match:
-                    parsed = json.loads(json_match.group(0))
-                    return parsed
-                raise ValueError("Model did not return valid JSON story structure")
-            
+
+        config = types.GenerateContentConfig(
+            temperature=0.8,
+            max_output_tokens=2000,
+            thinking_config=types.ThinkingConfig(
+                thinking_budget=Config.GEMINI_THINKING_BUDGET
+            ),
+            system_instruction=system_prompt,
+            response_mime_type="application/json",
+            response_schema=StoryStructure
+        )
+        return [prompt], config
+
+    def _parse_story_structure(self, response) -> Dict[str, Any]:
+        """Validated story structure from a structured-output response"""
+        from services.story_schemas import StoryStructure
+        story_structure = parse_response(response, StoryStructure)
+        if not story_structure.scene_structure:
+            raise ValueError("Model returned a story structure without scenes")
+        return story_structure.model_dump()
+
+    @instrument('story.structure')
+    def _generate_story_structure(self, prompt: str, preferences: Dict[str, Any]) -> Dict[str, Any]:
+        """Generate high-level story structure and metadata"""
+        try:
+            contents, config = self._story_structure_request(prompt, preferences)
+            response = self.cloud_service.generate_content(Config.GEMINI_MODEL, contents, config)
+            return self._parse_story_structure(response)
+        except Exception as e:
+            self.logger.error(f"Error generating story structure: {str(e)}")
+            raise
+
+    @instrument('story.structure')
+    async def _agenerate_story_structure(self, prompt: str, preferences: Dict[str, Any]) -> Dict[str, Any]:
+        """Async variant of _generate_story_structure"""
+        try:
+            contents, config = self._story_structure_request(prompt, preferences)
+            response = await self.cloud_service.agenerate_content(Config.GEMINI_MODEL, contents, config)
+            return self._parse_story_structure(response)
         except Exception as e:
             self.logger.error(f"Error generating story structure: {str(e)}")
             raise
     
+    def _clamp_scene_duration(self, detailed_scene: Dict[str, Any], max_scene_seconds: int) -> Dict[str, Any]:
+        """Clamp duration_seconds to max_scene_seconds if present"""
+        try:
+            if isinstance(detailed_scene.get('duration_seconds'), (int, float)):
+                detailed_scene['duration_seconds'] = int(min(max_scene_seconds, max(1, detailed_scene['duration_seconds'])))
+            else:
+                detailed_scene['duration_seconds'] = max_scene_seconds
+        except Exception:
+            detailed_scene['duration_seconds'] = max_scene_seconds
+        return detailed_scene
+
     def _generate_detailed_scenes(self, story_structure: Dict[str, Any], original_prompt: str, max_scene_seconds: int = 8) -> List[Dict[str, Any]]:
         """Generate detailed scene descriptions for video generation, clamping duration per scene"""
         try:
@@ -266,37 +298,66 @@ ORIGINAL USER PROMPT:
             
             for scene_info in scene_structure:
                 detailed_scene = self._generate_scene_details(scene_info, story_structure, original_prompt)
-                # Clamp duration_seconds to max_scene_seconds if present
-                try:
-                    if isinstance(detailed_scene.get('duration_seconds'), (int, float)):
-                        detailed_scene['duration_seconds'] = int(min(max_scene_seconds, max(1, detailed_scene['duration_seconds'])))
-                    else:
-                        detailed_scene['duration_seconds'] = max_scene_seconds
-                except Exception:
-                    detailed_scene['duration_seconds'] = max_scene_seconds
-                scenes.append(detailed_scene)
+                scenes.append(self._clamp_scene_duration(detailed_scene, max_scene_seconds))
             
             return scenes
             
         except Exception as e:
             self.logger.error(f"Error generating detailed scenes: {str(e)}")
             raise
-    
-    def _generate_scene_details(self, scene_info: Dict[str, Any], story_context: Dict[str, Any], original_prompt: str) -> Dict[str, Any]:
-        """Generate comprehensive details for a single scene"""
+
+    async def _agenerate_detailed_scenes(self, story_structure: Dict[str, Any], original_prompt: str, max_scene_seconds: int = 8) -> List[Dict[str, Any]]:
+        """Async variant of _generate_detailed_scenes; scenes are requested concurrently, order preserved"""
         try:
-            system_prompt = f"""You are an expert cinematographer and video generation specialist. Create a detailed scene description for video generation.
+            limit = asyncio.Semaphore(max(1, Config.GEMINI_SCENE_CONCURRENCY))
+
+            async def detail(scene_info):
+                async with limit:
+                    detailed_scene = await self._agenerate_scene_details(scene_info, story_structure, original_prompt)
+                return self._clamp_scene_duration(detailed_scene, max_scene_seconds)
+
+            return list(await asyncio.gather(*(detail(info) for info in story_structure.get('scene_structure', []))))
 
-STORY CONTEXT:
-Title: {story_context.get('title')}
-Genre: {story_context.get('genre')}
-Tone: {story_context.get('tone')}
-Visual Style: {story_context.get('visual_style')}
-Setting: {story_context.get('setting')}
- Key Entities (from user prompt, must be visible and consistent): {story_context.get('key_entities')}
+        except Exception as e:
+            self.logger.error(f"Error generating detailed scenes: {str(e)}")
+            raise
+    
+    def _scene_details_request(self, scene_info: Dict[str, Any], story_context: Dict[str, Any],
+                               neighbours: List[tuple] = None):
+        """Build (contents, config) for a single scene details call.
 
-SCENE INFO:
-{scene_info}
+        The system prompt carries only story-level context (including the outline of every
+        scene and the character profiles, when `story_context` has them), so it is the same
+        for every scene of a story and can be served from the context cache; the scene to
+        detail and any neighbouring scenes go in the contents. The two parts are budgeted
+        separately so the shared part does not shrink with the scene's own text.
+        """
+        from google.genai import types
+        from services.story_schemas import SceneDetails
+        tracing.set_attribute('scene', scene_info.get('sequence'))
+        outline = '\n'.join(compact_fields(scene, SCENE_FIELDS).replace('\n', '; ')
+                            for scene in story_context.get('scene_structure') or [])
+        characters = '\n'.join(compact_fields(character, CHARACTER_FIELDS).replace('\n', '; ')
+                               for character in story_context.get('characters') or [])
+        shared = (ContextBuilder('scene_shared')
+                  .add('story', 'STORY CONTEXT', compact_fields(story_context, STORY_FIELDS['scene']), priority=2,
+                       raw={field: story_context.get(field) for field in STORY_FIELDS['scene'] + ('key_entities',)})
+                  .add('characters', 'CHARACTERS (keep their appearance exactly as described)', characters, priority=1)
+                  .add('outline', 'STORY OUTLINE (every scene, for continuity)', outline, priority=0)
+                  .build())
+        neighbour_text = '\n'.join(
+            f"{position}: {compact_fields(scene, NEIGHBOUR_FIELDS).replace(chr(10), '; ')}"
+            for position, scene in neighbours or [])
+        sections = (ContextBuilder('scene')
+                    .add('scene', 'SCENE OUTLINE', compact_fields(scene_info, SCENE_FIELDS), priority=3,
+                         raw=json.dumps(scene_info))
+                    .add('neighbours', 'NEIGHBOURING SCENES (keep characters, props and look continuous with '
+                         'these; do not repeat them)', neighbour_text, priority=1)
+                    .build())
+        story_text = '\n\n'.join(part for part in (shared['story'], shared['characters'], shared['outline']) if part)
+        system_prompt = f"""You are an expert cinematographer and video generation specialist. Create a detailed scene description for video generation.
+
+{story_text}
 
 CRITICAL REQUIREMENTS:
 - Generate extremely detailed visual descriptions for Veo video generation
@@ -306,83 +367,107 @@ CRITICAL REQUIREMENTS:
 - Specify any props, costumes, or special visual elements
 - Ensure continuity with the overall story style
 - Make all technical decisions intelligently (duration, aspect ratio, etc.)
- - Maintain fidelity to the user's prompt by explicitly depicting key_entities: {story_context.get('key_entities')}. Do not replace or rename these entities. Ensure they are visibly present unless logically absent.
-
-RESPONSE FORMAT (JSON):
-{{
-  "id": "unique_scene_id",
-  "sequence": {scene_info.get('sequence', 1)},
-  "title": "{scene_info.get('title', 'Scene')}",
-  "location": "Detailed location description",
-  "time_of_day": "lighting condition with specific details",
-  "duration_seconds": min(8, int({story_context.get('estimated_duration', 180)} / max(1, len({story_context.get('scene_structure', [])}) or 1))),
-  "aspect_ratio": "16:9",
-  "camera_work": {{
-    "primary_shot": "wide shot/close-up/medium shot/etc",
-    "camera_movement": "static/pan/tilt/tracking/etc",
-    "angle": "eye level/low angle/high angle/etc"
-  }},
-  "lighting": {{
-    "type": "natural/artificial/mixed",
-    "mood": "bright/moody/dramatic/etc", 
-    "direction": "front/back/side/overhead/etc"
-  }},
-  "visual_description": "Comprehensive scene description for video generation",
-  "veo_prompt": "Optimized prompt specifically for Veo video generation",
-  "character_details": [
-    {{
-      "name": "character name",
-      "description": "detailed visual description",
-      "actions": ["specific actions in this scene"],
-      "emotions": "emotional state and expressions"
-    }}
-  ],
-  "props_and_elements": ["list of important visual elements"],
-  "mood_tags": ["atmospheric", "dramatic", "etc"],
-  "continuity_notes": "Notes for maintaining visual consistency",
-  "technical_notes": "Any specific technical requirements"
-}}
-
-SCENE TO DETAIL:"""
-
-            response = self.cloud_service.genai_client.models.generate_content(
-                model=Config.GEMINI_MODEL,
-                contents=[json.dumps(scene_info)],
-                config=types.GenerateContentConfig(
-                    temperature=0.7,
-                    max_output_tokens=1500,
-                    thinking_config=types.ThinkingConfig(
-                        thinking_budget=Config.GEMINI_THINKING_BUDGET
-                    ),
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json"
-                ),
-            )
-            
-            response_text = getattr(response, 'text', '') or ''
-            try:
-                detailed_scene = json.loads(response_text)
-                detailed_scene['id'] = str(uuid.uuid4())
-                return detailed_scene
-            except Exception:
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if json_match:
-                    detailed_scene = json.loads(json_match.group(0))
-                    detailed_scene['id'] = str(uuid.uuid4())
-                    return detailed_scene
-                raise ValueError("Model did not return valid JSON for scene details")
-            
+- Maintain fidelity to the user's prompt by explicitly depicting the key entities above. Do not replace or rename these entities. Ensure they are visibly present unless logically absent.
+
+Respond with the scene as JSON. Keep the outline's sequence and title; duration_seconds is at most 8 and aspect_ratio is usually "16:9".
+
+The scene to detail follows."""
+
+        config = types.GenerateContentConfig(
+            temperature=0.7,
+            max_output_tokens=1500,
+            thinking_config=types.ThinkingConfig(
+                thinking_budget=Config.GEMINI_THINKING_BUDGET
+            ),
+            system_instruction=system_prompt,
+            response_mime_type="application/json",
+            response_schema=SceneDetails
+        )
+        return ['\n\n'.join(part for part in (sections['scene'], sections['neighbours']) if part)], config
+
+    def _parse_scene_details(self, response) -> Dict[str, Any]:
+        """Validated scene details with a fresh scene id"""
+        from services.story_schemas import SceneDetails
+        detailed_scene = parse_response(response, SceneDetails).model_dump(exclude_none=True)
+        detailed_scene['id'] = str(uuid.uuid4())
+        return detailed_scene
+
+    def _use_context_cache(self, config, name: Optional[str]):
+        if name:
+            config.system_instruction, config.cached_content = None, name
+
+    def _inline_context(self, config, instruction: str, name: str):
+        self.logger.warning(f"Context cache {name} is gone; retrying with the instruction inline")
+        self.context_cache.invalidate(Config.GEMINI_MODEL, instruction)
+        config.system_instruction, config.cached_content = instruction, None
+
+    def _generate_with_context_cache(self, contents: List[Any], config):
+        """generate_content with the shared system instruction served from the context cache"""
+        instruction = config.system_instruction
+        name = self.context_cache.get(Config.GEMINI_MODEL, instruction, 'story-scene-context')
+        self._use_context_cache(config, name)
+        try:
+            return self.cloud_service.generate_content(Config.GEMINI_MODEL, contents, config)
+        except Exception as e:
+            if not name or not is_missing_cache_error(e):
+                raise
+            self._inline_context(config, instruction, name)
+            return self.cloud_service.generate_content(Config.GEMINI_MODEL, contents, config)
+
+    async def _agenerate_with_context_cache(self, contents: List[Any], config):
+        """Async variant of _generate_with_context_cache"""
+        instruction = config.system_instruction
+        name = await self.context_cache.aget(Config.GEMINI_MODEL, instruction, 'story-scene-context')
+        self._use_context_cache(config, name)
+        try:
+            return await self.cloud_service.agenerate_content(Config.GEMINI_MODEL, contents, config)
+        except Exception as e:
+            if not name or not is_missing_cache_error(e):
+                raise
+            self._inline_context(config, instruction, name)
+            return await self.cloud_service.agenerate_content(Config.GEMINI_MODEL, contents, config)
+
+    @instrument('story.scene_details')
+    def _generate_scene_details(self, scene_info: Dict[str, Any], story_context: Dict[str, Any], original_prompt: str,
+                                neighbours: List[tuple] = None) -> Dict[str, Any]:
+        """Generate comprehensive details for a single scene"""
+        try:
+            contents, config = self._scene_details_request(scene_info, story_context, neighbours)
+            response = self._generate_with_context_cache(contents, config)
+            return self._parse_scene_details(response)
         except Exception as e:
             self.logger.error(f"Error generating scene details: {str(e)}")
             raise
-    
-    def _generate_character_profiles(self, story_structure: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """Generate detailed character profiles"""
+
+    @instrument('story.scene_details')
+    async def _agenerate_scene_details(self, scene_info: Dict[str, Any], story_context: Dict[str, Any], original_prompt: str,
+                                       neighbours: List[tuple] = None) -> Dict[str, Any]:
+        """Async variant of _generate_scene_details"""
         try:
-            system_prompt = f"""You are a character development specialist. Create detailed character profiles for this story.
+            contents, config = self._scene_details_request(scene_info, story_context, neighbours)
+            response = await self._agenerate_with_context_cache(contents, config)
+            return self._parse_scene_details(response)
+        except Exception as e:
+            self.logger.error(f"Error generating scene details: {str(e)}")
+            raise
+    
+    def _character_profiles_request(self, story_structure: Dict[str, Any]):
+        """Build (contents, config) for the character profiles call"""
+        from google.genai import types
+        from services.story_schemas import CharacterProfiles
+        scenes = story_structure.get('scene_structure') or story_structure.get('scenes') or []
+        # The prompt used to embed str(story_structure), scenes included; split it between the two sections
+        story_raw = {key: value for key, value in story_structure.items() if key not in ('scene_structure', 'scenes')}
+        sections = (ContextBuilder('characters')
+                    .add('story', 'STORY CONTEXT', compact_fields(story_structure, STORY_FIELDS['characters']),
+                         priority=2, raw=str(story_raw))
+                    .add('scenes', 'SCENES', scene_outlines(scenes), priority=1, raw=str(scenes))
+                    .build())
+        system_prompt = f"""You are a character development specialist. Create detailed character profiles for this story.
 
-STORY CONTEXT:
-{story_structure}
+{sections['story']}
+
+{sections['scenes']}
 
 REQUIREMENTS:
 - Create 1-4 main characters based on the story
@@ -390,60 +475,98 @@ REQUIREMENTS:
 - Include personality traits, motivations, and speaking style
 - Ensure characters fit the story's genre, tone, and setting
 - Make all character details specific and actionable for video generation
- - If key_entities includes animals or named persons (e.g., man and dog), include matching profiles or ensure they are present within scenes. Key entities to include: {story_structure.get('key_entities')}
-
-RESPONSE FORMAT (JSON):
-{{
-  "characters": [
-    {{
-      "name": "Character Name",
-      "role": "protagonist/antagonist/supporting",
-      "age_range": "approximate age",
-      "physical_description": "Detailed visual description for video generation",
-      "clothing_style": "Typical clothing and accessories",
-      "personality_traits": ["trait1", "trait2", "trait3"],
-      "motivations": "Primary character motivation",
-      "speaking_style": "How they speak and express themselves",
-      "key_relationships": "Relationships with other characters",
-      "character_arc": "How they change throughout the story",
-      "visual_references": "Any specific visual styling notes"
-    }}
-  ]
-}}
+- If the key entities include animals or named persons (e.g., man and dog), include matching profiles or ensure they are present within scenes
+
+Respond with the characters as JSON; role is protagonist, antagonist or supporting.
 
 Generate characters for this story:"""
 
-            response = self.cloud_service.genai_client.models.generate_content(
-                model=Config.GEMINI_MODEL,
-                contents=["Generate character profiles based on the system instruction"],
-                config=types.GenerateContentConfig(
-                    temperature=0.7,
-                    max_output_tokens=1200,
-                    thinking_config=types.ThinkingConfig(
-                        thinking_budget=Config.GEMINI_THINKING_BUDGET
-                    ),
-                    system_instruction=system_prompt,
-                    response_mime_type="application/json"
-                ),
-            )
-            
-            response_text = getattr(response, 'text', '') or ''
-            try:
-                character_data = json.loads(response_text)
-                characters = character_data.get('characters', [])
-                for character in characters:
-                    character['id'] = str(uuid.uuid4())
-                return characters
-            except Exception:
-                json_match = re.search(r'\{.*\}', response_text, re.DOTALL)
-                if json_match:
-                    character_data = json.loads(json_match.group(0))
-                    characters = character_data.get('characters', [])
-                    for character in characters:
-                        character['id'] = str(uuid.uuid4())
-                    return characters
-                raise ValueError("Model did not return valid JSON for character profiles")
-            
+        config = types.GenerateContentConfig(
+            temperature=0.7,
+            max_output_tokens=1200,
+            thinking_config=types.ThinkingConfig(
+                thinking_budget=Config.GEMINI_THINKING_BUDGET
+            ),
+            system_instruction=system_prompt,
+            response_mime_type="application/json",
+            response_schema=CharacterProfiles
+        )
+        return ["Generate character profiles based on the system instruction"], config
+
+    def _character_profile_request(self, story_data: Dict[str, Any], character: Dict[str, Any]):
+        """Build (contents, config) for regenerating one character, keeping the others as context"""
+        from google.genai import types
+        from services.story_schemas import CharacterProfiles
+        others = [other for other in story_data.get('characters') or [] if other.get('id') != character.get('id')]
+        sections = (ContextBuilder('character')
+                    .add('story', 'STORY CONTEXT', compact_fields(story_data, STORY_FIELDS['character']), priority=2)
+                    .add('others', 'OTHER CHARACTERS (unchanged; keep relationships consistent)',
+                         '\n'.join(compact_fields(other, ('name', 'role')).replace('\n', ', ') for other in others),
+                         priority=1)
+                    .add('character', 'CHARACTER TO REWRITE',
+                         compact_fields(character, [key for key in character if key != 'id']), priority=3,
+                         raw=json.dumps(character))
+                    .build())
+        system_prompt = f"""You are a character development specialist. Rewrite ONE character profile for this story.
+
+{sections['story']}
+
+{sections['others']}
+
+REQUIREMENTS:
+- Keep the character's name and role unless they contradict the story
+- Provide a detailed physical description for visual consistency
+- Make all details specific and actionable for video generation
+
+Respond with {{"characters": [exactly one profile]}}.
+
+The character to rewrite follows."""
+
+        config = types.GenerateContentConfig(
+            temperature=0.7,
+            max_output_tokens=600,
+            thinking_config=types.ThinkingConfig(
+                thinking_budget=Config.GEMINI_THINKING_BUDGET
+            ),
+            system_instruction=system_prompt,
+            response_mime_type="application/json",
+            response_schema=CharacterProfiles
+        )
+        return [sections['character']], config
+
+    def _parse_character_profiles(self, response) -> List[Dict[str, Any]]:
+        """Validated character profiles with fresh character ids"""
+        from services.story_schemas import CharacterProfiles
+        characters = [character.model_dump(exclude_none=True)
+                      for character in parse_response(response, CharacterProfiles).characters]
+        for character in characters:
+            character['id'] = str(uuid.uuid4())
+        return characters
+
+    def _parse_single_character(self, response) -> Dict[str, Any]:
+        characters = self._parse_character_profiles(response)
+        if not characters:
+            raise ValueError("Model returned no character profile")
+        return characters[0]
+
+    @instrument('story.characters')
+    def _generate_character_profiles(self, story_structure: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Generate detailed character profiles"""
+        try:
+            contents, config = self._character_profiles_request(story_structure)
+            response = self.cloud_service.generate_content(Config.GEMINI_MODEL, contents, config)
+            return self._parse_character_profiles(response)
+        except Exception as e:
+            self.logger.error(f"Error generating character profiles: {str(e)}")
+            raise
+
+    @instrument('story.characters')
+    async def _agenerate_character_profiles(self, story_structure: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Async variant of _generate_character_profiles"""
+        try:
+            contents, config = self._character_profiles_request(story_structure)
+            response = await self.cloud_service.agenerate_content(Config.GEMINI_MODEL, contents, config)
+            return self._parse_character_profiles(response)
         except Exception as e:
             self.logger.error(f"Error generating character profiles: {str(e)}")
             raise
@@ -460,45 +583,119 @@ Generate characters for this story:"""
         """Deprecated: no scene fallbacks allowed."""
         raise ValueError("Fallback scenes are disabled")
     
-    def update_story_element(self, story_data: Dict[str, Any], element_type: str, element_id: str, updates: Dict[str, Any]) -> Dict[str, Any]:
-        """Update a specific story element (scene, character, etc.)"""
+    def update_story_element(self, story_data: Dict[str, Any], element_type: str, element_id: str,
+                             updates: Dict[str, Any] = None, patch: List[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Return a copy of story_data with one element (scene, character or story) changed.
+
+        `updates` maps field paths ('title', 'camera_work.angle') to new values; `patch` is an
+        RFC 6902 JSON Patch whose paths are relative to the element. Raises LookupError if the
+        element does not exist and JsonPatchError if the patch does not apply.
+        """
         try:
-            if element_type == 'scene':
-                scenes = story_data.get('scenes', [])
-                for i, scene in enumerate(scenes):
-                    if scene.get('id') == element_id:
-                        scenes[i] = {**scene, **updates}
-                        break
-                story_data['scenes'] = scenes
-                
-            elif element_type == 'character':
-                characters = story_data.get('characters', [])
-                for i, character in enumerate(characters):
-                    if character.get('id') == element_id:
-                        characters[i] = {**character, **updates}
-                        break
-                story_data['characters'] = characters
-                
+            if element_type in ('scene', 'character'):
+                collection = 'scenes' if element_type == 'scene' else 'characters'
+                items = story_data.get(collection) or []
+                index = next((i for i, item in enumerate(items) if item.get('id') == element_id), None)
+                if index is None:
+                    raise LookupError(f"No {element_type} with id {element_id}")
+                prefix = to_pointer([collection, index])
             elif element_type == 'story':
-                # Update story metadata
+                prefix = ''
+                # Only story metadata may be changed through field updates
                 allowed_fields = ['title', 'premise', 'tone', 'genre', 'visual_style', 'setting']
-                for field in allowed_fields:
-                    if field in updates:
-                        story_data[field] = updates[field]
-            
+                updates = {field: value for field, value in (updates or {}).items()
+                           if str(field).split('.')[0] in allowed_fields}
+            else:
+                raise LookupError(f"Unknown element type: {element_type}")
+
+            if patch is not None and not isinstance(patch, list):
+                raise JsonPatchError("A JSON Patch must be a list of operations")
+            operations = updates_to_patch(updates or {}, prefix)
+            for operation in patch or []:
+                if not isinstance(operation, dict):
+                    raise JsonPatchError(f"Malformed operation: {operation!r}")
+                operation = dict(operation)
+                for key in ('path', 'from'):
+                    if isinstance(operation.get(key), str):
+                        operation[key] = prefix + operation[key]
+                operations.append(operation)
+            updated = apply_patch(story_data, operations)
+
             # Update timestamp
-            story_data['updated_at'] = datetime.utcnow().isoformat()
+            updated['updated_at'] = datetime.utcnow().isoformat()
             
-            self.logger.info(f"Updated {element_type} {element_id} in story")
-            return story_data
+            self.logger.info(f"Updated {element_type} {element_id} in story ({len(operations)} operations)")
+            return updated
             
+        except (LookupError, JsonPatchError):
+            raise
         except Exception as e:
             self.logger.error(f"Error updating story element: {str(e)}")
             raise
     
+    def _scene_regeneration(self, story_data: Dict[str, Any], scene_id: str):
+        """(scene_info, story_context, neighbours, index) for regenerating one scene"""
+        scenes = story_data.get('scenes') or []
+        index = next((i for i, scene in enumerate(scenes) if scene.get('id') == scene_id), None)
+        if index is None:
+            raise LookupError(f"No scene with id {scene_id}")
+        scene = scenes[index]
+        neighbours = ([('Previous', scenes[index - 1])] if index > 0 else []) + \
+                     ([('Next', scenes[index + 1])] if index + 1 < len(scenes) else [])
+        scene_info = {field: scene.get(field) for field in
+                      ('sequence', 'title', 'purpose', 'location', 'time_of_day', 'estimated_duration', 'key_actions', 'mood')
+                      if scene.get(field) is not None}
+        story_context = {field: story_data.get(field) for field in
+                         ('title', 'genre', 'tone', 'visual_style', 'setting', 'key_entities', 'estimated_duration')}
+        # Only fields a regeneration keeps, so regenerating one scene leaves the cached prefix valid
+        story_context['scene_structure'] = [{field: other.get(field) for field in ('sequence', 'title', 'location')}
+                                            for other in scenes]
+        story_context['characters'] = story_data.get('characters') or []
+        return scene_info, story_context, neighbours, index
+
+    def _replace_element(self, story_data: Dict[str, Any], collection: str, index: int, element: Dict[str, Any],
+                         keep: tuple) -> Dict[str, Any]:
+        """Put a regenerated element in place, keeping its identity fields"""
+        previous = story_data[collection][index]
+        for field in keep:
+            if previous.get(field) is not None:
+                element[field] = previous[field]
+        story_data[collection][index] = element
+        story_data['updated_at'] = datetime.utcnow().isoformat()
+        self.logger.info(f"Regenerated {collection[:-1]} {element.get('id')} only")
+        return story_data
+
+    def _character_index(self, story_data: Dict[str, Any], character_id: str) -> int:
+        index = next((i for i, character in enumerate(story_data.get('characters') or [])
+                      if character.get('id') == character_id), None)
+        if index is None:
+            raise LookupError(f"No character with id {character_id}")
+        return index
+
+    def _scene_duration_cap(self, scene: Dict[str, Any]) -> int:
+        return int(min(8, scene.get('duration_seconds') or 8))
+
+    @instrument('story.regenerate')
     def regenerate_story_element(self, story_data: Dict[str, Any], element_type: str, element_id: str = None) -> Dict[str, Any]:
-        """Regenerate a specific story element or entire story"""
+        """Regenerate a specific story element or entire story.
+
+        With an element_id, 'scene'/'character' regenerate just that element (a scene with its
+        neighbours as context); everything else in story_data is left as it is.
+        """
         try:
+            single = single_element_type(element_type, element_id)
+            if single == 'scene':
+                scene_info, story_context, neighbours, index = self._scene_regeneration(story_data, element_id)
+                scene = self._generate_scene_details(scene_info, story_context, story_data.get('original_prompt', ''), neighbours)
+                scene = self._clamp_scene_duration(scene, self._scene_duration_cap(story_data['scenes'][index]))
+                return self._replace_element(story_data, 'scenes', index, scene, ('id', 'sequence'))
+            if single == 'character':
+                index = self._character_index(story_data, element_id)
+                contents, config = self._character_profile_request(story_data, story_data['characters'][index])
+                response = self.cloud_service.generate_content(Config.GEMINI_MODEL, contents, config)
+                character = self._parse_single_character(response)
+                return self._replace_element(story_data, 'characters', index, character, ('id',))
+
             if element_type == 'full_story':
                 # Regenerate entire story from original prompt
                 return self.generate_story_from_prompt(story_data.get('original_prompt', ''))
@@ -511,7 +708,8 @@ Generate characters for this story:"""
                     'tone': story_data.get('tone'),
                     'visual_style': story_data.get('visual_style'),
                     'setting': story_data.get('setting'),
-                    'scene_structure': [scene for scene in story_data.get('scenes', [])]
+                    'scene_structure': [scene for scene in story_data.get('scenes', [])],
+                    'characters': story_data.get('characters') or [],
                 }
                 new_scenes = self._generate_detailed_scenes(story_structure, story_data.get('original_prompt', ''))
                 story_data['scenes'] = new_scenes
@@ -528,6 +726,56 @@ Generate characters for this story:"""
             self.logger.info(f"Regenerated {element_type} for story")
             return story_data
             
+        except LookupError:
+            raise
         except Exception as e:
             self.logger.error(f"Error regenerating story element: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    @instrument('story.regenerate')
+    async def aregenerate_story_element(self, story_data: Dict[str, Any], element_type: str, element_id: str = None) -> Dict[str, Any]:
+        """Async variant of regenerate_story_element; regenerated scenes are requested concurrently"""
+        try:
+            single = single_element_type(element_type, element_id)
+            if single == 'scene':
+                scene_info, story_context, neighbours, index = self._scene_regeneration(story_data, element_id)
+                scene = await self._agenerate_scene_details(scene_info, story_context, story_data.get('original_prompt', ''), neighbours)
+                scene = self._clamp_scene_duration(scene, self._scene_duration_cap(story_data['scenes'][index]))
+                return self._replace_element(story_data, 'scenes', index, scene, ('id', 'sequence'))
+            if single == 'character':
+                index = self._character_index(story_data, element_id)
+                contents, config = self._character_profile_request(story_data, story_data['characters'][index])
+                response = await self.cloud_service.agenerate_content(Config.GEMINI_MODEL, contents, config)
+                character = self._parse_single_character(response)
+                return self._replace_element(story_data, 'characters', index, character, ('id',))
+
+            if element_type == 'full_story':
+                return await self.agenerate_story_from_prompt(story_data.get('original_prompt', ''))
+
+            elif element_type == 'scenes':
+                story_structure = {
+                    'title': story_data.get('title'),
+                    'genre': story_data.get('genre'),
+                    'tone': story_data.get('tone'),
+                    'visual_style': story_data.get('visual_style'),
+                    'setting': story_data.get('setting'),
+                    'scene_structure': [scene for scene in story_data.get('scenes', [])],
+                    'characters': story_data.get('characters') or [],
+                }
+                new_scenes = await self._agenerate_detailed_scenes(story_structure, story_data.get('original_prompt', ''))
+                story_data['scenes'] = new_scenes
+                story_data['scene_count'] = len(new_scenes)
+
+            elif element_type == 'characters':
+                story_data['characters'] = await self._agenerate_character_profiles(story_data)
+
+            story_data['updated_at'] = datetime.utcnow().isoformat()
+
+            self.logger.info(f"Regenerated {element_type} for story")
+            return story_data
+
+        except LookupError:
+            raise
+        except Exception as e:
+            self.logger.error(f"Error regenerating story element: {str(e)}")
+            raise
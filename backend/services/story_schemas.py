@@ -0,0 +1,114 @@
+"""
+Typed response schemas for the Gemini story generation calls
+
+Passed as `response_schema`, so the model is constrained to these shapes instead of a JSON
+template in the prompt, and the same classes validate what comes back (see
+utils/structured_output.py). Required fields are the ones a result is useless without; a
+list item missing one (e.g. cut off by max_output_tokens) is dropped during repair.
+
+Imported lazily: building pydantic models costs ~100ms of cold start.
+"""
+
+from typing import Annotated, List, Optional
+
+from pydantic import BaseModel, BeforeValidator, ConfigDict, Field
+
+
+def _whole_seconds(value):
+    # Models sometimes answer 7.5 or "8"; durations are whole seconds everywhere else
+    if isinstance(value, str):
+        value = value.strip().rstrip('s').strip()
+    try:
+        return int(round(float(value)))
+    except (TypeError, ValueError):
+        return value
+
+
+Seconds = Annotated[int, BeforeValidator(_whole_seconds)]
+
+
+class _Schema(BaseModel):
+    model_config = ConfigDict(extra='ignore')
+
+
+class SceneOutline(_Schema):
+    sequence: int
+    title: str
+    purpose: Optional[str] = None
+    location: Optional[str] = None
+    time_of_day: Optional[str] = None
+    estimated_duration: Optional[Seconds] = None
+    key_actions: List[str] = Field(default_factory=list)
+    mood: Optional[str] = None
+
+
+class StoryStructure(_Schema):
+    title: str
+    premise: Optional[str] = None
+    genre: Optional[str] = None
+    tone: Optional[str] = None
+    setting: Optional[str] = None
+    time_period: Optional[str] = None
+    estimated_duration: Optional[Seconds] = Field(default=None, description="total seconds for all scenes")
+    target_audience: Optional[str] = None
+    visual_style: Optional[str] = None
+    story_arc: List[str] = Field(default_factory=list)
+    themes: List[str] = Field(default_factory=list)
+    key_entities: List[str] = Field(default_factory=list,
+                                    description="canonical entities from the user prompt, e.g. 'man', 'dog'")
+    scene_structure: List[SceneOutline] = Field(default_factory=list)
+
+
+class CameraWork(_Schema):
+    primary_shot: Optional[str] = None
+    camera_movement: Optional[str] = None
+    angle: Optional[str] = None
+
+
+class Lighting(_Schema):
+    type: Optional[str] = None
+    mood: Optional[str] = None
+    direction: Optional[str] = None
+
+
+class SceneCharacter(_Schema):
+    name: str
+    description: Optional[str] = None
+    actions: List[str] = Field(default_factory=list)
+    emotions: Optional[str] = None
+
+
+class SceneDetails(_Schema):
+    sequence: Optional[int] = None
+    title: Optional[str] = None
+    location: Optional[str] = None
+    time_of_day: Optional[str] = None
+    duration_seconds: Optional[Seconds] = None
+    aspect_ratio: Optional[str] = None
+    camera_work: Optional[CameraWork] = None
+    lighting: Optional[Lighting] = None
+    visual_description: str
+    veo_prompt: str = Field(description="prompt optimized for Veo video generation")
+    character_details: List[SceneCharacter] = Field(default_factory=list)
+    props_and_elements: List[str] = Field(default_factory=list)
+    mood_tags: List[str] = Field(default_factory=list)
+    continuity_notes: Optional[str] = None
+    technical_notes: Optional[str] = None
+
+
+class CharacterProfile(_Schema):
+    name: str
+    role: Optional[str] = None
+    age_range: Optional[str] = None
+    physical_description: Optional[str] = None
+    clothing_style: Optional[str] = None
+    personality_traits: List[str] = Field(default_factory=list)
+    motivations: Optional[str] = None
+    speaking_style: Optional[str] = None
+    key_relationships: Optional[str] = None
+    character_arc: Optional[str] = None
+    visual_references: Optional[str] = None
+
+
+class CharacterProfiles(_Schema):
+    characters: List[CharacterProfile] = Field(default_factory=list)
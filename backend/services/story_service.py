@@ -2,19 +2,35 @@
 Story management service
 """
 
+import re
 import uuid
 import logging
-from typing import Dict, List, Optional, Any
+from typing import Callable, Dict, List, Optional, Any
 from datetime import datetime
 
 from config.settings import Config
 from services.cloud_service import CloudService
+from services.storyboard_store import StoryboardStore, is_split
+from utils.json_patch import changed_keys
+
+# Top-level storyboard keys that can be written as 'generation_data.<key>' field paths
+_FIELD_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class VersionConflict(Exception):
+    """Raised when generation data changed after the client read it"""
+
+    def __init__(self, message: str, current_version: Optional[int] = None):
+        super().__init__(message)
+        self.current_version = current_version
+
 
 class StoryService:
     """Service for managing video stories and their metadata"""
     
     def __init__(self, cloud_service: CloudService):
         self.cloud_service = cloud_service
+        self.storyboards = StoryboardStore(cloud_service)
         self.logger = logging.getLogger(__name__)
     
     def create_story(self, title: str, description: str = "", user_id: str = "anonymous") -> Dict[str, Any]:
@@ -30,6 +46,7 @@ class StoryService:
                 'user_id': user_id,
                 'status': 'created',
                 'segment_count': 0,
+                'segment_sequence': 0,  # last allocated segment sequence_number (VideoService)
                 'created_at': datetime.utcnow().isoformat(),
                 'updated_at': datetime.utcnow().isoformat(),
                 'final_video_url': None,
@@ -65,6 +82,9 @@ class StoryService:
             # Add segments to story
             story['segments'] = segments
             story['segment_count'] = len(segments)
+
+            if is_split(story.get('generation_data')):
+                story['generation_data'], _ = self.storyboards.load(story_id, story['generation_data'])
             
             self.logger.info(f"Retrieved story {story_id} with {len(segments)} segments")
             return story
@@ -154,6 +174,8 @@ class StoryService:
                 filters=[('story_id', '==', story_id)]
             )
             
+            self.storyboards.delete_all(story_id)
+
             # Delete all segments
             for segment in segments:
                 # Delete GCS artifacts for segment
@@ -253,3 +275,69 @@ class StoryService:
         except Exception as e:
             self.logger.error(f"Error updating segment status: {str(e)}")
             raise
+
+    def get_generation_data(self, story_id: str, only: Dict[str, List[str]] = None) -> Optional[Dict[str, Any]]:
+        """The story's assembled storyboard (None if the story has none); see StoryboardStore.load for `only`"""
+        try:
+            story = self.cloud_service.get_document(Config.STORIES_COLLECTION, story_id)
+            stored = story.get('generation_data') if story else None
+            if not isinstance(stored, dict) or not stored:
+                return None
+            storyboard, _ = self.storyboards.load(story_id, stored, only)
+            return storyboard
+
+        except Exception as e:
+            self.logger.error(f"Error getting generation data: {str(e)}")
+            raise
+
+    def update_generation_data(self, story_id: str, edit: Callable[[Dict[str, Any]], Dict[str, Any]],
+                               expected_version: Optional[int] = None, attempts: int = 3,
+                               only: Dict[str, List[str]] = None) -> Dict[str, Any]:
+        """Apply `edit(current generation_data) -> new generation_data` with optimistic concurrency.
+
+        The write is a compare-and-set on generation_data.version that rewrites only the story-level
+        fields and the scene/character documents that changed. With `only` ({'scenes': [id]}) the
+        edit sees just those elements, so editing one scene reads and writes one scene. With
+        `expected_version` a concurrent change raises VersionConflict; without it the edit is
+        re-applied to the fresh data and retried.
+        """
+        try:
+            for _ in range(attempts):
+                story = self.cloud_service.get_document(Config.STORIES_COLLECTION, story_id)
+                if not story:
+                    raise LookupError(f"Story {story_id} not found")
+                stored = story.get('generation_data')
+                if not isinstance(stored, dict):
+                    stored = None
+                version = (stored or {}).get('version')
+                if expected_version is not None and int(expected_version) != (version or 0):
+                    raise VersionConflict(f"Generation data is at version {version or 0}, not {expected_version}",
+                                          version or 0)
+
+                current, loaded = self.storyboards.load(story_id, stored or {}, only)
+                updated = dict(edit(current))
+                updated['version'] = (version or 0) + 1
+                head, updated, writes = self.storyboards.prepare_write(story_id, stored or {}, loaded, updated,
+                                                                       partial=only is not None)
+
+                changed, removed = changed_keys(stored or {}, head)
+                if removed or stored is None or not all(_FIELD_NAME.match(key) for key in changed):
+                    data = {'generation_data': head}
+                else:
+                    data = {f'generation_data.{key}': head[key] for key in changed}
+                data['updated_at'] = datetime.utcnow().isoformat()
+
+                if self.cloud_service.update_document_if(
+                        Config.STORIES_COLLECTION, story_id, 'generation_data.version', version, data, writes):
+                    self.logger.info(f"Story {story_id} generation data at version {updated['version']} "
+                                     f"({len(data) - 1} fields, {len(writes)} elements written)")
+                    return updated
+                if expected_version is not None:
+                    raise VersionConflict("Generation data changed during the update")
+            raise VersionConflict(f"Generation data kept changing; gave up after {attempts} attempts")
+
+        except (LookupError, ValueError, VersionConflict):
+            raise
+        except Exception as e:
+            self.logger.error(f"Error updating generation data: {str(e)}")
+            raise
@@ -0,0 +1,161 @@
+"""
+Storyboard storage: scenes and characters as documents under the story
+
+The story document keeps the light storyboard in `generation_data` (title, premise, version, ...)
+plus an ordered index per element kind:
+
+    stories/{story_id}                      generation_data.scene_index = [{id, sequence, title, ...}]
+    stories/{story_id}/scenes/{scene_id}    the full scene (visual_description, veo_prompt, ...)
+    stories/{story_id}/characters/{id}      the full character profile
+
+Callers still see the assembled storyboard (`scenes` and `characters` lists). Stories saved
+before this layout keep their inline lists until their next write moves them out.
+"""
+
+import uuid
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config.settings import Config
+from services.cloud_service import CloudService
+
+# element kind -> (index field on the story, fields copied into each index entry)
+ELEMENT_KINDS = {
+    'scenes': ('scene_index', ('id', 'sequence', 'title', 'duration_seconds')),
+    'characters': ('character_index', ('id', 'name', 'role')),
+}
+ELEMENT_TYPES = {'scene': 'scenes', 'character': 'characters'}
+
+
+def single_element_type(element_type: str, element_id: str = None) -> Optional[str]:
+    """'scene'/'character' when a request targets one element ('scenes' + an id counts too)"""
+    if not element_id:
+        return None
+    return {'scene': 'scene', 'scenes': 'scene', 'character': 'character', 'characters': 'character'}.get(element_type)
+
+
+def regeneration_scope(generation_data: Dict[str, Any], element_type: str, element_id: str = None,
+                       radius: int = 1) -> Optional[Dict[str, List[str]]]:
+    """Elements regenerating one element needs (see StoryboardStore.load): a scene with the
+    scenes `radius` either side of it, or the characters. None means the whole storyboard."""
+    single = single_element_type(element_type, element_id)
+    if not single or not is_split(generation_data):
+        return None
+    if single == 'character':
+        return {'characters': [entry['id'] for entry in generation_data.get('character_index') or []]}
+    ids = [entry.get('id') for entry in generation_data.get('scene_index') or []]
+    if element_id not in ids:
+        return {'scenes': [element_id]}
+    position = ids.index(element_id)
+    return {'scenes': ids[max(0, position - radius):position + radius + 1]}
+
+
+def is_split(generation_data: Dict[str, Any]) -> bool:
+    """True when the storyboard's elements live in subcollections"""
+    return isinstance(generation_data, dict) and 'scene_index' in generation_data
+
+
+def split_storyboard(storyboard: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, List[Dict[str, Any]]]]:
+    """Assembled storyboard -> (story-level fields with indexes, {kind: [elements]})"""
+    head = {key: value for key, value in storyboard.items() if key not in ELEMENT_KINDS}
+    elements = {}
+    for kind, (index_field, summary_fields) in ELEMENT_KINDS.items():
+        items = []
+        for item in storyboard.get(kind) or []:
+            item = dict(item)
+            if not item.get('id'):
+                item['id'] = str(uuid.uuid4())
+            items.append(item)
+        elements[kind] = items
+        head[index_field] = [{field: item.get(field) for field in summary_fields} for item in items]
+    return head, elements
+
+
+def assemble_storyboard(head: Dict[str, Any], elements: Dict[str, Dict[str, Dict[str, Any]]]) -> Dict[str, Any]:
+    """Story-level fields plus loaded elements (by id) -> storyboard with ordered lists"""
+    storyboard = {key: value for key, value in head.items()
+                  if key not in {index_field for index_field, _ in ELEMENT_KINDS.values()}}
+    for kind, (index_field, _) in ELEMENT_KINDS.items():
+        loaded = elements.get(kind) or {}
+        storyboard[kind] = [loaded[entry['id']] for entry in head.get(index_field) or [] if entry.get('id') in loaded]
+    return storyboard
+
+
+class StoryboardStore:
+    """Reads and writes storyboards in the subcollection layout"""
+
+    def __init__(self, cloud_service: CloudService):
+        self.cloud_service = cloud_service
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def collection(story_id: str, kind: str) -> str:
+        return f"{Config.STORIES_COLLECTION}/{story_id}/{kind}"
+
+    def load(self, story_id: str, generation_data: Dict[str, Any],
+             only: Optional[Dict[str, Iterable[str]]] = None) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+        """Assemble the story's storyboard from its stored `generation_data`.
+
+        With `only` ({'scenes': [scene_id]}) just those elements are fetched, one document each,
+        and the other kinds stay empty. Returns (storyboard, loaded elements by kind and id);
+        the latter is empty for stories still in the inline layout.
+        """
+        if not is_split(generation_data):
+            return dict(generation_data or {}), {}
+        loaded = {}
+        for kind in ELEMENT_KINDS:
+            if only is None:
+                documents = self.cloud_service.query_documents(self.collection(story_id, kind))
+            else:
+                documents = [self.cloud_service.get_document(self.collection(story_id, kind), element_id)
+                             for element_id in only.get(kind) or []]
+            loaded[kind] = {document['id']: document for document in documents if document}
+        return assemble_storyboard(generation_data, loaded), loaded
+
+    def get_element(self, story_id: str, generation_data: Dict[str, Any], element_type: str,
+                    element_id: str) -> Optional[Dict[str, Any]]:
+        """One scene or character without reading the rest of the storyboard"""
+        kind = ELEMENT_TYPES[element_type]
+        if not is_split(generation_data):
+            return next((item for item in generation_data.get(kind) or [] if item.get('id') == element_id), None)
+        return self.cloud_service.get_document(self.collection(story_id, kind), element_id)
+
+    def prepare_write(self, story_id: str, stored: Dict[str, Any], loaded: Dict[str, Dict[str, Any]],
+                      storyboard: Dict[str, Any], partial: bool = False) -> Tuple[Dict[str, Any], Dict[str, Any], List[tuple]]:
+        """The new story-level fields, the storyboard as stored and the element writes that turn
+        `loaded` into it.
+
+        Only elements that changed are written. With `partial` the storyboard holds just the
+        loaded elements: the index keeps everything else in place and new elements go last.
+        """
+        head, elements = split_storyboard(storyboard)
+        writes = []
+        for kind, (index_field, _) in ELEMENT_KINDS.items():
+            before = loaded.get(kind) or {}
+            after = {item['id']: item for item in elements[kind]}
+            for element_id, item in after.items():
+                if before.get(element_id) != item:
+                    writes.append((self.collection(story_id, kind), element_id, item))
+            for element_id in before:
+                if element_id not in after:
+                    writes.append((self.collection(story_id, kind), element_id, None))
+            if partial and is_split(stored):
+                entries = {entry['id']: entry for entry in head[index_field]}
+                index = [entries.get(entry.get('id'), entry) for entry in stored.get(index_field) or []
+                         if entry.get('id') not in before or entry.get('id') in after]
+                known = {entry.get('id') for entry in index}
+                head[index_field] = index + [entry for entry in head[index_field] if entry['id'] not in known]
+        if 'scene_count' in head:
+            head['scene_count'] = len(head['scene_index'])
+        stored_view = assemble_storyboard(head, {kind: {item['id']: item for item in items}
+                                                 for kind, items in elements.items()})
+        return head, stored_view, writes
+
+    def delete_all(self, story_id: str) -> int:
+        """Delete the story's scene and character documents"""
+        deleted = 0
+        for kind in ELEMENT_KINDS:
+            for document in self.cloud_service.query_documents(self.collection(story_id, kind)):
+                if self.cloud_service.delete_document(self.collection(story_id, kind), document['id']):
+                    deleted += 1
+        return deleted
@@ -6,33 +6,52 @@ import os
 import time
 import uuid
 import logging
-from typing import Dict, List, Optional, Any
+import mimetypes
+from typing import Dict, List, Optional, Any, TYPE_CHECKING
 from datetime import datetime
 import base64
+import shutil
 # Video processing imports - will be dynamically imported when needed
 # import cv2
 # from moviepy.editor import VideoFileClip, concatenate_videoclips  
 # from PIL import Image
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 
-from google.genai import types
 from config.settings import Config
 from services.cloud_service import CloudService
+from services.generation_queue import GenerationQueue
+from services.operation_eta import OperationDurations
+from utils.instrumentation import instrument
+from utils import metrics, stitching
+from utils.single_flight import SingleFlight
+
+if TYPE_CHECKING:
+    from google.genai import types
 
 class VideoService:
     """Service for video generation, processing, and management"""
     
-    def __init__(self, cloud_service: CloudService):
+    def __init__(self, cloud_service: CloudService, generation_queue: GenerationQueue = None):
         self.cloud_service = cloud_service
+        self.generation_queue = generation_queue or GenerationQueue(cloud_service)
         self.logger = logging.getLogger(__name__)
+        # Duplicate status checks / stitches from several tabs or client retries share one run
+        self.status_flight = SingleFlight('generation_status')
+        self.stitch_flight = SingleFlight('stitch')
+        self.durations = OperationDurations(cloud_service)
+        # GCS archival of starting images, overlapped with the request's Firestore writes
+        self._archiver = ThreadPoolExecutor(max_workers=2, thread_name_prefix='image-archive')
         
         # Ensure temp directory exists
         os.makedirs(Config.TEMP_UPLOAD_FOLDER, exist_ok=True)
     
+    @instrument('video.generate_segment')
     def generate_video_segment(self, story_id: str, prompt: str, 
                              image_file=None, use_previous_frame: bool = False,
-                             target_sequence: int = None) -> Dict[str, Any]:
-        """Generate a new video segment for a story"""
+                             target_sequence: int = None, priority: int = None,
+                             previous_segment_id: str = None) -> Dict[str, Any]:
+        """Queue a new video segment for a story; Veo submission happens in the dispatcher"""
         try:
             segment_id = str(uuid.uuid4())
             operation_id = str(uuid.uuid4())
@@ -44,55 +63,36 @@ class VideoService:
             if not story:
                 raise ValueError("Story not found")
             
-            # Get previous segments to determine sequence number
-            previous_segments = self.cloud_service.query_documents(
-                Config.SEGMENTS_COLLECTION,
-                filters=[('story_id', '==', story_id)],
-            )
-            # If a target sequence is provided (re-generate a specific scene), use it
-            if isinstance(target_sequence, int) and target_sequence > 0:
-                sequence_number = target_sequence
-            else:
-                sequence_number = len(previous_segments) + 1
+            sequence_number = self._allocate_sequence(story_id, story, target_sequence)
             
             self.logger.info(f"🎬 SEGMENT GENERATION: Story {story_id}, Sequence #{sequence_number}")
             self.logger.info(f"🎬 SEGMENT GENERATION: use_previous_frame={use_previous_frame}")
-            self.logger.info(f"🎬 SEGMENT GENERATION: Found {len(previous_segments)} existing segments")
             
             # Prepare generation parameters
             # Default to using the scene prompt verbatim to avoid losing semantic details
             enhanced_prompt = (prompt or '').strip()
             starting_image = None
-            cleanup_paths: List[str] = []
+            archive = None
+            # Only continuity needs an earlier segment; plain appends read no other segments
+            previous_segment = None
+            if use_previous_frame and not image_file:
+                previous_segment = self._find_previous_segment(story_id, previous_segment_id)
             
             # Handle image input
             if image_file:
-                # Save uploaded image temporarily
-                image_path = os.path.join(Config.TEMP_UPLOAD_FOLDER, f"{segment_id}_input.jpg")
-                image_file.save(image_path)
-                
-                # Upload to cloud storage
-                image_gcs_path = f"stories/{story_id}/segments/{segment_id}/input_image.jpg"
-                image_url = self.cloud_service.upload_file_to_gcs(image_path, image_gcs_path)
-                
-                # Create Image type for Veo
-                starting_image = types.Image.from_file(location=image_path)
+                # Read the upload once and store it in GCS (in the background), where Veo reads it from
+                from google.genai import types
+                starting_image = types.Image(
+                    image_bytes=image_file.read(),
+                    mime_type=getattr(image_file, 'mimetype', None) or 'image/jpeg',
+                )
+                archive = self._archiver.submit(self._archive_image, story_id, segment_id, 'input_image', starting_image)
                 
                 # Include original scene text; avoid rewriting to preserve intent
                 # Add a light note for I2V continuity
                 enhanced_prompt = f"Use the provided reference image for visual continuity. Scene details: {prompt}".strip()
-                # Defer cleanup until after generation call
-                cleanup_paths.append(image_path)
                 
-            elif use_previous_frame and previous_segments:
-                # Prefer the latest completed segment with a video_url
-                completed_with_video = [s for s in previous_segments if s.get('video_url')]
-                previous_segment = (
-                    max(completed_with_video, key=lambda x: x.get('sequence_number', 0))
-                    if completed_with_video else
-                    max(previous_segments, key=lambda x: x.get('sequence_number', 0))
-                )
-                self.logger.info(f"🎬 CONTINUITY: Found {len(previous_segments)} previous segments")
+            elif previous_segment:
                 self.logger.info(f"🎬 CONTINUITY: Using segment #{previous_segment.get('sequence_number', 0)} as reference")
                 self.logger.info(f"🎬 CONTINUITY: Previous prompt was: '{previous_segment.get('original_prompt', 'N/A')}'")
                 self.logger.info(f"🎬 CONTINUITY: Previous video URL: {previous_segment.get('video_url', 'N/A')}")
@@ -104,6 +104,8 @@ class VideoService:
                     continuity_context = f"This scene continues from the previous scene. Previous prompt: {previous_segment.get('original_prompt', '')}"
                     if starting_image:
                         self.logger.info("🎬 CONTINUITY: ✅ Frame extraction successful - using image + original scene text")
+                        archive = self._archiver.submit(self._archive_image, story_id, segment_id,
+                                                        'continuity_frame', starting_image)
                         enhanced_prompt = f"{continuity_context}. Scene details: {prompt}".strip()
                     else:
                         # Fallback to text-only with continuity context; keep original text intact
@@ -125,13 +127,16 @@ class VideoService:
             except Exception:
                 pass
 
+            # Choose model based on whether we have an image
+            model = Config.VEO_MODEL_IMAGE if starting_image else Config.VEO_MODEL_FAST
+
             # Create segment document
             segment_data = {
                 'story_id': story_id,
                 'sequence_number': sequence_number,
                 'original_prompt': prompt,
                 'enhanced_prompt': enhanced_prompt,
-                'status': 'generating',
+                'status': 'queued',
                 'created_at': datetime.utcnow().isoformat(),
                 'operation_id': operation_id,
                 'has_input_image': image_file is not None,
@@ -139,22 +144,39 @@ class VideoService:
             }
             
             self.cloud_service.save_document(Config.SEGMENTS_COLLECTION, segment_id, segment_data)
+
+            # Operation record exists from the start so status polling works while queued
+            self.cloud_service.save_document(Config.OPERATIONS_COLLECTION, operation_id, {
+                'segment_id': segment_id,
+                'operation_name': None,
+                'status': 'queued',
+                'created_at': datetime.utcnow().isoformat(),
+                'model_used': model,
+                'has_image': starting_image is not None,
+            })
             
-            # Start video generation
-            self._start_video_generation(segment_id, enhanced_prompt, starting_image)
-            
-            # Best-effort cleanup of any temp files used for seeding
-            for p in cleanup_paths:
-                try:
-                    if os.path.exists(p):
-                        os.remove(p)
-                except Exception:
-                    pass
+            # The job must not be claimable before its image is in GCS, which is where the
+            # dispatcher (possibly in another worker) takes it from
+            image_gcs_uri = archive.result() if archive else None
+
+            # Hand off to the rate-limited dispatcher; the request returns immediately
+            job = self.generation_queue.enqueue(
+                job_id=operation_id,
+                segment_id=segment_id,
+                story_id=story_id,
+                prompt=enhanced_prompt,
+                model=model,
+                image_gcs_uri=image_gcs_uri,
+                image_mime_type=starting_image.mime_type if image_gcs_uri else None,
+                priority=priority,
+                user_id=story.get('user_id'),
+            )
             
             return {
                 'segment_id': segment_id,
                 'operation_id': operation_id,
-                'status': 'generating',
+                'status': 'queued',
+                'queue_position': job.get('queue_position'),
                 'enhanced_prompt': enhanced_prompt,
                 'sequence_number': sequence_number
             }
@@ -163,68 +185,145 @@ class VideoService:
             self.logger.error(f"Error generating video segment: {str(e)}")
             raise
     
-    def _start_video_generation(self, segment_id: str, prompt: str, image: types.Image = None):
-        """Start the video generation process"""
+    def _allocate_sequence(self, story_id: str, story: Dict[str, Any], target_sequence: int = None) -> int:
+        """Sequence number for a new segment from the story's atomic `segment_sequence` counter.
+
+        A target sequence (re-generating a specific scene) is used as is and only moves the
+        counter forward, so later appends never reuse it.
+        """
+        # Stories created before the counter existed start from their highest segment
+        initial = 0 if 'segment_sequence' in story else self._highest_sequence(story_id)
+        if isinstance(target_sequence, int) and target_sequence > 0:
+            if (story.get('segment_sequence') or 0) < target_sequence:
+                self.cloud_service.advance_counter(Config.STORIES_COLLECTION, story_id, 'segment_sequence',
+                                                   lambda current: max(current, target_sequence), initial)
+            return target_sequence
+        return self.cloud_service.advance_counter(Config.STORIES_COLLECTION, story_id, 'segment_sequence',
+                                                  lambda current: current + 1, initial)
+
+    def reserve_sequences(self, story_id: str, story: Dict[str, Any], count: int) -> int:
+        """Reserve `count` consecutive sequence numbers after the story's existing segments; returns the first"""
+        initial = 0 if 'segment_sequence' in story else self._highest_sequence(story_id)
+        last = self.cloud_service.advance_counter(Config.STORIES_COLLECTION, story_id, 'segment_sequence',
+                                                  lambda current: current + count, initial)
+        return last - count + 1
+
+    def _highest_sequence(self, story_id: str) -> int:
+        segments = self.cloud_service.query_documents(Config.SEGMENTS_COLLECTION, filters=[('story_id', '==', story_id)])
+        return max((int(seg.get('sequence_number') or 0) for seg in segments), default=0)
+
+    def _find_previous_segment(self, story_id: str, previous_segment_id: str = None) -> Optional[Dict[str, Any]]:
+        """Segment to continue from: an explicit predecessor (batch generation) wins; otherwise the
+        latest completed segment with a video_url, else the latest segment"""
+        if previous_segment_id:
+            explicit = self.cloud_service.get_document(Config.SEGMENTS_COLLECTION, previous_segment_id)
+            if explicit and explicit.get('story_id') == story_id:
+                return explicit
+        previous_segments = self.cloud_service.query_documents(
+            Config.SEGMENTS_COLLECTION,
+            filters=[('story_id', '==', story_id)],
+        )
+        if not previous_segments:
+            return None
+        self.logger.info(f"🎬 CONTINUITY: Found {len(previous_segments)} previous segments")
+        completed_with_video = [seg for seg in previous_segments if seg.get('video_url')]
+        return max(completed_with_video or previous_segments, key=lambda x: x.get('sequence_number', 0))
+
+    @instrument('video.archive_image')
+    def _archive_image(self, story_id: str, segment_id: str, name: str, image: 'types.Image') -> str:
+        """Upload a job's starting image (upload or continuity frame) so any worker's dispatcher,
+        also after a restart, can submit the job; returns its gs:// URI"""
+        if not getattr(image, 'mime_type', None):
+            image.mime_type = 'image/png'
+        extension = mimetypes.guess_extension(image.mime_type) or '.img'
+        blob_name = f"stories/{story_id}/segments/{segment_id}/{name}{extension}"
+        return self.cloud_service.upload_bytes_to_gcs(image.image_bytes, blob_name, content_type=image.mime_type)
+
+    @instrument('video.submit')
+    def submit_generation_job(self, job: Dict[str, Any], image: 'types.Image' = None) -> str:
+        """Submit a dequeued job to Veo and record the live operation. Returns the operation name."""
+        from google.genai import types
+        segment_id = job['segment_id']
+
+        # Configure generation parameters
+        config = types.GenerateVideosConfig(
+            aspect_ratio=Config.DEFAULT_ASPECT_RATIO,
+            number_of_videos=1,
+            duration_seconds=Config.DEFAULT_VIDEO_DURATION,
+            resolution=Config.DEFAULT_RESOLUTION,
+            person_generation="allow_adult",
+            enhance_prompt=True,
+            generate_audio=True,
+            output_gcs_uri=f"gs://{Config.GCS_BUCKET_NAME}/videos/{segment_id}/"
+        )
+
+        # Start generation
+        operation = self.cloud_service.generate_videos(
+            model=job['model'],
+            prompt=job['prompt'],
+            config=config,
+            image=image
+        )
+
+        # Operation document is keyed by operation_id (== job id) for status lookup
+        self.cloud_service.update_document(Config.OPERATIONS_COLLECTION, job['id'], {
+            'operation_name': operation.name,
+            'status': 'running',
+            'submitted_at': datetime.utcnow().isoformat(),
+            'submitted_ts': time.time(),
+        })
+        self.cloud_service.update_document(Config.SEGMENTS_COLLECTION, segment_id, {'status': 'generating'})
+
+        self.logger.info(f"Video generation started for segment {segment_id}")
+        return operation.name
+
+    def fail_generation_job(self, job: Dict[str, Any], error: str):
+        """Mark the segment and operation of a job that could not be submitted as failed"""
         try:
-            # Choose model based on whether we have an image
-            model = Config.VEO_MODEL_IMAGE if image else Config.VEO_MODEL_FAST
-            
-            # Configure generation parameters
-            config = types.GenerateVideosConfig(
-                aspect_ratio=Config.DEFAULT_ASPECT_RATIO,
-                number_of_videos=1,
-                duration_seconds=Config.DEFAULT_VIDEO_DURATION,
-                resolution=Config.DEFAULT_RESOLUTION,
-                person_generation="allow_adult",
-                enhance_prompt=True,
-                generate_audio=True,
-                output_gcs_uri=f"gs://{Config.GCS_BUCKET_NAME}/videos/{segment_id}/"
-            )
-            
-            # Start generation
-            operation = self.cloud_service.generate_videos(
-                model=model,
-                prompt=prompt,
-                config=config,
-                image=image
+            self.cloud_service.update_document(
+                Config.SEGMENTS_COLLECTION,
+                job['segment_id'],
+                {'status': 'failed', 'error': error, 'failed_at': datetime.utcnow().isoformat()}
             )
-            
-            # Save operation details - store by operation_id for proper lookup
-            operation_data = {
-                'segment_id': segment_id,
-                'operation_name': operation.name,
-                'status': 'running',
-                'created_at': datetime.utcnow().isoformat(),
-                'model_used': model
-            }
-            
-            # Get operation_id from segment data to use as document ID
-            segment_doc = self.cloud_service.get_document(Config.SEGMENTS_COLLECTION, segment_id)
-            operation_id = segment_doc['operation_id']
-            
-            self.cloud_service.save_document(Config.OPERATIONS_COLLECTION, operation_id, operation_data)
-            
-            self.logger.info(f"Video generation started for segment {segment_id}")
-            
-        except Exception as e:
-            self.logger.error(f"Failed to start video generation: {str(e)}")
-            # Update segment status to failed
             self.cloud_service.update_document(
-                Config.SEGMENTS_COLLECTION, 
-                segment_id, 
-                {'status': 'failed', 'error': str(e)}
+                Config.OPERATIONS_COLLECTION,
+                job['id'],
+                {'status': 'failed', 'error': error}
             )
-            raise
+        except Exception as e:
+            self.logger.error(f"Failed to record generation failure for segment {job.get('segment_id')}: {str(e)}")
     
     def check_operation_status(self, operation_id: str) -> Dict[str, Any]:
         """Check the status of a video generation operation and finalize when done."""
+        return self.status_flight.do(operation_id, lambda: self._check_operation_status(operation_id))
+
+    @instrument('video.check_status')
+    def _check_operation_status(self, operation_id: str) -> Dict[str, Any]:
         try:
             # Get operation details from Firestore
             operation_doc = self.cloud_service.get_document(Config.OPERATIONS_COLLECTION, operation_id)
             if not operation_doc:
                 return {'status': 'not_found'}
 
-            operation_name = operation_doc['operation_name']
+            operation_name = operation_doc.get('operation_name')
+            if not operation_name:
+                # Still waiting in the generation queue (or rejected before submission)
+                if operation_doc.get('status') == 'failed':
+                    return {
+                        'status': 'failed',
+                        'segment_id': operation_doc['segment_id'],
+                        'error': operation_doc.get('error'),
+                    }
+                position = self.generation_queue.position(operation_id)
+                return {
+                    'status': 'queued',
+                    'segment_id': operation_doc['segment_id'],
+                    'model_used': operation_doc.get('model_used'),
+                    'queue_position': position,
+                    **self.durations.queued_hint(operation_doc.get('model_used'),
+                                                 bool(operation_doc.get('has_image')), position),
+                }
+
             operation = self.cloud_service.get_operation_status(operation_name)
 
             status_response = {
@@ -233,11 +332,21 @@ class VideoService:
                 'model_used': operation_doc.get('model_used'),
                 'operation_name': operation_name
             }
+            submitted_ts = operation_doc.get('submitted_ts')
+            elapsed = time.time() - float(submitted_ts) if submitted_ts else None
 
             # If still running, return early
             if not getattr(operation, 'done', False):
+                status_response.update(self.durations.running_hint(
+                    operation_doc.get('model_used'), bool(operation_doc.get('has_image')), elapsed))
                 return status_response
 
+            # Veo is done with it either way: release the user's in-flight slot
+            finished = self.generation_queue.mark_finished(
+                operation_id, 'failed' if getattr(operation, 'error', None) else 'done')
+            if finished and elapsed is not None and not getattr(operation, 'error', None):
+                self.durations.record(operation_doc.get('model_used'), bool(operation_doc.get('has_image')), elapsed)
+
             # If errored, mark failed
             if getattr(operation, 'error', None):
                 error_msg = str(operation.error)
@@ -322,14 +431,16 @@ class VideoService:
                     'completed_at': datetime.utcnow().isoformat(),
                 },
             )
-            status_response.update({'status': 'publishing'})
+            status_response.update({'status': 'publishing',
+                                    'next_poll_after_ms': int(Config.POLL_HINT_MIN_SECONDS * 1000)})
             return status_response
 
         except Exception as e:
             self.logger.error(f"Error checking operation status: {str(e)}")
             return {'status': 'error', 'error': str(e)}
     
-    def _extract_last_frame_as_image(self, video_url: str) -> types.Image:
+    @instrument('video.extract_frame')
+    def _extract_last_frame_as_image(self, video_url: str) -> 'types.Image':
         """Extract the final frame from the given video URL and return as types.Image.
 
         Supports public HTTPS URLs and gs:// URIs. Downloads video to a temp file,
@@ -339,6 +450,7 @@ class VideoService:
         try:
             import cv2  # type: ignore
             from PIL import Image  # type: ignore
+            from google.genai import types
         except Exception as e:
             self.logger.error(f"🎬 FRAME EXTRACTION: Missing libs (opencv-python, pillow): {e}")
             return None
@@ -348,21 +460,9 @@ class VideoService:
         local_video_path = os.path.join(temp_dir, "input.mp4")
 
         try:
-            # If URL is gs://, try converting to https and make public via CloudService
-            source_url = video_url
-            if video_url.startswith("gs://"):
-                http_url = self.cloud_service.gcs_uri_to_http_url(video_url, make_public=True)
-                source_url = http_url or video_url
-
-            # Download video
-            import requests  # lazy import
-            self.logger.info(f"🎬 FRAME EXTRACTION: Downloading video from: {source_url}")
-            with requests.get(source_url, stream=True, timeout=30) as r:
-                r.raise_for_status()
-                with open(local_video_path, 'wb') as f:
-                    for chunk in r.iter_content(chunk_size=1024 * 1024):
-                        if chunk:
-                            f.write(chunk)
+            # Download video (gs:// through the storage client, no need to make it public)
+            self.logger.info(f"🎬 FRAME EXTRACTION: Downloading video from: {video_url}")
+            self.cloud_service.download_url_to_file(video_url, local_video_path, timeout=30)
 
             # Read last frame via OpenCV
             cap = cv2.VideoCapture(local_video_path)
@@ -408,22 +508,15 @@ class VideoService:
             except Exception:
                 pass
     
+    @instrument('video.stitch')
     def stitch_story_videos(self, story_id: str) -> Dict[str, Any]:
         """Stitch all completed video segments into a single final MP4 and upload to GCS.
 
         - Downloads each completed segment to a temp directory
-        - Concatenates with MoviePy (compose mode for safe size/fps handling)
+        - Concatenates them with the configured strategy (Config.STITCH_STRATEGY, see utils.stitching)
         - Uploads the stitched file to GCS and updates story
         """
         self.logger.info(f"🎬 STITCH: Starting stitching for story {story_id}")
-        try:
-            # MoviePy v2 import paths
-            from moviepy.video.io.VideoFileClip import VideoFileClip  # type: ignore
-            from moviepy.video.compositing.CompositeVideoClip import concatenate_videoclips  # type: ignore
-            import requests  # type: ignore
-        except Exception as e:
-            self.logger.error(f"🎬 STITCH: Missing libraries (moviepy/requests): {e}")
-            raise
 
         # 1) Gather completed segments with playable URLs
         segments = self.cloud_service.query_documents(
@@ -435,97 +528,90 @@ class VideoService:
 
         # Sort by sequence
         segments.sort(key=lambda x: x.get('sequence_number', 0))
+
+        # Identical stitches (same story and segment manifest) already running are joined
+        manifest = tuple((seg.get('id'), seg.get('video_url')) for seg in segments)
+        return self.stitch_flight.do((story_id, manifest), lambda: self._stitch_segments(story_id, segments))
+
+    def _stitch_segments(self, story_id: str, segments: List[Dict[str, Any]]) -> Dict[str, Any]:
+        stitch_started = time.perf_counter()
+        strategy = Config.STITCH_STRATEGY
         self.logger.info(f"🎬 STITCH: Found {len(segments)} completed segments")
 
+        pending = []
+        for seg in segments:
+            if seg.get('video_url'):
+                pending.append(seg)
+            else:
+                self.logger.warning(f"🎬 STITCH: Segment {seg.get('id')} missing video_url; skipping")
+
+        # Incremental: reuse the previous final video when its segments are a prefix of these
+        base_url = None
+        segment_ids = [seg['id'] for seg in pending]
+        if strategy == 'incremental':
+            story = self.cloud_service.get_document(Config.STORIES_COLLECTION, story_id) or {}
+            # Only a stream-copied file has the segments' own codec parameters to append to
+            stitched_ids = [] if story.get('stitched_with') == 'reencode' else story.get('stitched_segment_ids') or []
+            if story.get('final_video_url') and stitched_ids and segment_ids[:len(stitched_ids)] == stitched_ids:
+                if len(stitched_ids) == len(segment_ids):
+                    self.logger.info("🎬 STITCH: Final video already covers every segment")
+                    return {
+                        'status': 'completed',
+                        'final_video_url': story['final_video_url'],
+                        'total_segments': len(segments),
+                    }
+                base_url = story['final_video_url']
+                pending = pending[len(stitched_ids):]
+                self.logger.info(f"🎬 STITCH: Appending {len(pending)} segments to the previous final video")
+
         # 2) Download each video segment locally
         temp_dir = tempfile.mkdtemp(prefix="stitch_")
-        local_paths: List[str] = []
-        clips = []
         try:
-            for seg in segments:
-                url = seg.get('video_url')
-                if not url:
-                    self.logger.warning(f"🎬 STITCH: Segment {seg.get('id')} missing video_url; skipping")
-                    continue
-
-                # Convert gs:// to public https if needed
-                source_url = url
-                if url.startswith('gs://'):
-                    converted = self.cloud_service.gcs_uri_to_http_url(url, make_public=True)
-                    if converted:
-                        source_url = converted
-                
+            base_path = None
+            if base_url:
+                base_path = self.cloud_service.download_url_to_file(
+                    base_url, os.path.join(temp_dir, "previous_final.mp4"), timeout=60)
+
+            local_paths: List[str] = []
+            for seg in pending:
+                url = seg['video_url']
                 local_path = os.path.join(temp_dir, f"segment_{seg.get('sequence_number', 0)}.mp4")
-                self.logger.info(f"🎬 STITCH: Downloading segment #{seg.get('sequence_number', 0)} from {source_url}")
+                self.logger.info(f"🎬 STITCH: Downloading segment #{seg.get('sequence_number', 0)} from {url}")
                 try:
-                    with requests.get(source_url, stream=True, timeout=60) as r:
-                        r.raise_for_status()
-                        with open(local_path, 'wb') as f:
-                            for chunk in r.iter_content(chunk_size=1024 * 1024):
-                                if chunk:
-                                    f.write(chunk)
+                    self.cloud_service.download_url_to_file(url, local_path, timeout=60)
                     local_paths.append(local_path)
                 except Exception as e:
                     self.logger.error(f"🎬 STITCH: Failed to download segment #{seg.get('sequence_number', 0)}: {e}")
+                    segment_ids = None  # a gap: the result must not be reused as an incremental base
                     continue
 
             if not local_paths:
                 raise ValueError("No downloadable video files for stitching")
 
-            # 3) Load clips and concatenate
-            self.logger.info("🎬 STITCH: Loading clips into MoviePy")
-            for p in local_paths:
-                try:
-                    clip = VideoFileClip(p)
-                    clips.append(clip)
-                except Exception as e:
-                    self.logger.error(f"🎬 STITCH: Failed to load clip {p}: {e}")
-
-            if not clips:
-                raise ValueError("Failed to load any video clips for stitching")
-
-            self.logger.info("🎬 STITCH: Concatenating clips (compose mode)")
-            try:
-                final = concatenate_videoclips(clips, method='compose')
-            except Exception as e:
-                # Try without compose as fallback
-                self.logger.warning(f"🎬 STITCH: Compose failed ({e}); retrying without compose")
-                final = concatenate_videoclips(clips)
-
-            # 4) Write final video
+            # 3) Concatenate and write the final video
             stitched_local = os.path.join(temp_dir, "stitched_final.mp4")
-            self.logger.info(f"🎬 STITCH: Writing final video to {stitched_local}")
-            try:
-                # Let moviepy pick fps from clips; set codecs explicitly
-                final.write_videofile(
-                    stitched_local,
-                    codec='libx264',
-                    audio_codec='aac',
-                    temp_audiofile=os.path.join(temp_dir, "temp-audio.m4a"),
-                    remove_temp=True,
-                    threads=2,
-                )
-            finally:
-                try:
-                    final.close()  # type: ignore
-                except Exception:
-                    pass
+            self.logger.info(f"🎬 STITCH: Concatenating {len(local_paths)} clips ({strategy}) into {stitched_local}")
+            result = stitching.stitch_files(local_paths, stitched_local, strategy=strategy, base_path=base_path)
 
-            # 5) Upload to GCS and update story
+            # 4) Upload to GCS and update story
             dest_blob = f"stories/{story_id}/final/stitched_{datetime.utcnow().strftime('%Y%m%dT%H%M%S')}.mp4"
             public_url = self.cloud_service.upload_file_to_gcs(stitched_local, dest_blob)
             self.logger.info(f"🎬 STITCH: Uploaded final video to {public_url}")
 
-            updated_story = self.cloud_service.update_document(
+            self.cloud_service.update_document(
                 Config.STORIES_COLLECTION,
                 story_id,
                 {
                     'final_video_url': public_url,
                     'stitched_at': datetime.utcnow().isoformat(),
+                    'stitched_segment_ids': segment_ids or [],
+                    'stitched_with': result['strategy'],
                     'status': 'completed',
                 },
             )
 
+            metrics.record_stitch(result['video_seconds'], time.perf_counter() - stitch_started)
+
             return {
                 'status': 'completed',
                 'final_video_url': public_url,
@@ -533,32 +619,4 @@ class VideoService:
             }
 
         finally:
-            # Cleanup moviepy clips
-            for c in clips:
-                try:
-                    c.close()
-                except Exception:
-                    pass
-            # Cleanup temp files
-            for p in local_paths:
-                try:
-                    if os.path.exists(p):
-                        os.remove(p)
-                except Exception:
-                    pass
-            # stitched_local removed after upload attempt (keep temp dir cleanup)
-            for root, dirs, files in os.walk(temp_dir, topdown=False):
-                for name in files:
-                    try:
-                        os.remove(os.path.join(root, name))
-                    except Exception:
-                        pass
-                for name in dirs:
-                    try:
-                        os.rmdir(os.path.join(root, name))
-                    except Exception:
-                        pass
-            try:
-                os.rmdir(temp_dir)
-            except Exception:
-                pass
+            shutil.rmtree(temp_dir, ignore_errors=True)
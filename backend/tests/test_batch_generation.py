@@ -0,0 +1,72 @@
+"""
+Tests for the whole-story batch plan and the polling limits of its scheduler
+"""
+
+import time
+from unittest import mock
+
+from config.settings import Config
+from services.batch_generation_service import StoryBatchScheduler, build_generation_plan
+
+
+def _scenes(count):
+    return [{'id': f's{i}', 'sequence': i, 'veo_prompt': f'prompt {i}'} for i in range(1, count + 1)]
+
+
+def test_plan_orders_by_sequence_and_chains_continuity():
+    scenes = list(reversed(_scenes(3)))
+    nodes = build_generation_plan(scenes, continuity={'s2': True, 's3': True})
+    assert [node['scene_id'] for node in nodes] == ['s1', 's2', 's3']
+    assert [node['depends_on'] for node in nodes] == [None, 's1', 's2']
+    assert [node['critical_path'] for node in nodes] == [3, 2, 1]
+
+
+def test_plan_default_and_per_scene_continuity():
+    scenes = _scenes(3)
+    scenes[2]['use_previous_frame'] = False
+    nodes = build_generation_plan(scenes, default_use_previous_frame=True)
+    # The first scene has nothing to continue from; s3 opts out
+    assert [node['depends_on'] for node in nodes] == [None, 's1', None]
+    assert [node['prompt'] for node in nodes] == ['prompt 1', 'prompt 2', 'prompt 3']
+
+
+def _scheduler(status):
+    nodes = build_generation_plan(_scenes(2), continuity={'s2': True})
+    nodes[0].update({'status': 'running', 'operation_id': 'op1', 'segment_id': 'seg1'})
+    video_service = mock.Mock()
+    video_service.check_operation_status.return_value = status
+    return StoryBatchScheduler('batch', 'story', nodes, 2, mock.Mock(), video_service)
+
+
+def _poll(scheduler, times=1):
+    for _ in range(times):
+        scheduler._next_poll.clear()
+        scheduler._poll_in_flight()
+    scheduler._cascade_failures()
+
+
+def test_repeated_status_errors_fail_the_scene_and_skip_dependents():
+    scheduler = _scheduler({'status': 'error', 'error': 'unavailable'})
+    _poll(scheduler, Config.BATCH_MAX_STATUS_ERRORS - 1)
+    assert scheduler.nodes[0]['status'] == 'running'
+    _poll(scheduler)
+    assert scheduler.nodes[0]['status'] == 'failed'
+    assert scheduler.nodes[1]['status'] == 'skipped'
+
+
+def test_status_errors_reset_after_a_good_check():
+    scheduler = _scheduler({'status': 'error', 'error': 'unavailable'})
+    _poll(scheduler, Config.BATCH_MAX_STATUS_ERRORS - 1)
+    scheduler.video_service.check_operation_status.return_value = {'status': 'running'}
+    _poll(scheduler)
+    assert 'status_errors' not in scheduler.nodes[0]
+
+
+def test_scene_outliving_operation_timeout_fails():
+    scheduler = _scheduler({'status': 'publishing'})
+    _poll(scheduler)
+    assert scheduler.nodes[0]['status'] == 'running'
+    scheduler.nodes[0]['submitted_ts'] = time.time() - Config.OPERATION_TIMEOUT - 1
+    _poll(scheduler)
+    assert scheduler.nodes[0]['status'] == 'failed'
+    assert scheduler.nodes[1]['status'] == 'skipped'
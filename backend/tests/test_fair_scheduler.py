@@ -0,0 +1,103 @@
+"""
+Tests for weighted fair ordering of queued jobs and the FairGate admission gate
+"""
+
+import asyncio
+import threading
+import time
+from unittest import mock
+
+import pytest
+
+from config.settings import Config
+from services.fair_scheduler import FairGate, QueueTimeout, fair_order
+
+
+def _job(user_id, ts, priority=5):
+    return {'id': f'{user_id}-{ts}', 'user_id': user_id, 'enqueued_ts': ts, 'priority': priority}
+
+
+def _ids(jobs):
+    return [job['id'] for job in jobs]
+
+
+def test_fair_order_interleaves_users():
+    jobs = [_job('heavy', ts) for ts in range(4)] + [_job('light', 10)]
+    assert _ids(fair_order(jobs)) == ['heavy-0', 'light-10', 'heavy-1', 'heavy-2', 'heavy-3']
+
+
+def test_fair_order_counts_jobs_already_in_flight():
+    jobs = [_job('a', 1), _job('b', 2)]
+    assert _ids(fair_order(jobs, in_flight={'a': 2})) == ['b-2', 'a-1']
+
+
+def test_fair_order_keeps_priority_then_fifo_within_a_user():
+    jobs = [_job('a', 1), _job('a', 2, priority=9), _job('a', 3)]
+    assert _ids(fair_order(jobs)) == ['a-2', 'a-1', 'a-3']
+
+
+def test_fair_order_applies_user_weights():
+    jobs = [_job('vip', ts) for ts in range(3)] + [_job('free', ts) for ts in range(3)]
+    with mock.patch.object(Config, 'USER_WEIGHTS', {'vip': 2.0}):
+        ordered = _ids(fair_order(jobs))
+    assert ordered == ['vip-0', 'free-0', 'vip-1', 'vip-2', 'free-1', 'free-2']
+
+
+def test_gate_admits_immediately_under_capacity():
+    gate = FairGate('test', capacity=2, per_user_cap=2)
+    with gate.slot('a') as ticket:
+        assert ticket['queue_position'] == 0
+        assert gate.snapshot('a')['user_active'] == 1
+    assert gate.snapshot()['active'] == 0
+
+
+def test_gate_per_user_cap_times_out():
+    gate = FairGate('test', capacity=4, per_user_cap=1)
+    gate.acquire('a')
+    with pytest.raises(QueueTimeout) as raised:
+        gate.acquire('a', timeout=0.05)
+    assert raised.value.position == 1
+    assert gate.snapshot()['waiting'] == 0
+    # Another user is not held back by a's cap
+    gate.acquire('b', timeout=0.05)
+
+
+def test_gate_lets_a_light_user_overtake_a_heavy_backlog():
+    gate = FairGate('test', capacity=1, per_user_cap=1)
+    gate.acquire('heavy')
+    order = []
+
+    def wait(user_id):
+        with gate.slot(user_id, timeout=5):
+            order.append(user_id)
+
+    threads = []
+    for user_id in ('heavy', 'heavy', 'light'):
+        threads.append(threading.Thread(target=wait, args=(user_id,)))
+        threads[-1].start()
+        time.sleep(0.05)
+    gate.release('heavy')
+    for thread in threads:
+        thread.join(5)
+    assert order == ['heavy', 'light', 'heavy']
+
+
+def test_async_waiter_is_woken_by_a_thread_release():
+    gate = FairGate('test', capacity=1, per_user_cap=1)
+    gate.acquire('a')
+
+    async def main():
+        threading.Timer(0.05, gate.release, args=('a',)).start()
+        async with gate.aslot('b', timeout=5) as ticket:
+            return ticket['queue_position'], gate.snapshot()['active']
+
+    assert asyncio.run(main()) == (1, 1)
+    assert gate.snapshot()['active'] == 0
+
+
+def test_async_waiter_times_out_and_leaves_the_queue():
+    gate = FairGate('test', capacity=1, per_user_cap=1)
+    gate.acquire('a')
+    with pytest.raises(QueueTimeout):
+        asyncio.run(gate.aacquire('b', timeout=0.05))
+    assert gate.snapshot()['waiting'] == 0
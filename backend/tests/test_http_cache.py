@@ -0,0 +1,78 @@
+"""
+Tests for conditional JSON responses (ETag / If-None-Match) and response compression
+"""
+
+import gzip
+from datetime import datetime, timezone
+
+import pytest
+from flask import Flask
+
+from config.settings import Config
+from utils.http_cache import conditional_json, make_etag, parse_timestamp, setup_compression
+
+UPDATED_AT = '2026-01-02T03:04:05'
+
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    setup_compression(app)
+    built = []
+
+    @app.route('/story')
+    def story():
+        def build():
+            built.append(1)
+            return {'title': 'x' * 2000}
+        return conditional_json(build, validator=UPDATED_AT, last_modified=parse_timestamp(UPDATED_AT))
+
+    @app.route('/body')
+    def body():
+        return conditional_json(lambda: {'title': 'y'})
+
+    client = app.test_client()
+    client.built = built
+    return client
+
+
+def test_etag_then_304_without_building(client):
+    first = client.get('/story')
+    assert first.status_code == 200
+    assert first.headers['ETag'] == f'W/"{make_etag(UPDATED_AT)}"'
+    assert first.headers['Cache-Control'] == 'no-cache'
+
+    again = client.get('/story', headers={'If-None-Match': first.headers['ETag']})
+    assert again.status_code == 304
+    assert again.data == b''
+    assert client.built == [1]
+
+
+def test_stale_etag_gets_the_body(client):
+    response = client.get('/story', headers={'If-None-Match': 'W/"other"'})
+    assert response.status_code == 200
+    assert response.get_json()['title'].startswith('x')
+
+
+def test_body_hash_etag_without_validator(client):
+    first = client.get('/body')
+    assert client.get('/body', headers={'If-None-Match': first.headers['ETag']}).status_code == 304
+
+
+def test_large_json_is_gzipped_when_accepted(client):
+    response = client.get('/story', headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data).startswith(b'{')
+
+
+def test_small_json_is_not_compressed(client):
+    response = client.get('/body', headers={'Accept-Encoding': 'gzip'})
+    assert len(response.data) < Config.COMPRESSION_MIN_BYTES
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_parse_timestamp_is_aware_utc():
+    assert parse_timestamp(UPDATED_AT) == datetime(2026, 1, 2, 3, 4, 5, tzinfo=timezone.utc)
+    assert parse_timestamp('not a date') is None
+    assert parse_timestamp(None) is None
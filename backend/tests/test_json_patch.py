@@ -0,0 +1,86 @@
+"""
+Tests for RFC 6902 JSON Patch application and field-path updates
+"""
+
+import pytest
+
+from utils.json_patch import (JsonPatchError, apply_patch, changed_keys, parse_pointer, to_pointer,
+                              updates_to_patch)
+
+STORY = {'title': 'T', 'scenes': [{'id': 's1', 'title': 'A'}, {'id': 's2', 'title': 'B'}], 'a/b': {'~x': 1}}
+
+
+def test_pointer_round_trip_with_escapes():
+    assert parse_pointer('/a~1b/~0x') == ['a/b', '~x']
+    assert to_pointer(['a/b', '~x']) == '/a~1b/~0x'
+    assert parse_pointer('') == []
+    with pytest.raises(JsonPatchError):
+        parse_pointer('scenes/0')
+
+
+def test_add_replace_remove():
+    result = apply_patch(STORY, [
+        {'op': 'add', 'path': '/scenes/-', 'value': {'id': 's3'}},
+        {'op': 'add', 'path': '/scenes/0', 'value': {'id': 's0'}},
+        {'op': 'replace', 'path': '/scenes/1/title', 'value': 'A2'},
+        {'op': 'remove', 'path': '/a~1b/~0x'},
+    ])
+    assert [scene['id'] for scene in result['scenes']] == ['s0', 's1', 's2', 's3']
+    assert result['scenes'][1]['title'] == 'A2'
+    assert result['a/b'] == {}
+
+
+def test_input_document_is_not_modified():
+    apply_patch(STORY, [{'op': 'replace', 'path': '/scenes/0/title', 'value': 'changed'}])
+    assert STORY['scenes'][0]['title'] == 'A'
+
+
+def test_move_copy_and_test():
+    result = apply_patch(STORY, [
+        {'op': 'test', 'path': '/scenes/1/id', 'value': 's2'},
+        {'op': 'move', 'from': '/scenes/1', 'path': '/scenes/0'},
+        {'op': 'copy', 'from': '/title', 'path': '/subtitle'},
+    ])
+    assert [scene['id'] for scene in result['scenes']] == ['s2', 's1']
+    assert result['subtitle'] == 'T'
+
+
+def test_replace_root():
+    assert apply_patch(STORY, [{'op': 'replace', 'path': '', 'value': {'title': 'new'}}]) == {'title': 'new'}
+
+
+@pytest.mark.parametrize('operations', [
+    [{'op': 'test', 'path': '/title', 'value': 'other'}],
+    [{'op': 'replace', 'path': '/missing', 'value': 1}],
+    [{'op': 'remove', 'path': '/scenes/5'}],
+    [{'op': 'add', 'path': '/scenes/01', 'value': 1}],
+    [{'op': 'add', 'path': '/title/x', 'value': 1}],
+    [{'op': 'add', 'path': '/title'}],
+    [{'op': 'move', 'from': '/scenes', 'path': '/scenes/0'}],
+    [{'op': 'frobnicate', 'path': '/title'}],
+    [{'path': '/title'}],
+    {'op': 'add', 'path': '/title', 'value': 1},
+])
+def test_invalid_patches_raise(operations):
+    with pytest.raises(JsonPatchError):
+        apply_patch(STORY, operations)
+
+
+def test_failed_patch_applies_nothing():
+    document = {'title': 'T'}
+    with pytest.raises(JsonPatchError):
+        apply_patch(document, [{'op': 'replace', 'path': '/title', 'value': 'X'},
+                               {'op': 'remove', 'path': '/missing'}])
+    assert document == {'title': 'T'}
+
+
+def test_updates_to_patch_uses_dotted_paths():
+    operations = updates_to_patch({'camera_work.angle': 'low', 'title': 'X'}, prefix='/scenes/0')
+    assert operations == [
+        {'op': 'add', 'path': '/scenes/0/camera_work/angle', 'value': 'low'},
+        {'op': 'add', 'path': '/scenes/0/title', 'value': 'X'},
+    ]
+
+
+def test_changed_keys():
+    assert changed_keys({'a': 1, 'b': 2, 'c': 3}, {'a': 1, 'b': 5, 'd': 4}) == (['b', 'd'], ['c'])
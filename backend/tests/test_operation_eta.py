@@ -0,0 +1,46 @@
+"""
+Tests for learned Veo durations and the ETA / poll hints derived from them
+"""
+
+from unittest import mock
+
+import pytest
+
+from config.settings import Config
+from services.operation_eta import OperationDurations
+
+
+@pytest.fixture
+def durations():
+    cloud_service = mock.Mock()
+    cloud_service.get_document.return_value = None
+    with mock.patch.multiple(Config, OPERATION_ETA_DEFAULT_SECONDS=90, POLL_HINT_MIN_SECONDS=3,
+                             POLL_HINT_MAX_SECONDS=60, OPERATION_POLL_INTERVAL=15):
+        yield OperationDurations(cloud_service)
+
+
+@pytest.mark.parametrize('elapsed, eta, poll_ms', [
+    (None, 90, 15000),  # submission time unknown: regular interval
+    (0, 90, 60000),     # far from done: sparse polls, capped
+    (60, 30, 7500),     # wait until the dense window starts
+    (80, 10, 3000),     # inside the dense window
+    (150, 0, 15000),    # overdue: back off in proportion to the delay
+])
+def test_running_hint_from_default_duration(durations, elapsed, eta, poll_ms):
+    assert durations.running_hint('veo', False, elapsed) == {'eta_seconds': eta, 'next_poll_after_ms': poll_ms}
+
+
+def test_recorded_durations_move_the_estimate(durations):
+    durations.record('veo', True, 40)
+    assert durations.expected('veo', True) == (40, 4)
+    # Text-only operations keep their own statistics
+    assert durations.expected('veo', False)[0] == 90
+    durations.record('veo', True, 60)
+    assert durations.expected('veo', True)[0] == pytest.approx(44)
+    saved = durations.cloud_service.save_document.call_args[0]
+    assert saved[1] == 'veo:image' and saved[2]['count'] == 2
+
+
+def test_queued_hint_scales_with_position(durations):
+    assert durations.queued_hint('veo', False, 4) == {'eta_seconds': 90, 'next_poll_after_ms': 12000}
+    assert durations.queued_hint('veo', False, None)['next_poll_after_ms'] == 3000
@@ -0,0 +1,70 @@
+"""
+Tests for single-flight coalescing of duplicate in-flight calls
+"""
+
+import asyncio
+import threading
+import time
+
+import pytest
+
+from utils.single_flight import SingleFlight, request_key
+
+
+def test_request_key_is_stable_and_order_insensitive():
+    assert request_key('s1', {'a': 1, 'b': 2}) == request_key('s1', {'b': 2, 'a': 1})
+    assert request_key('s1', {'a': 1}) != request_key('s2', {'a': 1})
+
+
+def test_concurrent_duplicates_share_one_call():
+    flight = SingleFlight('test')
+    calls = []
+    started = threading.Event()
+
+    def slow():
+        calls.append(1)
+        started.set()
+        time.sleep(0.1)
+        return {'items': [1]}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('k', slow)))
+    leader.start()
+    started.wait(5)
+    followers = [threading.Thread(target=lambda: results.append(flight.do('k', slow))) for _ in range(3)]
+    for thread in followers:
+        thread.start()
+    for thread in [leader] + followers:
+        thread.join(5)
+    assert len(calls) == 1
+    assert results == [{'items': [1]}] * 4
+    # Followers get copies they can modify
+    assert len({id(result) for result in results}) == 4
+
+
+def test_errors_are_shared_and_nothing_is_cached():
+    flight = SingleFlight('test')
+
+    def fail():
+        raise LookupError('gone')
+
+    with pytest.raises(LookupError):
+        flight.do('k', fail)
+    assert flight.do('k', lambda: 'fresh') == 'fresh'
+
+
+def test_async_callers_join_sync_and_async_calls():
+    flight = SingleFlight('test')
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await asyncio.sleep(0.1)
+        return 'result'
+
+    async def main():
+        return await asyncio.gather(flight.ado('k', slow), flight.ado('k', slow),
+                                    asyncio.to_thread(flight.do, 'k', lambda: 'never run'))
+
+    assert asyncio.run(main()) == ['result'] * 3
+    assert calls == [1]
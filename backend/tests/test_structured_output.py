@@ -0,0 +1,75 @@
+"""
+Tests for the validating structured-output parser and its repair of truncated JSON
+"""
+
+import json
+from types import SimpleNamespace
+
+import pytest
+
+from services.story_schemas import CharacterProfiles, StoryStructure
+from utils.structured_output import StructuredOutputError, parse_model, parse_response
+
+STRUCTURE = {
+    'title': 'The Expedition',
+    'genre': 'adventure',
+    'estimated_duration': '24s',
+    'scene_structure': [
+        {'sequence': 1, 'title': 'Departure', 'location': 'harbour', 'key_actions': ['boarding']},
+        {'sequence': 2, 'title': 'Storm', 'location': 'open sea'},
+        {'sequence': 3, 'title': 'Landfall', 'location': 'island'},
+    ],
+}
+
+
+def test_complete_json_is_validated():
+    result = parse_model(json.dumps(STRUCTURE), StoryStructure)
+    assert result.estimated_duration == 24
+    assert [scene.title for scene in result.scene_structure] == ['Departure', 'Storm', 'Landfall']
+
+
+def test_truncated_output_keeps_complete_scenes():
+    text = json.dumps(STRUCTURE)
+    cut = text[:text.index('"Landfall"') - len('"title": ')]
+    result = parse_model(cut, StoryStructure)
+    assert result.title == 'The Expedition'
+    assert [scene.sequence for scene in result.scene_structure] == [1, 2]
+
+
+def test_truncated_nested_list_drops_only_the_incomplete_item():
+    text = json.dumps({'characters': [{'name': 'Sam', 'personality_traits': ['brave', 'curious']},
+                                      {'name': 'Rex', 'role': 'supporting'}]})
+    cut = text[:text.index('"Rex"')]
+    result = parse_model(cut, CharacterProfiles)
+    assert [character.name for character in result.characters] == ['Sam']
+    assert result.characters[0].personality_traits == ['brave', 'curious']
+
+
+def test_truncated_string_value_is_not_kept():
+    text = json.dumps({'characters': [{'name': 'Sam', 'physical_description': 'tall, weathered face'}]})
+    result = parse_model(text[:text.index('weathered')], CharacterProfiles)
+    assert result.characters[0].name == 'Sam'
+    assert result.characters[0].physical_description is None
+
+
+def test_schema_mismatch_is_not_repaired():
+    with pytest.raises(StructuredOutputError):
+        parse_model(json.dumps({'genre': 'adventure'}), StoryStructure)
+
+
+def test_truncation_before_required_top_level_field_fails():
+    with pytest.raises(StructuredOutputError):
+        parse_model('{"genre": "adventure", "tit', StoryStructure)
+
+
+@pytest.mark.parametrize('text', ['', '   ', 'not json at all'])
+def test_empty_or_non_json_fails(text):
+    with pytest.raises(StructuredOutputError):
+        parse_model(text, StoryStructure)
+
+
+def test_parse_response_prefers_sdk_parsed():
+    parsed = CharacterProfiles(characters=[])
+    assert parse_response(SimpleNamespace(parsed=parsed, text='garbage'), CharacterProfiles) is parsed
+    response = SimpleNamespace(parsed=None, text=json.dumps({'characters': [{'name': 'Sam'}]}))
+    assert parse_response(response, CharacterProfiles).characters[0].name == 'Sam'
@@ -0,0 +1,123 @@
+"""
+Conditional GET and response compression
+
+- `conditional_json()` answers with 304 Not Modified when the client's If-None-Match /
+  If-Modified-Since still match. With a cheap validator (e.g. the story's updated_at) the
+  payload is not even built or serialized for a 304; otherwise the ETag is a hash of the body.
+- `setup_compression()` gzip- or brotli-encodes large JSON responses (brotli when the optional
+  `brotli` package is installed and the client accepts it).
+
+ETags are weak: the same JSON is equivalent whether or not it was compressed on the way out.
+"""
+
+import gzip
+import hashlib
+import logging
+from datetime import datetime, timezone
+from typing import Any, Callable, Optional
+
+from config.settings import Config
+
+try:
+    import brotli  # type: ignore
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'text/plain', 'text/html', 'text/css', 'application/javascript'}
+
+
+def make_etag(*parts: Any) -> str:
+    """Short digest of `parts` (bytes are hashed as-is, anything else via str())"""
+    digest = hashlib.blake2b(digest_size=16)
+    for part in parts:
+        digest.update(part if isinstance(part, (bytes, bytearray)) else str(part).encode('utf-8'))
+        digest.update(b'\x1f')
+    return digest.hexdigest()
+
+
+def parse_timestamp(value: Any) -> Optional[datetime]:
+    """Our ISO `updated_at` strings (naive UTC) or datetimes, as aware UTC for Last-Modified"""
+    if isinstance(value, str):
+        try:
+            value = datetime.fromisoformat(value)
+        except ValueError:
+            return None
+    if not isinstance(value, datetime):
+        return None
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _not_modified(etag: str, last_modified: Optional[datetime]):
+    from flask import Response
+
+    response = Response(status=304)
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def conditional_json(build: Callable[[], Any], validator: Any = None, last_modified: datetime = None,
+                     status: int = 200):
+    """JSON response for `build()` that honours conditional request headers.
+
+    `validator` is anything that changes whenever the payload does (e.g. updated_at). When it is
+    given, a matching request gets its 304 without `build()` being called.
+    """
+    from flask import Response, current_app, request
+    from werkzeug.http import is_resource_modified
+
+    etag = make_etag(validator) if validator is not None else None
+    if etag is not None and not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        return _not_modified(etag, last_modified)
+
+    body = current_app.json.dumps(build()).encode('utf-8')
+    if etag is None:
+        etag = make_etag(body)
+        if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+            return _not_modified(etag, last_modified)
+
+    response = Response(body, status=status, mimetype='application/json')
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Cacheable, but always revalidated (a 304 is cheap)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+def _compress(data: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(data, quality=Config.BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=Config.GZIP_LEVEL)
+
+
+def setup_compression(app):
+    """Compress large text/JSON responses according to Accept-Encoding"""
+    from flask import request
+
+    offered = ['br', 'gzip'] if BROTLI_AVAILABLE else ['gzip']
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code < 200 or response.status_code >= 300 or response.direct_passthrough
+                or 'Content-Encoding' in response.headers or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(offered)
+        if not encoding:
+            return response
+        data = response.get_data()
+        if len(data) < Config.COMPRESSION_MIN_BYTES:
+            return response
+        try:
+            response.set_data(_compress(data, encoding))
+        except Exception as e:
+            logger.warning(f"Failed to {encoding}-compress response: {e}")
+            return response
+        response.headers['Content-Encoding'] = encoding
+        return response
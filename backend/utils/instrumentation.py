@@ -0,0 +1,206 @@
+"""
+Per-request latency instrumentation of service calls (durations, payload sizes, outcomes)
+
+Service methods are wrapped with `instrument()` / `instrument_class()`. While a request is
+being served, each call is added to that request's `RequestTimings`, which the Flask hooks
+emit as a `Server-Timing` header and as fields of one structured log line per request.
+Outside a request (dispatcher, batch threads) the wrappers only pass through.
+"""
+
+import time
+import inspect
+import logging
+import functools
+import threading
+import contextvars
+from typing import Any, Callable, Dict, List, Optional
+
+from config.settings import Config
+from utils import tracing
+
+logger = logging.getLogger(__name__)
+
+_current_request: contextvars.ContextVar = contextvars.ContextVar('request_timings', default=None)
+_current_stage: contextvars.ContextVar = contextvars.ContextVar('current_stage', default=None)
+
+# Called as observer(stage, seconds, outcome, payload_bytes) for every instrumented call
+_observers: List[Callable[[str, float, str, int], None]] = []
+
+
+class RequestTimings:
+    """Stage timings collected while serving one request (shared with its async tasks)"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.stages: Dict[str, Dict[str, Any]] = {}
+
+    def add(self, stage: str, seconds: float, outcome: str, payload_bytes: int):
+        with self._lock:
+            entry = self.stages.setdefault(stage, {'count': 0, 'ms': 0.0, 'bytes': 0, 'errors': 0})
+            entry['count'] += 1
+            entry['ms'] += seconds * 1000
+            entry['bytes'] += payload_bytes
+            if outcome != 'ok':
+                entry['errors'] += 1
+
+    @property
+    def elapsed_ms(self) -> float:
+        return (time.perf_counter() - self.started) * 1000
+
+    def server_timing(self, limit: int = 20) -> str:
+        """Render as a Server-Timing header value, slowest stages first"""
+        with self._lock:
+            ordered = sorted(self.stages.items(), key=lambda item: item[1]['ms'], reverse=True)[:limit]
+        parts = [f'{stage};dur={entry["ms"]:.1f};desc="{entry["count"]}x"' for stage, entry in ordered]
+        parts.append(f'total;dur={self.elapsed_ms:.1f}')
+        return ', '.join(parts)
+
+    def as_fields(self) -> Dict[str, Any]:
+        """Breakdown for the structured request log"""
+        with self._lock:
+            stages = {stage: dict(entry, ms=round(entry['ms'], 1)) for stage, entry in self.stages.items()}
+        return {'duration_ms': round(self.elapsed_ms, 1), 'stages': stages}
+
+
+class _Stage:
+    __slots__ = ('payload_bytes',)
+
+    def __init__(self):
+        self.payload_bytes = 0
+
+
+def add_observer(observer: Callable[[str, float, str, int], None]):
+    """Receive every instrumented call, in or out of a request (used by metrics)"""
+    _observers.append(observer)
+
+
+def begin_request() -> contextvars.Token:
+    """Start collecting timings for the current request; pair with end_request()"""
+    return _current_request.set(RequestTimings())
+
+
+def end_request(token: contextvars.Token) -> Optional[RequestTimings]:
+    timings = _current_request.get()
+    _current_request.reset(token)
+    return timings
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current_request.get()
+
+
+def note_payload(nbytes: int):
+    """Attribute `nbytes` of payload to the innermost running stage"""
+    stage = _current_stage.get()
+    if stage is not None and nbytes:
+        stage.payload_bytes += int(nbytes)
+
+
+def _bytes_in(values) -> int:
+    return sum(len(value) for value in values if isinstance(value, (bytes, bytearray, memoryview)))
+
+
+def _record(name: str, started: float, outcome: str, stage: _Stage):
+    seconds = time.perf_counter() - started
+    timings = _current_request.get()
+    if timings is not None:
+        timings.add(name, seconds, outcome, stage.payload_bytes)
+    for observer in _observers:
+        try:
+            observer(name, seconds, outcome, stage.payload_bytes)
+        except Exception as e:
+            logger.debug(f"Timing observer failed for {name}: {e}")
+
+
+def instrument(name: str):
+    """Decorator timing a function (sync or async) as stage `name`"""
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                stage = _Stage()
+                stage.payload_bytes = _bytes_in(args) + _bytes_in(kwargs.values())
+                token = _current_stage.set(stage)
+                span = tracing.start_span(name)
+                started = time.perf_counter()
+                outcome = 'error'
+                try:
+                    result = await func(*args, **kwargs)
+                    outcome = 'ok'
+                    return result
+                finally:
+                    tracing.finish_span(span, outcome)
+                    _current_stage.reset(token)
+                    _record(name, started, outcome, stage)
+            async_wrapper.__instrumented__ = True
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            stage = _Stage()
+            stage.payload_bytes = _bytes_in(args) + _bytes_in(kwargs.values())
+            token = _current_stage.set(stage)
+            span = tracing.start_span(name)
+            started = time.perf_counter()
+            outcome = 'error'
+            try:
+                result = func(*args, **kwargs)
+                if isinstance(result, (bytes, bytearray)):
+                    stage.payload_bytes += len(result)
+                outcome = 'ok'
+                return result
+            finally:
+                tracing.finish_span(span, outcome)
+                _current_stage.reset(token)
+                _record(name, started, outcome, stage)
+        wrapper.__instrumented__ = True
+        return wrapper
+    return decorate
+
+
+def instrument_class(prefix: str, exclude: tuple = ()):
+    """Class decorator timing every public method as stage `<prefix>.<method>`"""
+    def decorate(cls):
+        for attr, value in list(vars(cls).items()):
+            if attr.startswith('_') or attr in exclude or not inspect.isfunction(value):
+                continue
+            if getattr(value, '__instrumented__', False):
+                continue
+            setattr(cls, attr, instrument(f"{prefix}.{attr}")(value))
+        return cls
+    return decorate
+
+
+def setup_instrumentation(app):
+    """Collect stage timings per request and emit them as Server-Timing and a log line"""
+    from flask import g, request
+
+    request_logger = logging.getLogger('request_timing')
+
+    @app.before_request
+    def begin_request_timing():
+        g.timing_token = begin_request()
+
+    @app.after_request
+    def emit_request_timing(response):
+        timings = current_timings()
+        if timings is None:
+            return response
+        if Config.SERVER_TIMING_HEADER:
+            response.headers['Server-Timing'] = timings.server_timing()
+            origin = request.headers.get('Origin')
+            if origin and origin in Config.CORS_ORIGINS:
+                response.headers['Timing-Allow-Origin'] = origin
+        if timings.stages:
+            fields = timings.as_fields()
+            fields.update({'method': request.method, 'path': request.path, 'status': response.status_code})
+            request_logger.info(f"{request.method} {request.path} {response.status_code} in {fields['duration_ms']}ms",
+                                extra={'fields': fields})
+        return response
+
+    @app.teardown_request
+    def end_request_timing(exc):
+        token = g.pop('timing_token', None)
+        if token is not None:
+            end_request(token)
@@ -0,0 +1,138 @@
+"""
+RFC 6902 JSON Patch (with RFC 6901 JSON Pointers) for storyboard edits
+
+Patches are applied to a deep copy; the input document is never modified. Any invalid
+operation raises JsonPatchError and nothing is applied.
+"""
+
+import copy
+from typing import Any, Dict, List, Tuple
+
+_MISSING = object()
+
+
+class JsonPatchError(ValueError):
+    """A patch operation that is malformed or does not apply to the document"""
+
+
+def parse_pointer(pointer: str) -> List[str]:
+    """'/scenes/0/title' -> ['scenes', '0', 'title']"""
+    if pointer == '':
+        return []
+    if not isinstance(pointer, str) or not pointer.startswith('/'):
+        raise JsonPatchError(f"Invalid JSON pointer: {pointer!r}")
+    return [token.replace('~1', '/').replace('~0', '~') for token in pointer[1:].split('/')]
+
+
+def to_pointer(tokens: List[Any]) -> str:
+    return ''.join('/' + str(token).replace('~', '~0').replace('/', '~1') for token in tokens)
+
+
+def _index(container: list, token: str, for_add: bool = False) -> int:
+    if for_add and token == '-':
+        return len(container)
+    if not token.isdigit() or (len(token) > 1 and token.startswith('0')):
+        raise JsonPatchError(f"Invalid array index: {token!r}")
+    index = int(token)
+    if index > len(container) or (index == len(container) and not for_add):
+        raise JsonPatchError(f"Array index out of range: {index}")
+    return index
+
+
+def _resolve(document: Any, tokens: List[str]) -> Any:
+    value = document
+    for token in tokens:
+        if isinstance(value, dict):
+            if token not in value:
+                raise JsonPatchError(f"Path not found: {to_pointer(tokens)}")
+            value = value[token]
+        elif isinstance(value, list):
+            value = value[_index(value, token)]
+        else:
+            raise JsonPatchError(f"Path not found: {to_pointer(tokens)}")
+    return value
+
+
+def _parent(document: Any, tokens: List[str]) -> Tuple[Any, str]:
+    if not tokens:
+        raise JsonPatchError("The document root cannot be the target of this operation")
+    return _resolve(document, tokens[:-1]), tokens[-1]
+
+
+def _add(document: Any, tokens: List[str], value: Any) -> Any:
+    if not tokens:
+        return value
+    parent, key = _parent(document, tokens)
+    if isinstance(parent, dict):
+        parent[key] = value
+    elif isinstance(parent, list):
+        parent.insert(_index(parent, key, for_add=True), value)
+    else:
+        raise JsonPatchError(f"Cannot add to a scalar at {to_pointer(tokens)}")
+    return document
+
+
+def _remove(document: Any, tokens: List[str]) -> Any:
+    parent, key = _parent(document, tokens)
+    if isinstance(parent, dict):
+        if key not in parent:
+            raise JsonPatchError(f"Path not found: {to_pointer(tokens)}")
+        return parent.pop(key)
+    if isinstance(parent, list):
+        return parent.pop(_index(parent, key))
+    raise JsonPatchError(f"Path not found: {to_pointer(tokens)}")
+
+
+def apply_patch(document: Any, operations: List[Dict[str, Any]]) -> Any:
+    """Return a patched copy of `document`"""
+    if not isinstance(operations, list):
+        raise JsonPatchError("A JSON Patch must be a list of operations")
+    result = copy.deepcopy(document)
+    for operation in operations:
+        if not isinstance(operation, dict) or 'op' not in operation or 'path' not in operation:
+            raise JsonPatchError(f"Malformed operation: {operation!r}")
+        op = operation['op']
+        tokens = parse_pointer(operation['path'])
+        value = operation.get('value', _MISSING)
+        if op in ('add', 'replace', 'test') and value is _MISSING:
+            raise JsonPatchError(f"'{op}' needs a value")
+
+        if op == 'add':
+            result = _add(result, tokens, copy.deepcopy(value))
+        elif op == 'remove':
+            _remove(result, tokens)
+        elif op == 'replace':
+            if not tokens:
+                result = copy.deepcopy(value)
+            else:
+                _resolve(result, tokens)  # must exist
+                _remove(result, tokens)
+                result = _add(result, tokens, copy.deepcopy(value))
+        elif op in ('move', 'copy'):
+            source = parse_pointer(operation.get('from', ''))
+            if op == 'move' and tokens[:len(source)] == source and tokens != source:
+                raise JsonPatchError("Cannot move a value into one of its children")
+            moved = _remove(result, source) if op == 'move' else copy.deepcopy(_resolve(result, source))
+            result = _add(result, tokens, moved)
+        elif op == 'test':
+            if _resolve(result, tokens) != value:
+                raise JsonPatchError(f"Test failed at {operation['path']}")
+        else:
+            raise JsonPatchError(f"Unknown operation: {op!r}")
+    return result
+
+
+def updates_to_patch(updates: Dict[str, Any], prefix: str = '') -> List[Dict[str, Any]]:
+    """Field-path updates ({'camera_work.angle': 'low', 'title': 'X'}) as 'add' operations under `prefix`"""
+    operations = []
+    for field, value in updates.items():
+        tokens = [token for token in str(field).split('.') if token]
+        operations.append({'op': 'add', 'path': prefix + to_pointer(tokens), 'value': value})
+    return operations
+
+
+def changed_keys(before: Dict[str, Any], after: Dict[str, Any]) -> Tuple[List[str], List[str]]:
+    """Top-level keys whose values differ (set in `after`) and keys that were removed"""
+    changed = [key for key, value in after.items() if before.get(key, _MISSING) != value]
+    removed = [key for key in before if key not in after]
+    return changed, removed
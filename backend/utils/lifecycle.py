@@ -0,0 +1,87 @@
+"""
+Process lifecycle hooks for multi-worker serving (post-fork re-initialization and graceful drain)
+"""
+
+import time
+import logging
+import threading
+from typing import Callable, List
+
+logger = logging.getLogger(__name__)
+
+_post_fork_callbacks: List[Callable[[], None]] = []
+_drain_start_callbacks: List[Callable[[], None]] = []
+_shutdown_callbacks: List[Callable[[], None]] = []
+
+
+def register_post_fork(callback: Callable[[], None]):
+    """Run `callback` in each worker right after it is forked from a preloading master"""
+    _post_fork_callbacks.append(callback)
+
+
+def register_drain_start(callback: Callable[[], None]):
+    """Run `callback` (must not block) as soon as the worker is asked to stop"""
+    _drain_start_callbacks.append(callback)
+
+
+def register_shutdown(callback: Callable[[], None]):
+    """Run `callback` (may block while draining) just before the worker exits"""
+    _shutdown_callbacks.append(callback)
+
+
+def _run(callbacks: List[Callable[[], None]], phase: str):
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.error(f"{phase} hook {getattr(callback, '__qualname__', callback)} failed: {e}")
+
+
+def run_post_fork():
+    _run(_post_fork_callbacks, 'Post-fork')
+
+
+def run_drain_start():
+    _run(_drain_start_callbacks, 'Drain-start')
+
+
+def run_shutdown():
+    run_drain_start()
+    _run(_shutdown_callbacks, 'Shutdown')
+
+
+class InflightTracker:
+    """Counts in-flight generation requests so a worker can drain them before exiting"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._count = 0
+        self.draining = False
+
+    @property
+    def count(self) -> int:
+        return self._count
+
+    def enter(self):
+        with self._cond:
+            self._count += 1
+
+    def exit(self):
+        with self._cond:
+            self._count = max(0, self._count - 1)
+            self._cond.notify_all()
+
+    def begin_drain(self):
+        """Stop admitting new generation work (readiness turns unhealthy)"""
+        self.draining = True
+
+    def wait_idle(self, timeout: float) -> bool:
+        """Wait up to `timeout` seconds for in-flight requests to finish; True if drained"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while self._count > 0:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+            return True
@@ -2,19 +2,37 @@
 Logging configuration and utilities
 """
 
+import atexit
 import logging
+import logging.handlers
+import queue
+import random
 import sys
-from datetime import datetime
+from datetime import datetime, timezone
 import json
 
+from config.settings import Config
+from utils import lifecycle, tracing
+
+try:
+    import orjson  # type: ignore
+
+    def _dumps(obj) -> str:
+        return orjson.dumps(obj, default=str).decode('utf-8')
+except ImportError:
+    def _dumps(obj) -> str:
+        return json.dumps(obj, default=str, ensure_ascii=False)
+
 class StructuredFormatter(logging.Formatter):
     """Custom formatter for structured logging"""
     
     def format(self, record):
         log_entry = {
-            'timestamp': datetime.utcnow().isoformat() + 'Z',
+            # Records are formatted later on the listener thread, so use the time they were created
+            'timestamp': datetime.fromtimestamp(record.created, timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
             'level': record.levelname,
             'message': record.getMessage(),
+            'logger': record.name,
             'module': record.module,
             'function': record.funcName,
             'line': record.lineno
@@ -27,34 +45,109 @@ class StructuredFormatter(logging.Formatter):
             log_entry['operation_id'] = record.operation_id
         if hasattr(record, 'user_id'):
             log_entry['user_id'] = record.user_id
+        for key in ('request_id', 'trace_id', 'span_id'):
+            if getattr(record, key, None):
+                log_entry[key] = getattr(record, key)
+        if isinstance(getattr(record, 'fields', None), dict):
+            log_entry.update(record.fields)
+        if record.exc_info:
+            log_entry['exception'] = self.formatException(record.exc_info)
             
-        return json.dumps(log_entry)
+        return _dumps(log_entry)
+
+class SamplingFilter(logging.Filter):
+    """Keep only a fraction of DEBUG/INFO records for configured loggers (WARNING and up always pass).
+
+    `rates` maps a logger name prefix to the fraction kept, e.g. {'services.cloud_service': 0.1};
+    the longest matching prefix wins.
+    """
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self.rates = sorted(((name, max(0.0, min(1.0, rate))) for name, rate in rates.items()),
+                            key=lambda item: len(item[0]), reverse=True)
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING or not self.rates:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + '.'):
+                return rate >= 1.0 or random.random() < rate
+        return True
+
+class CorrelationFilter(logging.Filter):
+    """Stamp records with the request/trace/span IDs of the emitting context.
+
+    Must run on the calling thread: the queue listener that formats records has no request context.
+    """
+
+    def filter(self, record):
+        for key, value in tracing.current_ids().items():
+            if not getattr(record, key, None):
+                setattr(record, key, value)
+        return True
+
+class _EnqueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that only freezes the message on the calling thread; formatting happens in the listener"""
+
+    def prepare(self, record):
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+_queue_handler = None
+_listener = None
+
+def _start_listener(output_handler):
+    global _listener
+    _queue_handler.queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(_queue_handler.queue, output_handler, respect_handler_level=True)
+    _listener.start()
+
+def _restart_listener_after_fork():
+    """The listener thread does not survive fork(); give each worker its own queue and thread"""
+    if _listener is not None:
+        _start_listener(_listener.handlers[0])
+
+def _stop_listener():
+    """Flush queued records on interpreter exit"""
+    if _listener is not None and _listener._thread is not None:
+        _listener.stop()
 
 def setup_logging(app):
-    """Setup application logging with structured output"""
-    
-    # Clear existing handlers
-    app.logger.handlers.clear()
-    
-    # Create console handler
-    console_handler = logging.StreamHandler(sys.stdout)
-    console_handler.setFormatter(StructuredFormatter())
-    
-    # Set log level
+    """Setup application logging: one queue-backed structured handler on the root logger.
+
+    Request threads only enqueue records; a background listener formats them as JSON and
+    writes them to stdout. Safe to call more than once (handlers are replaced, not added).
+    """
+    global _queue_handler
+
     log_level = logging.DEBUG if app.config.get('DEBUG') else logging.INFO
+
+    # App records propagate to the root handler instead of having their own (avoids duplicates)
+    app.logger.handlers.clear()
     app.logger.setLevel(log_level)
-    console_handler.setLevel(log_level)
-    
-    # Add handler to app logger
-    app.logger.addHandler(console_handler)
-    
-    # Also configure root logger so library/service loggers propagate to console
+    app.logger.propagate = True
+
     root_logger = logging.getLogger()
     root_logger.setLevel(log_level)
-    root_console = logging.StreamHandler(sys.stdout)
-    root_console.setFormatter(StructuredFormatter())
-    root_console.setLevel(log_level)
-    root_logger.addHandler(root_console)
+    for handler in list(root_logger.handlers):
+        if handler is _queue_handler or isinstance(handler.formatter, StructuredFormatter):
+            root_logger.removeHandler(handler)
+
+    if _queue_handler is None:
+        console_handler = logging.StreamHandler(sys.stdout)
+        console_handler.setFormatter(StructuredFormatter())
+        _queue_handler = _EnqueueHandler(queue.SimpleQueue())
+        _start_listener(console_handler)
+        lifecycle.register_post_fork(_restart_listener_after_fork)
+        atexit.register(_stop_listener)
+    _listener.handlers[0].setLevel(log_level)
+
+    _queue_handler.filters.clear()
+    _queue_handler.addFilter(SamplingFilter(Config.LOG_SAMPLE_RATES))
+    _queue_handler.addFilter(CorrelationFilter())
+    root_logger.addHandler(_queue_handler)
     
     # Capture warnings module as logs
     logging.captureWarnings(True)
@@ -65,15 +158,13 @@ def setup_logging(app):
     
     app.logger.info("Logging configured successfully")
 
-def get_logger_with_context(**context):
-    """Get logger with additional context fields"""
-    logger = logging.getLogger(__name__)
-    
-    # Create a custom LoggerAdapter that adds context
-    class ContextAdapter(logging.LoggerAdapter):
-        def process(self, msg, kwargs):
-            for key, value in self.extra.items():
-                setattr(kwargs.get('extra', {}), key, value)
-            return msg, kwargs
-    
-    return ContextAdapter(logger, context)
+class ContextAdapter(logging.LoggerAdapter):
+    """LoggerAdapter that merges fixed context fields into each record's extra"""
+
+    def process(self, msg, kwargs):
+        kwargs['extra'] = {**self.extra, **(kwargs.get('extra') or {})}
+        return msg, kwargs
+
+def get_logger_with_context(name: str = None, **context):
+    """Get logger with additional context fields (e.g. story_id, operation_id, user_id)"""
+    return ContextAdapter(logging.getLogger(name or __name__), context)
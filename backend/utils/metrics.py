@@ -0,0 +1,203 @@
+"""
+Prometheus metrics for the platform
+
+Under gunicorn, PROMETHEUS_MULTIPROC_DIR is set (gunicorn.conf.py) so every worker writes its
+samples to shared files and /metrics aggregates all workers, whichever one serves the scrape.
+prometheus_client is optional: without it every metric is a no-op and /metrics reports 503.
+"""
+
+import os
+import time
+import threading
+from typing import Any, Dict, List, Tuple
+
+from config.settings import Config
+from utils import instrumentation
+
+try:
+    from prometheus_client import (Counter, Gauge, Histogram, CollectorRegistry, REGISTRY,
+                                   CONTENT_TYPE_LATEST, generate_latest, multiprocess)
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = 'text/plain; version=0.0.4; charset=utf-8'
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+VEO_BUCKETS = (15, 30, 45, 60, 90, 120, 180, 240, 300, 450, 600, 900)
+
+
+class _NoopMetric:
+    """Stand-in used when prometheus_client is not installed"""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def set(self, value: float):
+        pass
+
+    def observe(self, value: float):
+        pass
+
+
+def _counter(*args, **kwargs):
+    return Counter(*args, **kwargs) if PROMETHEUS_AVAILABLE else _NoopMetric()
+
+
+def _histogram(*args, **kwargs):
+    return Histogram(*args, **kwargs) if PROMETHEUS_AVAILABLE else _NoopMetric()
+
+
+def _gauge(name: str, documentation: str, labelnames: List[str], multiprocess_mode: str):
+    if PROMETHEUS_AVAILABLE:
+        return Gauge(name, documentation, labelnames, multiprocess_mode=multiprocess_mode)
+    return _NoopMetric()
+
+
+REQUEST_LATENCY = _histogram(
+    'video_story_http_request_duration_seconds', 'HTTP request latency by route',
+    ['method', 'route', 'status'], buckets=LATENCY_BUCKETS)
+STAGE_LATENCY = _histogram(
+    'video_story_stage_duration_seconds',
+    'Latency of instrumented calls; cloud.<method> stages are CloudService backend calls',
+    ['stage', 'outcome'], buckets=LATENCY_BUCKETS)
+STAGE_PAYLOAD = _counter(
+    'video_story_stage_payload_bytes', 'Payload bytes moved by instrumented calls', ['stage'])
+GEMINI_TOKENS = _counter(
+    'video_story_gemini_tokens', 'Gemini tokens by model and kind (prompt, output, cached, thoughts)',
+    ['model', 'kind'])
+VEO_OPERATION_DURATION = _histogram(
+    'video_story_veo_operation_duration_seconds', 'Veo operation time from submission to completion',
+    ['model', 'outcome'], buckets=VEO_BUCKETS)
+VEO_SUBMISSIONS = _counter(
+    'video_story_veo_submissions', 'Veo submission attempts by model and outcome', ['model', 'outcome'])
+# Firestore-backed queues look the same from every worker (take the max); local queues are per worker (sum)
+QUEUE_DEPTH = _gauge(
+    'video_story_generation_queue_jobs', 'Generation queue jobs by status and model', ['status', 'model'],
+    'livesum' if Config.GENERATION_QUEUE_BACKEND == 'local' else 'livemax')
+GATE_ACTIVE = _gauge(
+    'video_story_gate_active', 'Requests holding a fair-share slot', ['gate'], 'livesum')
+GATE_WAITING = _gauge(
+    'video_story_gate_waiting', 'Requests waiting for a fair-share slot', ['gate'], 'livesum')
+CACHE_REQUESTS = _counter(
+    'video_story_cache_requests', 'Cache lookups by cache and result (hit or miss)', ['cache', 'result'])
+SINGLE_FLIGHT_CALLS = _counter(
+    'video_story_single_flight_calls',
+    'Calls through single-flight groups by role (leader runs it, coalesced waits for the leader)',
+    ['group', 'role'])
+STITCH_VIDEO_SECONDS = _counter(
+    'video_story_stitch_video_seconds', 'Seconds of video produced by stitching')
+STITCH_WALL_SECONDS = _counter(
+    'video_story_stitch_wall_seconds', 'Wall-clock seconds spent stitching')
+
+UPLOAD_BYTES = _counter(
+    'video_story_upload_bytes', 'Bytes of media uploaded to GCS by mode (single, resumable, composite)', ['mode'])
+UPLOAD_WALL_SECONDS = _counter(
+    'video_story_upload_wall_seconds', 'Wall-clock seconds spent uploading media to GCS by mode', ['mode'])
+
+_depth_lock = threading.Lock()
+_depth_labels: set = set()
+
+
+def _observe_stage(stage: str, seconds: float, outcome: str, payload_bytes: int):
+    STAGE_LATENCY.labels(stage, outcome).observe(seconds)
+    if payload_bytes:
+        STAGE_PAYLOAD.labels(stage).inc(payload_bytes)
+
+
+instrumentation.add_observer(_observe_stage)
+
+
+def record_request(method: str, route: str, status: int, seconds: float):
+    REQUEST_LATENCY.labels(method, route, str(status)).observe(seconds)
+
+
+def record_cache(cache: str, hit: bool):
+    CACHE_REQUESTS.labels(cache, 'hit' if hit else 'miss').inc()
+
+
+def record_single_flight(group: str, coalesced: bool):
+    SINGLE_FLIGHT_CALLS.labels(group, 'coalesced' if coalesced else 'leader').inc()
+
+
+def record_gemini_usage(model: str, response: Any):
+    """Count tokens from a generate_content response's usage_metadata"""
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is None:
+        return
+    for kind, attr in (('prompt', 'prompt_token_count'), ('output', 'candidates_token_count'),
+                       ('cached', 'cached_content_token_count'), ('thoughts', 'thoughts_token_count')):
+        count = getattr(usage, attr, None)
+        if count:
+            GEMINI_TOKENS.labels(model, kind).inc(count)
+
+
+def record_veo_submission(model: str, outcome: str):
+    VEO_SUBMISSIONS.labels(model or 'unknown', outcome).inc()
+
+
+def record_veo_operation(model: str, outcome: str, seconds: float):
+    VEO_OPERATION_DURATION.labels(model or 'unknown', outcome).observe(max(seconds, 0.0))
+
+
+def record_queue_depth(jobs: List[Dict[str, Any]]):
+    """Publish the current generation queue composition; labels that emptied are reset to 0"""
+    counts: Dict[Tuple[str, str], int] = {}
+    for job in jobs:
+        key = (job.get('status') or 'unknown', job.get('model') or 'unknown')
+        counts[key] = counts.get(key, 0) + 1
+    with _depth_lock:
+        for key in _depth_labels - set(counts):
+            QUEUE_DEPTH.labels(*key).set(0)
+        for key, count in counts.items():
+            QUEUE_DEPTH.labels(*key).set(count)
+        _depth_labels.update(counts)
+
+
+def record_gate(gate: str, active: int, waiting: int):
+    GATE_ACTIVE.labels(gate).set(active)
+    GATE_WAITING.labels(gate).set(waiting)
+
+
+def record_stitch(video_seconds: float, wall_seconds: float):
+    """Stitch throughput is rate(video_seconds) / rate(wall_seconds)"""
+    STITCH_VIDEO_SECONDS.inc(video_seconds)
+    STITCH_WALL_SECONDS.inc(wall_seconds)
+
+
+def record_upload(mode: str, size_bytes: int, wall_seconds: float):
+    """Upload throughput is rate(upload_bytes) / rate(upload_wall_seconds)"""
+    UPLOAD_BYTES.labels(mode).inc(size_bytes)
+    UPLOAD_WALL_SECONDS.labels(mode).inc(wall_seconds)
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """Exposition text for /metrics, aggregated across workers in multiprocess mode"""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def setup_metrics(app):
+    """Observe request latency per route (the URL rule, not the raw path, to bound cardinality)"""
+    from flask import request
+
+    @app.before_request
+    def start_request_clock():
+        request.environ['video_story.started'] = time.perf_counter()
+
+    @app.after_request
+    def observe_request_latency(response):
+        started = request.environ.get('video_story.started')
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule else 'unmatched'
+            record_request(request.method, route, response.status_code, time.perf_counter() - started)
+        return response
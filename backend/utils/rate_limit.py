@@ -0,0 +1,55 @@
+"""
+Rate limiting primitives
+"""
+
+import time
+import threading
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `rate_per_minute`"""
+
+    def __init__(self, rate_per_minute: float, burst: int = 1):
+        self.rate_per_second = max(rate_per_minute, 0.0) / 60.0
+        self.capacity = max(int(burst), 1)
+        self._tokens = float(self.capacity)
+        self._updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._updated_at
+        self._updated_at = now
+        self._tokens = min(self.capacity, self._tokens + elapsed * self.rate_per_second)
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        """Take `tokens` if available without blocking"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True
+            return False
+
+    def release(self, tokens: float = 1.0):
+        """Give back tokens that were acquired but not used"""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.capacity, self._tokens + tokens)
+
+    def drain(self):
+        """Empty the bucket, e.g. after the upstream reported quota exhaustion"""
+        with self._lock:
+            self._refill()
+            self._tokens = 0.0
+
+    def seconds_until_available(self, tokens: float = 1.0) -> float:
+        """Seconds until `tokens` can be acquired (0 when available now)"""
+        with self._lock:
+            self._refill()
+            missing = tokens - self._tokens
+            if missing <= 0:
+                return 0.0
+            if self.rate_per_second <= 0:
+                return float('inf')
+            return missing / self.rate_per_second
@@ -0,0 +1,124 @@
+"""
+Single-flight coalescing of duplicate in-flight calls
+
+Browser tabs and the frontend's retry after a timeout send identical expensive requests at
+the same moment. Callers of `SingleFlight.do()` with the same key while a call is running
+wait for it and get its result (or exception) instead of running it again; `ado()` is the
+coroutine form for the ASGI entry point and shares the same calls, so a duplicate arriving on
+either path joins the one already running. Coalescing is per worker process; nothing is cached
+once the call returns.
+"""
+
+import copy
+import asyncio
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+Result = TypeVar('Result')
+
+
+def request_key(*parts: Any) -> str:
+    """Stable hash of JSON-serializable request parts (e.g. path arguments and body)"""
+    payload = json.dumps(parts, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters', 'listeners')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+        # (loop, future) of coroutines waiting on this call
+        self.listeners = []
+
+
+class SingleFlight:
+    """Keyed group of calls where concurrent duplicates share one execution"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._lock = threading.Lock()
+        self._calls: Dict[Any, _Call] = {}
+
+    def _join(self, key: Any):
+        """The running call for `key` and whether the caller leads it"""
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+        metrics.record_single_flight(self.name, coalesced=not leader)
+        return call, leader
+
+    def _finish(self, key: Any, call: _Call):
+        with self._lock:
+            del self._calls[key]
+            call.done.set()
+            listeners, call.listeners = call.listeners, []
+        if call.waiters:
+            logger.info(f"{self.name}: {call.waiters} duplicate call(s) shared one execution")
+        for loop, future in listeners:
+            loop.call_soon_threadsafe(_resolve, future)
+
+    def do(self, key: Any, fn: Callable[[], Result]) -> Result:
+        """Run `fn()`, or wait for the running call with the same key.
+
+        Coalesced callers get a deep copy of the result so they can modify it freely.
+        """
+        call, leader = self._join(key)
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+    async def ado(self, key: Any, fn: Callable[[], Awaitable[Result]]) -> Result:
+        """Coroutine form of `do()`: await `fn()`, or the running call with the same key"""
+        call, leader = self._join(key)
+        if not leader:
+            loop = asyncio.get_running_loop()
+            future = loop.create_future()
+            with self._lock:
+                pending = not call.done.is_set()
+                if pending:
+                    call.listeners.append((loop, future))
+            if pending:
+                await future
+            if call.error is not None:
+                raise call.error
+            return copy.deepcopy(call.result)
+
+        try:
+            call.result = await fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            self._finish(key, call)
+
+
+def _resolve(future: 'asyncio.Future'):
+    if not future.done():
+        future.set_result(None)
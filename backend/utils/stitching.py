@@ -0,0 +1,140 @@
+"""
+Concatenation of local video files into one MP4
+
+Strategies:
+- reencode: MoviePy decodes every clip and writes one H.264/AAC file (handles mixed sizes and
+  frame rates; CPU time and memory grow with the number of clips)
+- copy: ffmpeg concat demuxer with stream copy (no decoding; needs clips with the same codecs,
+  size and frame rate, which holds for clips from one Veo model)
+- incremental: stream-copy only the new clips onto a previously stitched file
+
+Stream-copy strategies fall back to reencode when ffmpeg rejects the inputs.
+"""
+
+import os
+import re
+import shutil
+import logging
+import tempfile
+import subprocess
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+STRATEGIES = ('reencode', 'copy', 'incremental')
+
+_DURATION_PATTERN = re.compile(r'Duration: (\d+):(\d+):(\d+(?:\.\d+)?)')
+
+
+def ffmpeg_binary() -> str:
+    """The ffmpeg bundled with imageio-ffmpeg (a MoviePy dependency), else the one on PATH"""
+    try:
+        import imageio_ffmpeg  # type: ignore
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        binary = shutil.which('ffmpeg')
+        if not binary:
+            raise RuntimeError("ffmpeg not found (install imageio-ffmpeg or ffmpeg)")
+        return binary
+
+
+def probe_duration(path: str) -> float:
+    """Container duration in seconds, read from ffmpeg's input summary (0.0 if unknown)"""
+    proc = subprocess.run([ffmpeg_binary(), '-hide_banner', '-i', path], capture_output=True, text=True)
+    match = _DURATION_PATTERN.search(proc.stderr)
+    if not match:
+        return 0.0
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def _concat_copy(paths: List[str], output_path: str):
+    fd, list_path = tempfile.mkstemp(suffix='.txt', prefix='concat_', dir=os.path.dirname(output_path) or None)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for path in paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+        proc = subprocess.run(
+            [ffmpeg_binary(), '-y', '-hide_banner', '-loglevel', 'error', '-f', 'concat', '-safe', '0',
+             '-i', list_path, '-c', 'copy', '-movflags', '+faststart', output_path],
+            capture_output=True, text=True)
+        if proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg concat failed: {proc.stderr.strip()[-500:]}")
+    finally:
+        os.remove(list_path)
+
+
+def _concat_reencode(paths: List[str], output_path: str, threads: int = 2) -> float:
+    # MoviePy v2 import paths
+    from moviepy.video.io.VideoFileClip import VideoFileClip  # type: ignore
+    from moviepy.video.compositing.CompositeVideoClip import concatenate_videoclips  # type: ignore
+
+    clips = []
+    try:
+        for path in paths:
+            try:
+                clips.append(VideoFileClip(path))
+            except Exception as e:
+                logger.error(f"Failed to load clip {path}: {e}")
+        if not clips:
+            raise ValueError("Failed to load any video clips for stitching")
+
+        try:
+            final = concatenate_videoclips(clips, method='compose')
+        except Exception as e:
+            logger.warning(f"Compose concatenation failed ({e}); retrying without compose")
+            final = concatenate_videoclips(clips)
+
+        try:
+            final.write_videofile(
+                output_path,
+                codec='libx264',
+                audio_codec='aac',
+                temp_audiofile=os.path.join(os.path.dirname(output_path) or '.', 'temp-audio.m4a'),
+                remove_temp=True,
+                threads=threads,
+            )
+        finally:
+            try:
+                final.close()
+            except Exception:
+                pass
+        return sum(getattr(clip, 'duration', 0) or 0 for clip in clips)
+    finally:
+        for clip in clips:
+            try:
+                clip.close()
+            except Exception:
+                pass
+
+
+def stitch_files(paths: List[str], output_path: str, strategy: str = 'reencode',
+                 base_path: str = None) -> Dict[str, Any]:
+    """Concatenate `paths` (in order) into `output_path`.
+
+    With strategy 'incremental', `base_path` is an earlier stitched output that the clips are
+    appended to; without one it behaves like 'copy'. Returns the strategy actually used, the
+    output duration in seconds and the output size in bytes.
+    """
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Unknown stitch strategy: {strategy}")
+    if not paths:
+        raise ValueError("No video files to stitch")
+
+    used = strategy
+    video_seconds = None
+    if strategy == 'reencode':
+        video_seconds = _concat_reencode(paths, output_path)
+    else:
+        inputs = ([base_path] if strategy == 'incremental' and base_path else []) + list(paths)
+        try:
+            _concat_copy(inputs, output_path)
+        except Exception as e:
+            logger.warning(f"Stream-copy stitch failed ({e}); re-encoding instead")
+            used = 'reencode'
+            video_seconds = _concat_reencode(inputs, output_path)
+
+    if video_seconds is None:
+        video_seconds = probe_duration(output_path)
+    return {'strategy': used, 'video_seconds': video_seconds, 'output_bytes': os.path.getsize(output_path)}
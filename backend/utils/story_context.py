@@ -0,0 +1,124 @@
+"""
+Compact, token-budgeted story context for Gemini prompts
+
+Each call type gets only the story fields it uses, serialized as short "label: value" lines:
+no Python reprs, no empty fields, no repeated list entries. When the result is over the
+budget, the lowest-priority sections are shortened first (then dropped). Token counts are
+estimated (~4 characters per token), not counted by the API.
+"""
+
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from config.settings import Config
+from utils import tracing
+
+logger = logging.getLogger(__name__)
+
+# Story-level fields each call type needs (in prompt order)
+STORY_FIELDS = {
+    'scene': ('title', 'genre', 'tone', 'visual_style', 'setting', 'key_entities'),
+    'characters': ('title', 'premise', 'genre', 'tone', 'setting', 'time_period', 'target_audience',
+                   'visual_style', 'themes', 'story_arc', 'key_entities'),
+    'character': ('title', 'premise', 'genre', 'tone', 'setting', 'visual_style', 'key_entities'),
+}
+
+# Scene outline fields worth sending, and what a neighbouring (already detailed) scene contributes
+SCENE_FIELDS = ('sequence', 'title', 'purpose', 'location', 'time_of_day', 'estimated_duration', 'key_actions', 'mood')
+NEIGHBOUR_FIELDS = ('sequence', 'title', 'location', 'visual_description', 'character_details', 'continuity_notes')
+# Character profile fields scene calls use for appearance, actions and expressions
+CHARACTER_FIELDS = ('name', 'role', 'age_range', 'physical_description', 'clothing_style', 'personality_traits',
+                    'motivations', 'speaking_style', 'key_relationships', 'character_arc', 'visual_references')
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+def _dedupe(values: Iterable[Any]) -> List[str]:
+    seen, result = set(), []
+    for value in values:
+        text = compact_value(value)
+        if text and text.lower() not in seen:
+            seen.add(text.lower())
+            result.append(text)
+    return result
+
+
+def compact_value(value: Any) -> str:
+    """One-line text for a field value ('' for empty values)"""
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return ' '.join(value.split())
+    if isinstance(value, (list, tuple, set)):
+        return ', '.join(_dedupe(value))
+    if isinstance(value, dict):
+        return '; '.join(f"{key}: {text}" for key, text in ((k, compact_value(v)) for k, v in value.items()) if text)
+    return str(value)
+
+
+def compact_fields(data: Dict[str, Any], fields: Iterable[str]) -> str:
+    """'label: value' lines for the non-empty `fields` of `data`"""
+    lines = []
+    for field in fields:
+        text = compact_value(data.get(field))
+        if text:
+            lines.append(f"{field.replace('_', ' ').capitalize()}: {text}")
+    return '\n'.join(lines)
+
+
+def _shorten(text: str, max_chars: int) -> str:
+    if len(text) <= max_chars:
+        return text
+    if max_chars < 20:
+        return ''
+    cut = text[:max_chars - 1]
+    return (cut.rsplit(' ', 1)[0] if ' ' in cut else cut) + '…'
+
+
+class ContextBuilder:
+    """Named sections of prompt context, fitted to a token budget by priority (higher is kept longer)"""
+
+    def __init__(self, call: str, budget_tokens: Optional[int] = None):
+        self.call = call
+        self.budget_tokens = budget_tokens if budget_tokens is not None else Config.PROMPT_CONTEXT_TOKEN_BUDGET
+        self._sections: Dict[str, list] = {}
+        self._raw_tokens = 0
+
+    def add(self, name: str, label: str, text: str, priority: int = 0, raw: Any = None) -> 'ContextBuilder':
+        """Add a section; `raw` is what the prompt used to embed instead, for the before/after log"""
+        self._sections[name] = [label, text or '', priority]
+        source = raw if raw is not None else text or ''
+        self._raw_tokens += estimate_tokens(source if isinstance(source, str) else str(source))
+        return self
+
+    def _tokens(self) -> int:
+        return sum(estimate_tokens(f"{label}:\n{text}") for label, text, _ in self._sections.values() if text)
+
+    def build(self) -> Dict[str, str]:
+        """{name: 'LABEL:\ntext'} within the budget ('' for sections that had to be dropped)"""
+        excess = self._tokens() - self.budget_tokens
+        for section in sorted(self._sections.values(), key=lambda item: item[2]):
+            if excess <= 0:
+                break
+            before = len(section[1])
+            section[1] = _shorten(section[1], max(0, before - excess * 4))
+            excess -= (before - len(section[1])) // 4
+        tokens = self._tokens()
+        tracing.set_attribute(f'{self.call}_context_tokens', tokens)
+        logger.info(f"{self.call} prompt context: ~{self._raw_tokens} -> ~{tokens} tokens "
+                    f"(budget {self.budget_tokens})")
+        return {name: f"{label}:\n{text}" if text else '' for name, (label, text, _) in self._sections.items()}
+
+
+def scene_outlines(scenes: List[Dict[str, Any]]) -> str:
+    """One line per scene: '3. Title (location): actions'"""
+    lines = []
+    for position, scene in enumerate(scenes or [], start=1):
+        title = compact_value(scene.get('title')) or f"Scene {position}"
+        location = compact_value(scene.get('location'))
+        actions = compact_value(scene.get('key_actions'))
+        lines.append(f"{scene.get('sequence') or position}. {title}"
+                     f"{f' ({location})' if location else ''}{f': {actions}' if actions else ''}")
+    return '\n'.join(lines)
@@ -0,0 +1,81 @@
+"""
+Single-pass validating parser for Gemini structured output
+
+`parse_response()` prefers the SDK's own `response.parsed` (already validated against the
+`response_schema` model). Otherwise the text is parsed and validated in one pass by pydantic.
+Output cut off mid-JSON (max_output_tokens) is recovered by a partial parse that keeps every
+complete value; list items that are then missing required fields are dropped.
+"""
+
+import logging
+from typing import Any, List, Type, TypeVar
+
+logger = logging.getLogger(__name__)
+
+Model = TypeVar('Model')
+
+_MAX_REPAIRS = 8
+
+
+class StructuredOutputError(ValueError):
+    """Model output that cannot be turned into the expected schema"""
+
+
+def _drop_incomplete_items(data: Any, errors: List[dict]) -> bool:
+    """Remove the list items the validation errors point into; True if anything was removed"""
+    doomed = {}
+    for error in errors:
+        container, location = data, error.get('loc') or ()
+        for depth, key in enumerate(location):
+            if isinstance(container, list) and isinstance(key, int) and key < len(container):
+                # Remember the deepest list item on this error's path
+                doomed[tuple(location[:depth])] = key
+            try:
+                container = container[key]
+            except (KeyError, IndexError, TypeError):
+                break
+    if not doomed:
+        return False
+    # Deepest paths first so outer indexes stay valid
+    for path, index in sorted(doomed.items(), key=lambda item: len(item[0]), reverse=True):
+        container = data
+        for key in path:
+            container = container[key]
+        del container[index]
+    return True
+
+
+def parse_model(text: str, model: Type[Model]) -> Model:
+    """Validate JSON `text` as `model`, repairing truncated output"""
+    from pydantic import ValidationError
+    from pydantic_core import from_json
+
+    if not text or not text.strip():
+        raise StructuredOutputError(f"Empty response for {model.__name__}")
+    try:
+        return model.model_validate_json(text)
+    except ValidationError as e:
+        if not any(error['type'] == 'json_invalid' for error in e.errors()):
+            raise StructuredOutputError(f"Response does not match {model.__name__}: {e}") from e
+
+    try:
+        data = from_json(text, allow_partial=True)
+    except ValueError as e:
+        raise StructuredOutputError(f"Response for {model.__name__} is not JSON: {e}") from e
+    for _ in range(_MAX_REPAIRS):
+        try:
+            result = model.model_validate(data)
+            logger.warning(f"Repaired truncated {model.__name__} output ({len(text)} chars)")
+            return result
+        except ValidationError as e:
+            if not _drop_incomplete_items(data, e.errors()):
+                raise StructuredOutputError(f"Truncated {model.__name__} response could not be repaired: {e}") from e
+    raise StructuredOutputError(f"Truncated {model.__name__} response could not be repaired")
+
+
+def parse_response(response: Any, model: Type[Model]) -> Model:
+    """The validated `model` for a generate_content response made with response_schema=model"""
+    parsed = getattr(response, 'parsed', None)
+    if isinstance(parsed, model):
+        return parsed
+    return parse_model(getattr(response, 'text', '') or '', model)
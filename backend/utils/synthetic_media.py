@@ -0,0 +1,91 @@
+"""
+Synthetic media for the offline backend and benchmarks (small but valid MP4 and PNG files,
+and full-size H.264/AAC clips for stitching benchmarks)
+"""
+
+import os
+import tempfile
+import threading
+from functools import lru_cache
+from typing import Tuple
+
+_render_lock = threading.Lock()
+
+
+def _frames(seconds: float, width: int, height: int, fps: int):
+    import numpy as np  # type: ignore
+
+    total = max(1, int(round(seconds * fps)))
+    ys, xs = np.mgrid[0:height, 0:width]
+    for index in range(total):
+        # A gradient that drifts every frame, so consecutive frames (and the last frame) differ
+        shift = index * 4
+        frame = np.empty((height, width, 3), dtype=np.uint8)
+        frame[..., 0] = (xs + shift) % 256
+        frame[..., 1] = (ys + shift // 2) % 256
+        frame[..., 2] = (index * 255 // total)
+        yield frame
+
+
+@lru_cache(maxsize=8)
+def synthetic_mp4_bytes(seconds: float = 8.0, size: Tuple[int, int] = (320, 180), fps: int = 24) -> bytes:
+    """Render (once per shape) an H.264/MPEG-4 clip of the given length and return its bytes"""
+    import cv2  # type: ignore
+
+    width, height = size
+    with _render_lock:
+        fd, path = tempfile.mkstemp(suffix='.mp4', prefix='synthetic_')
+        os.close(fd)
+        try:
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+            if not writer.isOpened():
+                raise RuntimeError("OpenCV could not open an MP4 writer")
+            try:
+                for frame in _frames(seconds, width, height, fps):
+                    writer.write(frame)
+            finally:
+                writer.release()
+            with open(path, 'rb') as f:
+                return f.read()
+        finally:
+            os.remove(path)
+
+
+def write_synthetic_mp4(path: str, seconds: float = 8.0, size: Tuple[int, int] = (320, 180), fps: int = 24) -> str:
+    """Write a synthetic clip to `path` and return the path"""
+    data = synthetic_mp4_bytes(seconds, tuple(size), fps)
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+@lru_cache(maxsize=4)
+def synthetic_png_bytes(size: Tuple[int, int] = (320, 180)) -> bytes:
+    """A gradient PNG, e.g. for image-to-video requests in benchmarks"""
+    import cv2  # type: ignore
+
+    width, height = size
+    frame = next(_frames(1 / 24, width, height, 24))
+    ok, encoded = cv2.imencode('.png', frame)
+    if not ok:
+        raise RuntimeError("OpenCV could not encode a PNG")
+    return encoded.tobytes()
+
+
+def write_veo_like_clip(path: str, seconds: float = 8.0, size: Tuple[int, int] = (1280, 720), fps: int = 24,
+                        tone_hz: int = 440) -> str:
+    """Write an H.264 + AAC clip shaped like Veo output (test pattern with a sine tone) via ffmpeg"""
+    import subprocess
+    from utils.stitching import ffmpeg_binary
+
+    width, height = size
+    proc = subprocess.run(
+        [ffmpeg_binary(), '-y', '-hide_banner', '-loglevel', 'error',
+         '-f', 'lavfi', '-i', f"testsrc2=size={width}x{height}:rate={fps}:duration={seconds}",
+         '-f', 'lavfi', '-i', f"sine=frequency={tone_hz}:sample_rate=48000:duration={seconds}",
+         '-c:v', 'libx264', '-preset', 'veryfast', '-pix_fmt', 'yuv420p',
+         '-c:a', 'aac', '-b:a', '128k', '-shortest', path],
+        capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not render a synthetic clip: {proc.stderr.strip()[-500:]}")
+    return path
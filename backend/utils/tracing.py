@@ -0,0 +1,283 @@
+"""
+Request correlation IDs and nested timing spans
+
+Each request gets a request ID (taken from the incoming X-Request-ID header or generated) and a
+trace. Instrumented calls open child spans under whatever span is current, so a story request
+records e.g. POST /api/stories/generate → story.generate → story.scene_details (scene=3) →
+cloud.agenerate_content. Finished traces are handed to a background exporter that appends them
+to a JSON-lines file or posts them to an OTLP/HTTP collector.
+"""
+
+import os
+import re
+import json
+import time
+import queue
+import random
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional
+
+from config.settings import Config
+from utils import lifecycle
+
+logger = logging.getLogger(__name__)
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar('trace', default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar('span', default=None)
+
+_REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._:-]{1,128}$')
+_TRACEPARENT_PATTERN = re.compile(r'^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$')
+
+
+def _new_id(nbytes: int) -> str:
+    return os.urandom(nbytes).hex()
+
+
+class Span:
+    __slots__ = ('name', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'status', 'attributes')
+
+    def __init__(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any] = None):
+        self.name = name
+        self.span_id = _new_id(8)
+        self.parent_id = parent_id
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.status = 'ok'
+        self.attributes = dict(attributes or {})
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'name': self.name,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_ns': self.start_ns,
+            'duration_ms': round(((self.end_ns or time.time_ns()) - self.start_ns) / 1e6, 3),
+            'status': self.status,
+            'attributes': self.attributes,
+        }
+
+
+class Trace:
+    """All spans of one request; spans may be added from the genai event loop as well"""
+
+    def __init__(self, name: str, request_id: str, trace_id: str = None, parent_id: str = None):
+        self.request_id = request_id
+        self.trace_id = trace_id or _new_id(16)
+        self._lock = threading.Lock()
+        self.spans: List[Span] = []
+        self.root = self.add_span(name, parent_id)
+
+    def add_span(self, name: str, parent_id: Optional[str], attributes: Dict[str, Any] = None) -> Span:
+        span = Span(name, parent_id, attributes)
+        with self._lock:
+            self.spans.append(span)
+        return span
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return {'trace_id': self.trace_id, 'request_id': self.request_id, 'spans': spans}
+
+
+def request_id_from(header_value: Optional[str]) -> str:
+    """Reuse a caller-supplied request ID when it is sane, otherwise generate one"""
+    if header_value and _REQUEST_ID_PATTERN.match(header_value):
+        return header_value
+    return _new_id(16)
+
+
+def begin_trace(name: str, request_id: str = None, traceparent: str = None):
+    """Start the trace for the current request; pair with end_trace().
+
+    A W3C `traceparent` header makes the request a child of the caller's span.
+    """
+    match = _TRACEPARENT_PATTERN.match(traceparent or '')
+    trace = Trace(name, request_id or _new_id(16),
+                  trace_id=match.group(1) if match else None,
+                  parent_id=match.group(2) if match else None)
+    return _current_trace.set(trace), _current_span.set(trace.root)
+
+
+def end_trace(tokens, status: str = 'ok'):
+    trace = _current_trace.get()
+    trace_token, span_token = tokens
+    _current_span.reset(span_token)
+    _current_trace.reset(trace_token)
+    if trace is None:
+        return
+    trace.root.end_ns = time.time_ns()
+    trace.root.status = status
+    _exporter.submit(trace)
+
+
+def current_trace() -> Optional[Trace]:
+    return _current_trace.get()
+
+
+def current_ids() -> Dict[str, str]:
+    """request_id / trace_id / span_id of the running code, for log records"""
+    trace = _current_trace.get()
+    if trace is None:
+        return {}
+    span = _current_span.get()
+    ids = {'request_id': trace.request_id, 'trace_id': trace.trace_id}
+    if span is not None:
+        ids['span_id'] = span.span_id
+    return ids
+
+
+def set_attribute(key: str, value: Any):
+    """Annotate the current span (e.g. scene number)"""
+    span = _current_span.get()
+    if span is not None:
+        span.attributes[key] = value
+
+
+def start_span(name: str, **attributes):
+    """Open a child of the current span; returns a handle for finish_span(), or None outside a trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    parent = _current_span.get()
+    span = trace.add_span(name, parent.span_id if parent else None, attributes)
+    return span, _current_span.set(span)
+
+
+def finish_span(handle, status: str = 'ok'):
+    if handle is None:
+        return
+    span, token = handle
+    span.end_ns = time.time_ns()
+    span.status = status
+    _current_span.reset(token)
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Explicit span around a block: `with tracing.span('stitch.download', segments=4): ...`"""
+    handle = start_span(name, **attributes)
+    status = 'error'
+    try:
+        yield handle[0] if handle else None
+        status = 'ok'
+    finally:
+        finish_span(handle, status)
+
+
+class TraceExporter:
+    """Ships finished traces off the request path (JSON lines file or OTLP/HTTP JSON collector)"""
+
+    def __init__(self):
+        self._queue: Optional[queue.SimpleQueue] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def submit(self, trace: Trace):
+        if Config.TRACE_EXPORTER == 'none':
+            return
+        duration_ms = (trace.root.end_ns - trace.root.start_ns) / 1e6
+        # Always keep slow traces; sample the rest
+        if duration_ms < Config.TRACE_SLOW_MS and random.random() >= Config.TRACE_SAMPLE_RATE:
+            return
+        self._ensure_thread()
+        self._queue.put(trace)
+
+    def _ensure_thread(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._queue = queue.SimpleQueue()
+                self._thread = threading.Thread(target=self._run, name='trace-exporter', daemon=True)
+                self._thread.start()
+
+    def reset(self):
+        """Forget the parent's exporter thread after fork"""
+        self._lock = threading.Lock()
+        self._queue = None
+        self._thread = None
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            try:
+                while len(batch) < 100:
+                    batch.append(self._queue.get(timeout=1.0))
+            except queue.Empty:
+                pass
+            try:
+                if Config.TRACE_EXPORTER == 'otlp':
+                    self._post_otlp(batch)
+                else:
+                    self._append_file(batch)
+            except Exception as e:
+                logger.warning(f"Failed to export {len(batch)} traces: {e}")
+
+    def _append_file(self, batch: List[Trace]):
+        with open(Config.TRACE_FILE, 'a', encoding='utf-8') as f:
+            for trace in batch:
+                f.write(json.dumps(trace.to_dict(), default=str) + '\n')
+
+    def _post_otlp(self, batch: List[Trace]):
+        import requests
+
+        spans = []
+        for trace in batch:
+            for item in trace.to_dict()['spans']:
+                end_ns = item['start_ns'] + int(item['duration_ms'] * 1e6)
+                attributes = [{'key': 'request_id', 'value': {'stringValue': trace.request_id}}]
+                attributes += [{'key': key, 'value': {'stringValue': str(value)}}
+                               for key, value in item['attributes'].items()]
+                spans.append({
+                    'traceId': trace.trace_id,
+                    'spanId': item['span_id'],
+                    'parentSpanId': item['parent_id'] or '',
+                    'name': item['name'],
+                    'startTimeUnixNano': str(item['start_ns']),
+                    'endTimeUnixNano': str(end_ns),
+                    'attributes': attributes,
+                    'status': {'code': 2 if item['status'] == 'error' else 1},
+                })
+        payload = {'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name', 'value': {'stringValue': 'video-story-platform'}}]},
+            'scopeSpans': [{'scope': {'name': __name__}, 'spans': spans}],
+        }]}
+        response = requests.post(Config.TRACE_COLLECTOR_URL, json=payload, timeout=5)
+        response.raise_for_status()
+
+
+_exporter = TraceExporter()
+lifecycle.register_post_fork(_exporter.reset)
+
+
+def setup_tracing(app):
+    """Assign a request ID and trace to every request and echo the ID back"""
+    from flask import g, request
+
+    @app.before_request
+    def begin_request_trace():
+        request_id = request_id_from(request.headers.get(Config.REQUEST_ID_HEADER))
+        route = request.url_rule.rule if request.url_rule else request.path
+        g.request_id = request_id
+        g.trace_token = begin_trace(f"{request.method} {route}", request_id, request.headers.get('traceparent'))
+
+    @app.after_request
+    def tag_response(response):
+        request_id = g.get('request_id')
+        if request_id:
+            response.headers[Config.REQUEST_ID_HEADER] = request_id
+        trace = current_trace()
+        if trace is not None:
+            trace.root.attributes['status_code'] = response.status_code
+            if response.status_code >= 500:
+                trace.root.status = 'error'
+        return response
+
+    @app.teardown_request
+    def end_request_trace(exc):
+        tokens = g.pop('trace_token', None)
+        if tokens is not None:
+            trace = current_trace()
+            failed = exc is not None or (trace is not None and trace.root.status == 'error')
+            end_trace(tokens, 'error' if failed else 'ok')
@@ -0,0 +1,9 @@
+"""
+WSGI entry point for production serving
+
+Run with: gunicorn -c gunicorn.conf.py
+"""
+
+from app import create_app
+
+app = create_app()
@@ -99,6 +99,23 @@ function storyReducer(state, action) {
   }
 }
 
+// Fold a server response into the storyboard. Saved-story element edits come back "partial":
+// their scenes/characters lists only hold the elements that were touched.
+function mergeStoryGeneration(current, update) {
+  if (!update?.partial || !current) return update;
+  const { partial, ...fields } = update;
+  const merged = { ...current, ...fields };
+  ['scenes', 'characters'].forEach((key) => {
+    const changed = new Map((fields[key] || []).map((item) => [item.id, item]));
+    const existing = current[key] || [];
+    const known = new Set(existing.map((item) => item.id));
+    merged[key] = existing
+      .map((item) => changed.get(item.id) || item)
+      .concat((fields[key] || []).filter((item) => !known.has(item.id)));
+  });
+  return merged;
+}
+
 // Create context
 const StoryContext = createContext();
 
@@ -292,27 +309,42 @@ export function StoryProvider({ children }) {
         throw new Error('No story data available');
       }
       
-      // Use real story id if we have one, so backend can persist generation_data
+      // Use real story id if we have one; the backend then edits its stored generation_data
       const storyIdForOps = state.currentStory?.id || state.currentStoryGeneration.id;
+      const persisted = Boolean(state.currentStory?.id);
       const response = await apiClient.updateStoryElement(
         storyIdForOps,
         elementType,
-        state.currentStoryGeneration,
+        persisted ? null : state.currentStoryGeneration,
         updates,
-        elementId
+        elementId,
+        persisted ? (state.currentStoryGeneration.version ?? null) : null
       );
       
-      dispatch({ type: ActionTypes.UPDATE_STORY_GENERATION, payload: response.data });
+      const merged = mergeStoryGeneration(state.currentStoryGeneration, response.data);
+      dispatch({ type: ActionTypes.UPDATE_STORY_GENERATION, payload: merged });
       toast.success('Story updated successfully!');
       
-      return response.data;
+      return merged;
       
     } catch (error) {
+      await reloadAfterConflict(error);
       handleApiError(error, 'Failed to update story');
       throw error;
     }
   };
 
+  // Another tab or user changed the story: pick up their version before the next edit
+  const reloadAfterConflict = async (error) => {
+    if (error?.response?.status !== 409 || !state.currentStory?.id) return;
+    try {
+      const response = await apiClient.getStoryGeneration(state.currentStory.id);
+      dispatch({ type: ActionTypes.SET_CURRENT_STORY_GENERATION, payload: response.data });
+    } catch (reloadError) {
+      console.error('Failed to reload story generation data', reloadError);
+    }
+  };
+
   // Regenerate story element (persist when possible)
   const regenerateStoryElement = async (elementType, elementId = null) => {
     try {
@@ -324,19 +356,23 @@ export function StoryProvider({ children }) {
       }
       
       const storyIdForOps = state.currentStory?.id || state.currentStoryGeneration.id;
+      const persisted = Boolean(state.currentStory?.id);
       const response = await apiClient.regenerateStoryElement(
         storyIdForOps,
         elementType,
-        state.currentStoryGeneration,
-        elementId
+        persisted ? null : state.currentStoryGeneration,
+        elementId,
+        persisted ? (state.currentStoryGeneration.version ?? null) : null
       );
       
-      dispatch({ type: ActionTypes.UPDATE_STORY_GENERATION, payload: response.data });
+      const merged = mergeStoryGeneration(state.currentStoryGeneration, response.data);
+      dispatch({ type: ActionTypes.UPDATE_STORY_GENERATION, payload: merged });
       toast.success('Story regenerated successfully!');
       
-      return response.data;
+      return merged;
       
     } catch (error) {
+      await reloadAfterConflict(error);
       handleApiError(error, 'Failed to regenerate story');
       throw error;
     }
@@ -410,13 +446,21 @@ export function StoryProvider({ children }) {
     throw new Error('No story or generated story data available to create from');
   };
 
-  // Start polling for generation status
+  // Start polling for generation status; the server's next_poll_after_ms hint sets the
+  // cadence (sparse early on, dense near the expected completion)
   const startStatusPolling = (operationId) => {
     // Avoid duplicate pollers per operation
     if (activePollsRef.current.has(operationId)) return;
     activePollsRef.current.add(operationId);
 
-    const pollInterval = setInterval(async () => {
+    const deadline = Date.now() + 600000; // Stop polling after 10 minutes
+    let pollTimer = null;
+    const stopPolling = () => {
+      clearTimeout(pollTimer);
+      activePollsRef.current.delete(operationId);
+    };
+
+    const poll = async () => {
       try {
         const response = await apiClient.get(`/generation-status/${operationId}`);
         const status = response.data;
@@ -427,31 +471,36 @@ export function StoryProvider({ children }) {
         });
         
         if (status.status === 'completed') {
-          clearInterval(pollInterval);
-          activePollsRef.current.delete(operationId);
+          stopPolling();
           toast.success('Video generation completed!');
           
           // Reload current story if it matches
           if (state.currentStory && status.segment_id) {
             loadStory(state.currentStory.id);
           }
+          return;
           
         } else if (status.status === 'failed') {
-          clearInterval(pollInterval);
-          activePollsRef.current.delete(operationId);
+          stopPolling();
           toast.error(`Video generation failed: ${status.error || 'Unknown error'}`);
+          return;
         }
+
+        if (Date.now() >= deadline) {
+          stopPolling();
+          return;
+        }
+        pollTimer = setTimeout(poll, status.next_poll_after_ms || 15000);
         
       } catch (error) {
         // Silently handle polling errors to avoid spam
         console.error('Status polling error:', error);
-        clearInterval(pollInterval);
-        activePollsRef.current.delete(operationId);
+        stopPolling();
       }
-    }, 15000); // Poll every 15 seconds
-    
-    // Clear polling after 10 minutes
-    setTimeout(() => { clearInterval(pollInterval); activePollsRef.current.delete(operationId); }, 600000);
+    };
+
+    // First check soon: its response carries the hint for the rest
+    pollTimer = setTimeout(poll, 5000);
   };
 
   // Resume polling helper for a story object
@@ -93,7 +93,12 @@ const StoryCreatorPage = () => {
             if (url) setSceneVideoById(prev => ({ ...prev, [sceneId]: url }));
           }
         }
-      } else if (st.status === 'generating' || st.status === 'publishing') {
+      } else if (typeof st.eta_seconds === 'number' && sceneStartAtById[sceneId]) {
+        // Progress from the server's learned ETA (capped below 90 until completion)
+        const elapsed = (Date.now() - sceneStartAtById[sceneId]) / 1000;
+        const next = Math.min(90, Math.round(10 + 80 * elapsed / Math.max(1, elapsed + st.eta_seconds)));
+        setSceneProgressById(prev => ({ ...prev, [sceneId]: Math.max(Number(prev[sceneId] || 10), next) }));
+      } else if (st.status === 'generating' || st.status === 'running' || st.status === 'publishing') {
         // Nudge progress forward on each poll (capped below 90 until completion)
         setSceneProgressById(prev => {
           const current = Number(prev[sceneId] || 10);
@@ -102,7 +107,7 @@ const StoryCreatorPage = () => {
         });
       }
     });
-  }, [generationStatus, currentStory, sceneOpById]);
+  }, [generationStatus, currentStory, sceneOpById, sceneStartAtById]);
 
   // Preload any existing completed segment videos onto matching storyboard cards by sequence number
   useEffect(() => {
@@ -512,7 +517,10 @@ const StoryCreatorPage = () => {
                                 <span></span>
                               </div>
                               <div className="text-white/80 text-xs tracking-wide">
-                                Generating • {formatElapsed(sceneStartAtById[scene.id])} elapsed • updated {formatElapsed(sceneLastUpdateById[scene.id])} ago
+                                Generating • {formatElapsed(sceneStartAtById[scene.id])} elapsed
+                                {typeof generationStatus?.[sceneOpById[scene.id]]?.eta_seconds === 'number'
+                                  ? ` • ~${generationStatus[sceneOpById[scene.id]].eta_seconds}s left`
+                                  : ''} • updated {formatElapsed(sceneLastUpdateById[scene.id])} ago
                               </div>
                               <div className="w-full max-w-[220px] h-1.5 bg-white/20 rounded-full overflow-hidden">
                                 <div
@@ -842,7 +850,12 @@ const StoryCreatorPage = () => {
                 <div className="flex flex-col sm:flex-row gap-4 justify-between pt-8 border-t border-white/10">
                   <div className="flex space-x-4">
                     <button
-                      onClick={() => actions.regenerateStoryElement('scenes', editingElement.id)}
+                      onClick={async () => {
+                        // Errors are already reported by the context
+                        const updated = await actions.regenerateStoryElement('scene', editingElement.id).catch(() => null);
+                        const scene = updated?.scenes?.find((item) => item.id === editingElement.id);
+                        if (scene) setEditingElement(scene);
+                      }}
                       className="glass-effect text-white font-medium py-3 px-6 rounded-pill hover:bg-white/10 transition-all flex items-center space-x-2"
                     >
                       <RotateCw className="w-5 h-5" />
@@ -76,17 +76,19 @@ export const endpoints = {
     apiClient.post('/stories/generate', { prompt, preferences }),
   getStoryGeneration: (storyId) => apiClient.get(`/stories/${storyId}/generation`),
   saveStoryGeneration: (storyId, storyData) => apiClient.put(`/stories/${storyId}/generation`, { story_data: storyData }),
-  updateStoryElement: (storyId, elementType, storyData, updates, elementId = null) => {
+  // Saved stories are edited server-side: pass storyData = null and the version last read.
+  // Unsaved drafts still send the whole storyData.
+  updateStoryElement: (storyId, elementType, storyData, updates, elementId = null, version = null) => {
     const url = elementId ? 
       `/stories/${storyId}/elements/${elementType}/${elementId}` :
       `/stories/${storyId}/elements/${elementType}`;
-    return apiClient.put(url, { story_data: storyData, updates });
+    return apiClient.put(url, storyData ? { story_data: storyData, updates } : { updates, version });
   },
-  regenerateStoryElement: (storyId, elementType, storyData, elementId = null) => {
+  regenerateStoryElement: (storyId, elementType, storyData, elementId = null, version = null) => {
     const url = elementId ?
       `/stories/${storyId}/regenerate/${elementType}/${elementId}` :
       `/stories/${storyId}/regenerate/${elementType}`;
-    return apiClient.post(url, { story_data: storyData });
+    return apiClient.post(url, storyData ? { story_data: storyData } : { version });
   },
   
   // Video generation
@@ -94,6 +96,9 @@ export const endpoints = {
     headers: { 'Content-Type': 'multipart/form-data' }
   }),
   
+  generateAllSegments: (storyId, options = {}) => apiClient.post(`/stories/${storyId}/generate-all`, options),
+  getGenerateAllStatus: (storyId, batchId) => apiClient.get(`/stories/${storyId}/generate-all/${batchId}`),
+  
   // Story stitching
   stitchStory: (storyId) => apiClient.post(`/stories/${storyId}/stitch`),
   
@@ -121,6 +126,8 @@ apiClient.saveStoryGeneration = endpoints.saveStoryGeneration;
 apiClient.updateStoryElement = endpoints.updateStoryElement;
 apiClient.regenerateStoryElement = endpoints.regenerateStoryElement;
 apiClient.generateVideo = endpoints.generateVideo;
+apiClient.generateAllSegments = endpoints.generateAllSegments;
+apiClient.getGenerateAllStatus = endpoints.getGenerateAllStatus;
 apiClient.stitchStory = endpoints.stitchStory;
 apiClient.getGenerationStatus = endpoints.getGenerationStatus;
 